@@ -183,9 +183,10 @@ class BluetoothService:
     LE_ADVERTISEMENT_IFACE = "org.bluez.LEAdvertisement1"
     LE_ADVERTISING_MANAGER_IFACE = "org.bluez.LEAdvertisingManager1"
 
-    def __init__(self, callback):
+    def __init__(self, callback, on_advertising=None):
         self.mainloop = None
         self.callback = callback
+        self.on_advertising = on_advertising
 
     def start(self):
         print("starting")
@@ -259,7 +260,8 @@ class BluetoothService:
     def register_ad_cb(self):
         # Register Advertisement callback logic
         logger.info("Advertisement registered")
-        pass
+        if self.on_advertising is not None:
+            self.on_advertising()
 
     def register_ad_error_cb(self, error):
         logger.critical("Failed to register advertisement: " + str(error))
@@ -0,0 +1,3 @@
+from .dispatcher import PriorityDispatcher, CRITICAL, STATE, TELEMETRY, BACKGROUND, DEFAULT_LANES
+from .ingest import EventQueue
+from .scheduler import Scheduler, Job
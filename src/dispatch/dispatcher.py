@@ -0,0 +1,125 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+
+from metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+# Lanes, from most to least urgent
+CRITICAL = "critical"  # bedExit, turnTimerExpire
+STATE = "state"  # bedEntry, bed assignment, sensor state changes
+TELEMETRY = "telemetry"  # frame fetches and uploads
+BACKGROUND = "background"  # health checks and sensor recovery
+
+DEFAULT_LANES = {CRITICAL: 2, STATE: 1, TELEMETRY: 1, BACKGROUND: 1}
+
+
+class PriorityDispatcher:
+    """
+    Runs outbound work on separate lanes, each with its own worker threads, so a critical alert
+    never waits behind a telemetry upload. Every worker has a queue of its own.
+
+    `submit` never blocks; it returns False when the worker's queue is full. Plain `submit` hands
+    work to the workers of a lane in turn, so on a lane with several workers it can run out of
+    order. `submit_ordered` sends all work of one key (e.g. a bed) to the same worker, so it runs
+    one at a time and in order, while other keys use the other workers.
+
+    Calls on different lanes can reach the backend in any order: a bedExit on CRITICAL can
+    overtake the bedEntry before it, still queued or retrying on STATE. The event calls carry the
+    time they were detected, which the backend can order them by.
+    """
+
+    def __init__(self, lanes=None, max_queue=1000):
+        if lanes is None:
+            lanes = DEFAULT_LANES
+        self.lanes = dict(lanes)
+        self.queue_wait = LatencyStats()
+        self.run_time = LatencyStats()
+
+        self._queues = {lane: [queue.Queue(maxsize=max_queue) for _ in range(max(workers, 1))]
+                        for lane, workers in self.lanes.items()}
+        self._turns = {lane: itertools.count() for lane in self.lanes}
+        self._threads = []
+        self._stop_event = threading.Event()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop_event.clear()
+        for lane, workers in self.lanes.items():
+            for i in range(workers):
+                thread = threading.Thread(target=self._run, args=(lane, i), name=f"dispatch-{lane}-{i}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, lane, fn, *args, **kwargs):
+        worker_queues = self._queues[lane]
+        return self._put(lane, worker_queues[next(self._turns[lane]) % len(worker_queues)], fn, args, kwargs)
+
+    def submit_ordered(self, lane, key, fn, *args, **kwargs):
+        # Work of one key always goes to the same worker, so it runs in the order it was submitted
+        worker_queues = self._queues[lane]
+        return self._put(lane, worker_queues[hash(key) % len(worker_queues)], fn, args, kwargs)
+
+    def _put(self, lane, worker_queue, fn, args, kwargs):
+        try:
+            worker_queue.put_nowait((time.monotonic(), fn, args, kwargs))
+            return True
+        except queue.Full:
+            logger.error(f"Dispatch lane {lane} is full. Dropping {getattr(fn, '__name__', fn)}")
+            return False
+
+    def join(self):
+        # Blocks until everything submitted so far has run
+        for worker_queues in self._queues.values():
+            for worker_queue in worker_queues:
+                worker_queue.join()
+
+    def queue_depths(self):
+        return {lane: sum(worker_queue.qsize() for worker_queue in worker_queues)
+                for lane, worker_queues in self._queues.items()}
+
+    def metrics(self):
+        return {
+            "queue_depth": self.queue_depths(),
+            "queue_wait": self.queue_wait.snapshot(),
+            "run_time": self.run_time.snapshot(),
+        }
+
+    def _run(self, lane, worker):
+        lane_queue = self._queues[lane][worker]
+        while not self._stop_event.is_set():
+            try:
+                enqueued_at, fn, args, kwargs = lane_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            start = time.monotonic()
+            self.queue_wait.record(lane, start - enqueued_at)
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Error in dispatch lane {lane} running {getattr(fn, '__name__', fn)}: {e}")
+                self.run_time.record(lane, time.monotonic() - start, error=True)
+            else:
+                self.run_time.record(lane, time.monotonic() - start)
+            finally:
+                lane_queue.task_done()
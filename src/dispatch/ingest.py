@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+# Event types whose newest instance supersedes older ones; everything else is never dropped
+DEFAULT_COALESCE = frozenset({"newframe", "attended"})
+
+
+class EventQueue:
+    """
+    Bounded queue between SSE ingest and the event handlers, drained by a pool of `workers`
+    threads. Events of one type are handled one at a time and in order; different types run in
+    parallel, so a slow handler never stalls ingest or the other types.
+
+    `put` never blocks. Once `max_events` are pending, a coalescable event replaces the newest
+    pending event of its key if that has the same type, or is dropped if nothing is pending for
+    the key; otherwise, like any other event, it is queued anyway.
+    Events carry a `type` and a monotonic `received_at`, used for the lag metrics.
+
+    Handlers are looked up by the event's type, or by the `key` given to `put`. Several monitors
+    can share one queue (and its workers) by registering their handlers under their own keys,
+    e.g. "<sensor>:body"; each key is then ordered on its own.
+    """
+
+    def __init__(self, handlers, max_events=1000, workers=2, coalesce=DEFAULT_COALESCE):
+        self.handlers = dict(handlers)
+        self.max_events = max_events
+        self.workers = workers
+        self.coalesce = frozenset(coalesce)
+        self.queue_lag = LatencyStats()
+        self.run_time = LatencyStats()
+        self.stats = {"queued": 0, "handled": 0, "coalesced": 0, "dropped": 0, "overflowed": 0, "max_depth": 0}
+
+        self._pending = {event_type: deque() for event_type in self.handlers}
+        self._depth = 0
+        self._ready = deque()  # types with pending events that no worker is handling
+        self._active = set()
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop_event.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ingest-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def add_handlers(self, handlers):
+        with self._condition:
+            for key, handler in handlers.items():
+                self.handlers[key] = handler
+                self._pending.setdefault(key, deque())
+
+    def put(self, event, key=None):
+        if key is None:
+            key = event.type
+        with self._condition:
+            pending = self._pending.get(key)
+            if pending is None:
+                return False  # no handler for this type
+
+            if self._depth >= self.max_events:
+                if event.type in self.coalesce:
+                    if not pending:
+                        self.stats["dropped"] += 1
+                        return False
+                    # Only a directly preceding event of the same type can go without reordering the key
+                    if pending[-1].type == event.type:
+                        pending[-1] = event
+                        self.stats["coalesced"] += 1
+                        return True
+                self.stats["overflowed"] += 1
+
+            pending.append(event)
+            self._depth += 1
+            self.stats["queued"] += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], self._depth)
+            if key not in self._active and key not in self._ready:
+                self._ready.append(key)
+                self._condition.notify()
+            return True
+
+    def join(self):
+        # Blocks until every event put so far has been handled
+        with self._condition:
+            while self._depth or self._active:
+                self._condition.wait()
+
+    def depth(self):
+        with self._condition:
+            return self._depth
+
+    def metrics(self):
+        with self._condition:
+            stats = dict(self.stats, depth=self._depth)
+            stats["pending"] = {key: len(pending) for key, pending in self._pending.items()}
+        stats["queue_lag"] = self.queue_lag.snapshot()
+        stats["run_time"] = self.run_time.snapshot()
+        return stats
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._ready and not self._stop_event.is_set():
+                    self._condition.wait()
+                if self._stop_event.is_set():
+                    return
+                key = self._ready.popleft()
+                self._active.add(key)
+                event = self._pending[key].popleft()
+                self._depth -= 1
+
+            start = time.monotonic()
+            self.queue_lag.record(key, start - event.received_at)
+            try:
+                self.handlers[key](event)
+            except Exception as e:
+                logger.error(f"Error while handling {key} event: {e}")
+                self.run_time.record(key, time.monotonic() - start, error=True)
+            else:
+                self.run_time.record(key, time.monotonic() - start)
+
+            with self._condition:
+                self.stats["handled"] += 1
+                self._active.discard(key)
+                if self._pending[key]:
+                    self._ready.append(key)
+                    self._condition.notify()
+                elif not self._depth and not self._active:
+                    self._condition.notify_all()
@@ -0,0 +1,177 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+
+class Job:
+    """
+    Handle for a scheduled call, returned by `Scheduler.call_later` and `Scheduler.call_every`.
+    """
+
+    def __init__(self, scheduler, fn, args, kwargs, interval=None, executor=None):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.interval = interval
+        self.executor = executor
+        self.due = None
+        self.cancelled = False
+        self.runs = 0
+        self._scheduler = scheduler
+        self._generation = 0
+        self._running = False
+
+    @property
+    def name(self):
+        return getattr(self.fn, "__name__", repr(self.fn))
+
+    def cancel(self):
+        self._scheduler.cancel(self)
+
+    def reschedule(self, delay):
+        self._scheduler.reschedule(self, delay)
+
+
+class Scheduler:
+    """
+    Runs deferred and periodic calls from one thread, ordered on a heap of due times, so the
+    number of threads and wakeups does not grow with the number of timers.
+
+    Jobs run on the scheduler thread and must be quick. Slow work gets an `executor`, a callable
+    that takes a zero-argument function (e.g. a dispatcher lane). A periodic job that is still
+    running on its executor when it falls due again skips that run instead of piling up.
+    """
+
+    def __init__(self):
+        self.lateness = LatencyStats()
+        self.stats = {"runs": 0, "skipped": 0, "errors": 0}
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def call_later(self, delay, fn, *args, executor=None, **kwargs):
+        job = Job(self, fn, args, kwargs, executor=executor)
+        self.reschedule(job, delay)
+        return job
+
+    def call_every(self, interval, fn, *args, first_delay=None, executor=None, **kwargs):
+        job = Job(self, fn, args, kwargs, interval=interval, executor=executor)
+        self.reschedule(job, interval if first_delay is None else first_delay)
+        return job
+
+    def cancel(self, job):
+        with self._condition:
+            # The heap entry stays behind and is discarded when it comes up
+            job.cancelled = True
+            job._generation += 1
+
+    def reschedule(self, job, delay):
+        with self._condition:
+            job.cancelled = False
+            job._generation += 1
+            self._push(job, time.monotonic() + delay)
+            self._condition.notify()
+
+    def pending(self):
+        with self._condition:
+            return sum(1 for _, _, generation, job in self._heap if generation == job._generation)
+
+    def metrics(self):
+        stats = dict(self.stats, pending=self.pending())
+        stats["lateness"] = self.lateness.snapshot()
+        return stats
+
+    def _push(self, job, due):
+        job.due = due
+        heapq.heappush(self._heap, (due, next(self._counter), job._generation, job))
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                job = self._next_due()
+                if job is None:
+                    continue
+                if job.interval is not None:
+                    # Fixed rate, but missed runs are skipped rather than run back to back
+                    self._push(job, max(job.due + job.interval, time.monotonic()))
+            self._fire(job)
+
+    def _next_due(self):
+        # Called with the condition held; waits until a live job is due or the scheduler stops
+        while not self._stop_event.is_set():
+            if not self._heap:
+                self._condition.wait()
+                continue
+            due, _, generation, job = self._heap[0]
+            if generation != job._generation:
+                heapq.heappop(self._heap)
+                continue
+            now = time.monotonic()
+            if due > now:
+                self._condition.wait(due - now)
+                continue
+            heapq.heappop(self._heap)
+            self.lateness.record(job.name, now - due)
+            return job
+        return None
+
+    def _fire(self, job):
+        if job._running and job.interval is not None:
+            self.stats["skipped"] += 1
+            return
+        job.runs += 1
+        self.stats["runs"] += 1
+        if job.executor is None:
+            self._call(job)
+            return
+        job._running = True
+        try:
+            if job.executor(lambda: self._call(job)) is False:
+                # e.g. a full dispatcher lane
+                job._running = False
+                self.stats["skipped"] += 1
+        except Exception as e:
+            job._running = False
+            self.stats["errors"] += 1
+            logger.error(f"Could not hand {job.name} to its executor: {e}")
+
+    def _call(self, job):
+        try:
+            job.fn(*job.args, **job.kwargs)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Scheduled job {job.name} failed: {e}")
+        finally:
+            job._running = False
@@ -1 +1,9 @@
 from .kinesis import KinesisClient
+from .producer import KinesisProducer
+from .log_shipper import CloudWatchLogShipper
+from .signed_api import SignedApiClient
+from .aggregation import FrameAggregator, get_aggregator, aggregate_frames, aggregate_encoded_frames, deaggregate, \
+    deaggregate_frames, is_aggregated
+from .frame_codec import encode_frames, decode_frames
+from .partitioning import get_partitioner, simulate_shard_distribution
+from .throttle import AdaptiveRateLimiter, TokenBucket, get_limiter
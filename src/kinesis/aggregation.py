@@ -0,0 +1,183 @@
+"""
+Aggregated record layout (all integers big endian):
+
+    magic      4 bytes  b"JXNA"
+    version    uint8
+    header     uint32 length + UTF-8 JSON object shared by every frame in the record
+    count      uint32 number of frames
+    frames     count x (uint32 length + frame body)
+
+The header carries the fields the per-frame records used to repeat (`id`, `time`,
+`patient_present`, `frames_per_hour`) plus `first_frame`, the window index of the first frame
+in the record, and `encoding`, which says how the bodies are encoded: with "json" every body is
+one frame's readings as JSON, with "jxf1" the record has a single body holding all of its frames
+in the binary frame format (see frame_codec).
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+from .frame_codec import FRAME_CODEC_ENCODING, COMPRESSION_ZLIB, decode_frames, encode_frames, \
+    encoded_size_bound, frame_compression, frame_encoding
+from .producer import MAX_BYTES_PER_RECORD
+
+AGGREGATION_MAGIC = b"JXNA"
+AGGREGATION_VERSION = 1
+
+_PREFIX = struct.Struct(">4sBI")
+_LENGTH = struct.Struct(">I")
+
+
+def is_aggregated(data):
+    return data[:len(AGGREGATION_MAGIC)] == AGGREGATION_MAGIC
+
+
+def encode_frame(matrix):
+    if hasattr(matrix, "tolist"):
+        matrix = matrix.tolist()
+    return json.dumps(matrix, separators=(",", ":")).encode("utf-8")
+
+
+def aggregate_frames(header, frames, max_record_bytes=MAX_BYTES_PER_RECORD):
+    """
+    Pack encoded frame bodies into as few records as possible, each no larger than
+    `max_record_bytes`. Returns a list of record data blobs.
+    """
+    records = []
+    first_frame = 0
+    while first_frame < len(frames):
+        record_header = dict(header, first_frame=first_frame)
+        header_bytes = json.dumps(record_header, separators=(",", ":")).encode("utf-8")
+        size = _PREFIX.size + len(header_bytes) + _LENGTH.size
+
+        body = []
+        for frame in frames[first_frame:]:
+            frame_size = _LENGTH.size + len(frame)
+            if body and size + frame_size > max_record_bytes:
+                break
+            if size + frame_size > max_record_bytes:
+                raise ValueError(f"Frame {first_frame} does not fit in a {max_record_bytes} byte record")
+            body.append(frame)
+            size += frame_size
+
+        records.append(_pack_record(header_bytes, body))
+        first_frame += len(body)
+    return records
+
+
+def aggregate_encoded_frames(header, matrices, max_record_bytes=MAX_BYTES_PER_RECORD,
+                             compression=COMPRESSION_ZLIB, delta=True):
+    """
+    Pack pressure matrices into records holding one binary encoded body each. Records are sized
+    on the uncompressed bound, so they fit `max_record_bytes` whatever the compression achieves.
+    """
+    if not len(matrices):
+        return []
+    rows, cols = np.shape(matrices[0])
+    header = dict(header, encoding=FRAME_CODEC_ENCODING)
+    header_bytes = json.dumps(dict(header, first_frame=len(matrices)), separators=(",", ":")).encode("utf-8")
+    budget = max_record_bytes - _PREFIX.size - len(header_bytes) - 2 * _LENGTH.size - encoded_size_bound(0, 0, 0)
+    frame_bytes = encoded_size_bound(1, rows, cols) - encoded_size_bound(0, rows, cols)
+    # leave room for the few bytes compression adds to incompressible input
+    frames_per_record = int(budget / (frame_bytes * 1.01 + 1))
+    if frames_per_record < 1:
+        raise ValueError(f"A {rows}x{cols} frame does not fit in a {max_record_bytes} byte record")
+
+    records = []
+    for first_frame in range(0, len(matrices), frames_per_record):
+        chunk = matrices[first_frame:first_frame + frames_per_record]
+        body = encode_frames(chunk, compression=compression, delta=delta)
+        record_header = json.dumps(dict(header, first_frame=first_frame), separators=(",", ":")).encode("utf-8")
+        records.append(_pack_record(record_header, [body]))
+    return records
+
+
+class FrameAggregator:
+    """
+    Packs the frame window of one upload into as few records as the record size limit allows, in
+    the configured frame encoding. The uploaders hand it to `format_sensor_matrices`, which keeps
+    the sensor code free of the Kinesis limits and encoders.
+    """
+
+    def __init__(self, encoding=None, compression=None, delta=None, max_record_bytes=MAX_BYTES_PER_RECORD):
+        self.encoding = encoding or frame_encoding()
+        self.compression = frame_compression() if compression is None else compression
+        self.delta = os.environ.get("FRAME_DELTA", "1") == "1" if delta is None else delta
+        self.max_record_bytes = max_record_bytes
+
+    def __call__(self, header, matrices, partition_key):
+        # The partition key counts against the record size
+        max_record_bytes = self.max_record_bytes - len(partition_key.encode("utf-8"))
+        if self.encoding == "binary":
+            return aggregate_encoded_frames(header, matrices, max_record_bytes, compression=self.compression,
+                                            delta=self.delta)
+        return aggregate_frames(dict(header, encoding="json"), [encode_frame(matrix) for matrix in matrices],
+                                max_record_bytes)
+
+
+def get_aggregator():
+    # Aggregated records are a different wire format, so consumers have to opt in with KINESIS_AGGREGATION=1
+    if os.environ.get("KINESIS_AGGREGATION", "0") != "1":
+        return None
+    return FrameAggregator()
+
+
+def _pack_record(header_bytes, bodies):
+    parts = [_PREFIX.pack(AGGREGATION_MAGIC, AGGREGATION_VERSION, len(header_bytes)), header_bytes,
+             _LENGTH.pack(len(bodies))]
+    for body in bodies:
+        parts.append(_LENGTH.pack(len(body)))
+        parts.append(body)
+    return b"".join(parts)
+
+
+def deaggregate(data):
+    """
+    Split an aggregated record into `(header, frame_bodies)`.
+    """
+    data = memoryview(data)
+    magic, version, header_length = _PREFIX.unpack_from(data, 0)
+    if magic != AGGREGATION_MAGIC:
+        raise ValueError("Not an aggregated record")
+    if version != AGGREGATION_VERSION:
+        raise ValueError(f"Unsupported aggregation version {version}")
+
+    offset = _PREFIX.size
+    header = json.loads(bytes(data[offset:offset + header_length]).decode("utf-8"))
+    offset += header_length
+    count, = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+
+    frames = []
+    for _ in range(count):
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        frames.append(bytes(data[offset:offset + length]))
+        offset += length
+    if offset != len(data):
+        raise ValueError("Trailing bytes after the last frame")
+    return header, frames
+
+
+def deaggregate_frames(data):
+    """
+    Expand an aggregated record into the per-frame objects consumers received before
+    aggregation (`id`, `frame`, `time`, `patient_present`, `frames_per_hour`, `readings`).
+    """
+    header, bodies = deaggregate(data)
+    first_frame = header.pop("first_frame")
+    encoding = header.pop("encoding", "json")
+    if encoding == "json":
+        readings = [json.loads(body.decode("utf-8")) for body in bodies]
+    elif encoding == FRAME_CODEC_ENCODING:
+        readings = [matrix.tolist() for body in bodies for matrix in decode_frames(body)]
+    else:
+        raise ValueError(f"Unsupported frame encoding {encoding}")
+
+    output_array = []
+    for i, matrix in enumerate(readings):
+        output_obj = dict(header, frame=first_frame + i, readings=matrix)
+        output_array.append(output_obj)
+    return output_array
@@ -0,0 +1,121 @@
+"""
+Binary frame format, version 1 (all header integers big endian):
+
+    magic        3 bytes  b"JXF"
+    version      uint8
+    flags        uint8    bit 0: frames after the first are stored as deltas to the previous frame
+    compression  uint8    0 none, 1 zlib, 2 lz4
+    cell width   uint8    bytes per cell (1, 2 or 4), unsigned
+    reserved     uint8
+    frames       uint32
+    rows         uint16
+    cols         uint16
+    body         frames x rows x cols little endian cells, compressed as a whole
+
+Deltas are taken modulo 2 ** (8 * cell width), so they fit the same cell width and decode exactly.
+"""
+import os
+import struct
+import zlib
+
+import numpy as np
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+FRAME_CODEC_MAGIC = b"JXF"
+FRAME_CODEC_VERSION = 1
+FRAME_CODEC_ENCODING = "jxf1"
+
+FLAG_DELTA = 0x01
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZ4 = 2
+COMPRESSION_NAMES = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "lz4": COMPRESSION_LZ4}
+
+_HEADER = struct.Struct(">3sBBBBBIHH")
+_DTYPES = {1: np.dtype("<u1"), 2: np.dtype("<u2"), 4: np.dtype("<u4")}
+
+
+def frame_encoding():
+    # "json" keeps the original JSON readings, "binary" uses this codec
+    return os.environ.get("FRAME_ENCODING", "json")
+
+
+def frame_compression():
+    name = os.environ.get("FRAME_COMPRESSION", "zlib")
+    if name not in COMPRESSION_NAMES:
+        raise ValueError(f"Unknown frame compression {name}")
+    return COMPRESSION_NAMES[name]
+
+
+def encoded_size_bound(frames, rows, cols, cell_width=2):
+    # Upper bound for an uncompressed encoding, used to size records before encoding
+    return _HEADER.size + frames * rows * cols * cell_width
+
+
+def encode_frames(frames, compression=COMPRESSION_ZLIB, delta=True, cell_width=2, level=6):
+    """
+    Encode a sequence of equally sized pressure matrices (or an array of shape
+    `(frames, rows, cols)`). Values are clipped to the cell width.
+    """
+    dtype = _DTYPES[cell_width]
+    frames = np.asarray(frames)
+    if frames.ndim != 3:
+        raise ValueError("Expected an array of shape (frames, rows, cols)")
+    count, rows, cols = frames.shape
+
+    if frames.dtype != dtype:
+        frames = np.clip(np.rint(frames), 0, np.iinfo(dtype).max).astype(dtype)
+    if delta and count > 1:
+        frames = np.concatenate((frames[:1], np.diff(frames, axis=0)))  # wraps around in unsigned arithmetic
+
+    body = np.ascontiguousarray(frames, dtype=dtype).tobytes()
+    if compression == COMPRESSION_ZLIB:
+        body = zlib.compress(body, level)
+    elif compression == COMPRESSION_LZ4:
+        if lz4_frame is None:
+            raise RuntimeError("lz4 compression requested but the lz4 package is not installed")
+        body = lz4_frame.compress(body)
+    elif compression != COMPRESSION_NONE:
+        raise ValueError(f"Unknown frame compression {compression}")
+
+    flags = FLAG_DELTA if delta else 0
+    header = _HEADER.pack(FRAME_CODEC_MAGIC, FRAME_CODEC_VERSION, flags, compression, cell_width, 0, count, rows,
+                          cols)
+    return header + body
+
+
+def decode_frames(data):
+    """
+    Decode an encoded blob back into an array of shape `(frames, rows, cols)`.
+    """
+    magic, version, flags, compression, cell_width, _, count, rows, cols = _HEADER.unpack_from(data, 0)
+    if magic != FRAME_CODEC_MAGIC:
+        raise ValueError("Not an encoded frame blob")
+    if version != FRAME_CODEC_VERSION:
+        raise ValueError(f"Unsupported frame codec version {version}")
+    if cell_width not in _DTYPES:
+        raise ValueError(f"Unsupported cell width {cell_width}")
+
+    body = bytes(data[_HEADER.size:])
+    if compression == COMPRESSION_ZLIB:
+        body = zlib.decompress(body)
+    elif compression == COMPRESSION_LZ4:
+        if lz4_frame is None:
+            raise RuntimeError("lz4 compressed frames but the lz4 package is not installed")
+        body = lz4_frame.decompress(body)
+    elif compression != COMPRESSION_NONE:
+        raise ValueError(f"Unknown frame compression {compression}")
+
+    dtype = _DTYPES[cell_width]
+    frames = np.frombuffer(body, dtype=dtype)
+    if frames.size != count * rows * cols:
+        raise ValueError("Frame body does not match the header")
+    frames = frames.reshape(count, rows, cols)
+    if flags & FLAG_DELTA:
+        frames = np.cumsum(frames, axis=0, dtype=dtype)
+    return frames
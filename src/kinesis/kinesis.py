@@ -1,15 +1,22 @@
+import base64
 import logging
 import os
 import time
+import uuid
 
-import boto3
 import json
 
-import requests
-from botocore.auth import SigV4Auth
-from botocore.awsrequest import AWSRequest
 from dotenv import load_dotenv
 
+from spool import Spool, SpoolReplayer
+from .aggregation import get_aggregator
+from .lazy import LazyProxy
+from .log_shipper import CloudWatchLogShipper, event_size
+from .producer import KinesisProducer, record_size
+from .partitioning import get_partitioner
+from .signed_api import SignedApiClient
+from .throttle import stream_limiter, log_group_limiter
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -22,45 +29,143 @@ filelogHandler.setFormatter(formatter)
 logger.addHandler(filelogHandler)
 logger.addHandler(logHandler)
 
+
+LOG_GROUP_NAME = "heritage-oaks-prod-sensor-log-group"
+LOG_STREAM_NAME = "heritage-oaks-prod-sensor-log-stream"
+
+# 4xx responses that can go through on a later attempt: auth failures from clock skew or expiring
+# credentials, timeouts and throttling. Any other 4xx is rejected again on every retry
+RETRY_STATUS_CODES = frozenset({401, 403, 408, 429})
+
+
+class RejectedRequest(Exception):
+    pass
+
+
 class KinesisClient:
 
-    def __init__(self):
-        self.session = boto3.Session(
+    def __init__(self, kinesis_client=None, cloudwatchlogs_client=None, signed_api=None, spool=None, source=None):
+        # The AWS clients, the API client and the spool can be handed in, e.g. stand-ins for a replay.
+        # `source` names this process in its own log lines: the sensor, or the gateway of several beds
+        # boto3 is slow to import and to build clients with, so all of it waits for first use or prewarm()
+        self.session = LazyProxy(self.create_session)
+        self.kinesis_client = kinesis_client or LazyProxy(lambda: self.get_auth_client("kinesis"))
+        self.cloudwatchlogs_client = cloudwatchlogs_client or LazyProxy(lambda: self.get_auth_client("logs"))
+        self.signed_api = signed_api or SignedApiClient(self.session, os.environ["API_KEY"])
+        self.partitioner = get_partitioner()
+        self.aggregator = get_aggregator()
+        self.source = source or os.environ.get("SENSOR_SSID")
+
+        self.spool = spool or Spool()
+        self.spool_replayer = SpoolReplayer(self.spool, {
+            "api": self.deliver_spooled_request,
+            "kinesis": self.deliver_spooled_records,
+            "logs": self.deliver_spooled_log,
+        }, droppable_kinds=("kinesis", "logs"))
+        self.spool_replayer.start()
+
+        self.stream_limiter = stream_limiter(os.environ["STREAM_NAME"])
+        self.log_limiter = log_group_limiter(LOG_GROUP_NAME)
+
+        self.log_shipper = CloudWatchLogShipper(self.cloudwatchlogs_client, LOG_GROUP_NAME, LOG_STREAM_NAME,
+                                                on_failed=self.spool_log_events, limiter=self.log_limiter,
+                                                is_backlogged=lambda: self.spool.has_pending("logs"))
+        self.log_shipper.start()
+
+        self.producer = KinesisProducer(self.kinesis_client, os.environ["STREAM_NAME"],
+                                        on_delivered=self.on_records_delivered, on_failed=self.spool_records,
+                                        limiter=self.stream_limiter)
+        self.producer.start()
+
+    def signed_request_v2(self, endpoint, dataObj, method='POST', trace=None):
+        # Every backend call is written to the spool first, so it survives network outages and restarts.
+        # Returns whether the call was delivered now; otherwise it waits in the spool for the replayer
+        # The idempotency key stays with the entry, so a replay of the same call carries the same key
+        idempotency_key = str(uuid.uuid4())
+        payload = json.dumps({"endpoint": endpoint, "data": dataObj, "method": method,
+                              "idempotency_key": idempotency_key})
+        entry_id = self.spool.append("api", payload, in_flight=True)
+        if trace is not None:
+            trace.mark("spooled")
+        delivered = False
+        rejected = False
+        try:
+            if self.spool.has_pending("api", before_id=entry_id):
+                # Older calls are still waiting to be replayed. Keep the order
+                return False
+            if trace is not None:
+                with trace.span("request"):
+                    delivered = self.send_signed_request(endpoint, dataObj, method, idempotency_key)
+                if delivered:
+                    trace.mark("acknowledged")
+            else:
+                delivered = self.send_signed_request(endpoint, dataObj, method, idempotency_key)
+        except RejectedRequest as e:
+            logger.error(f"{e}. Dropping it")
+            rejected = True
+        except Exception as e:
+            logger.error(f"AWS backend call failed: {e}")
+        finally:
+            if delivered or rejected:
+                self.spool.mark_delivered(entry_id)
+            self.spool.release(entry_id)
+            if not delivered and not rejected:
+                self.spool_replayer.wake()
+        return delivered
+
+    def send_signed_request(self, endpoint, dataObj, method='POST', idempotency_key=None):
+        # True for a 2xx. False keeps the call spooled for another attempt; a 4xx that no retry
+        # will fix raises RejectedRequest
+        response = self.signed_api.request(method, endpoint, dataObj, idempotency_key=idempotency_key)
+        logger.info(f"AWS backend call response: {response.text}")
+
+        status_code = response.status_code
+        if 200 <= status_code < 300:
+            return True
+        if status_code >= 500 or status_code in RETRY_STATUS_CODES or status_code < 400:
+            logger.error(f"AWS backend call {method} {endpoint} returned {status_code}. Keeping it spooled")
+            return False
+        raise RejectedRequest(f"AWS backend rejected {method} {endpoint} {json.dumps(dataObj)} with "
+                              f"{status_code}: {response.text}")
+
+    def deliver_spooled_request(self, payload):
+        request = json.loads(payload)
+        try:
+            return self.send_signed_request(request["endpoint"], request["data"], request["method"],
+                                            request.get("idempotency_key"))
+        except RejectedRequest as e:
+            logger.error(f"{e}. Dropping it")
+            return True
+
+    def close(self):
+        # Sends what is still queued, then stops the background threads
+        self.producer.close()
+        self.log_shipper.close()
+        self.spool_replayer.stop()
+        self.spool.close()
+        self.signed_api.close()
+
+    def create_session(self):
+        import boto3
+
+        return boto3.Session(
             aws_access_key_id=os.environ["ACCESS_KEY_ID"],
             aws_secret_access_key=os.environ["ACCESS_KEY_SECRET"],
         )
-        self.kinesis_client = self.get_auth_client("kinesis")
-        self.cloudwatchlogs_client = self.get_auth_client("logs")
-
-    def signed_request_v2(self, endpoint, dataObj, method='POST'):
-        sigv4 = SigV4Auth(self.session.get_credentials(), "execute-api", "us-west-2")
-        data = json.dumps(dataObj)
-        headers = {"Content-Type": "application/x-amz-json-1.1", "x-api-key": os.environ["API_KEY"]}
-        request = AWSRequest(
-            method=method,
-            url=endpoint,
-            data=data,
-            headers=headers,
-        )
-        # request.context["payload_signing_enabled"] = False
-        sigv4.add_auth(request)
-
-        prepped = request.prepare()
-
-        if method == 'POST':
-            response = requests.post(
-                prepped.url,
-                headers=prepped.headers,
-                data=data,
-            )
-            logger.info(response.text)
-        if method == 'PATCH':
-            response = requests.patch(
-                prepped.url,
-                headers=prepped.headers,
-                data=data,
-            )
-            logger.info(f"AWS backend call response: {response.text}")
+
+    def prewarm(self):
+        # Loads boto3, builds the clients and resolves the signing credentials ahead of the first call
+        start = time.monotonic()
+        try:
+            for client in (self.kinesis_client, self.cloudwatchlogs_client):
+                if isinstance(client, LazyProxy):
+                    client.load()
+            self.signed_api.prewarm()
+        except Exception as e:
+            logger.error(f"Prewarming the AWS clients failed: {e}")
+            return False
+        logger.info(f"AWS clients ready in {time.monotonic() - start:.2f}s")
+        return True
 
     # See options for authenticating here: https://boto3.amazonaws.com/v1/documentation/api/latest/guide/credentials.html#credentials
     def get_auth_client(self, service_name):
@@ -88,11 +193,13 @@ class KinesisClient:
 
         return record
 
-    def put_record(self, record):
+    def put_record(self, record, bed_id=None):
+        keys = self.partitioner.partition(upload_id=str(uuid.uuid4()), sensor_ssid=os.environ.get("SENSOR_SSID"),
+                                          bed_id=bed_id)
         record_result = self.kinesis_client.put_record(
             StreamName=os.environ["STREAM_NAME"],
             Data=record,
-            PartitionKey=os.environ["PARTITION_KEY"],
+            **keys,
             # SequenceNumberForOrdering=record.get(
             #     "SequenceNumberForOrdering",
             #      None,
@@ -102,31 +209,52 @@ class KinesisClient:
         logger.info(f"Wrote record successfully")
 
     def put_records(self, records):
-        logger.info("############# KINESIS #############")
-        logger.info("sending records to kinesis")
-        records_result = self.kinesis_client.put_records(
+        # Only queues the records, the producer thread sends them
+        queued = self.producer.put_records(records)
+        logger.info(f"Queued {queued} records for kinesis")
+
+    def on_records_delivered(self, count):
+        self.write_cloudwatch_log(
+            f"Sensor {self.source}: Data successfully sent to kinesis")
+        logger.info(f"Wrote {count} records to kinesis")
+
+    def spool_records(self, records):
+        # Records the producer could not deliver are kept on disk until the replayer gets them out
+        payload = json.dumps([
+            dict(record, Data=base64.b64encode(
+                record["Data"].encode("utf-8") if isinstance(record["Data"], str) else record["Data"]
+            ).decode("ascii"))
+            for record in records
+        ])
+        self.spool.append("kinesis", payload)
+        logger.info(f"Spooled {len(records)} kinesis records")
+
+    def deliver_spooled_records(self, payload):
+        records = [dict(record, Data=base64.b64decode(record["Data"])) for record in json.loads(payload)]
+        self.stream_limiter.acquire(records=len(records), size=sum(record_size(record) for record in records))
+        result = self.kinesis_client.put_records(
             Records=records,
             StreamName=os.environ["STREAM_NAME"],
-            # StreamARN=os.environ["STREAM_ARN"]
         )
-        self.write_cloudwatch_log(
-            f"Sensor {os.environ['SENSOR_SSID']}: Data successfully sent to kinesis")
-        logger.info(f"Wrote all records successfully")
-        logger.info("############ END KINESIS ###########")
-
+        failed = [record for record, entry in zip(records, result["Records"]) if "ErrorCode" in entry]
+        if failed:
+            self.spool_records(failed)
+        return True
 
     def write_cloudwatch_log(self, message):
-        now_ns = time.time_ns()
-        now_ms = int(now_ns / 1000000)
+        # Only buffers the event, the log shipper thread sends it
+        self.log_shipper.log(message)
+
+    def spool_log_events(self, events):
+        self.spool.append("logs", json.dumps(events))
+        self.spool_replayer.wake()
 
+    def deliver_spooled_log(self, payload):
+        events = json.loads(payload)
+        self.log_limiter.acquire(size=sum(event_size(event) for event in events))
         self.cloudwatchlogs_client.put_log_events(
-            logGroupName="heritage-oaks-prod-sensor-log-group",
-            logStreamName="heritage-oaks-prod-sensor-log-stream",
-            logEvents=[
-                {
-                    "timestamp": now_ms,
-                    "message": message,
-                },
-            ],
+            logGroupName=LOG_GROUP_NAME,
+            logStreamName=LOG_STREAM_NAME,
+            logEvents=sorted(events, key=lambda event: event["timestamp"]),
         )
-
+        return True
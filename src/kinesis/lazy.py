@@ -0,0 +1,31 @@
+import threading
+
+
+class LazyProxy:
+    """
+    Stands in for an object that is expensive to create (a boto3 session or client): the
+    factory runs on first attribute access, or on `load()`, and every attribute is then looked
+    up on the real object.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._target is not None
+
+    def load(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, name):
+        # Only called for attributes the proxy itself does not have
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
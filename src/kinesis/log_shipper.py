@@ -0,0 +1,204 @@
+import atexit
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from metrics import LatencyStats
+from .throttle import is_throttling_error
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+# PutLogEvents API limits
+MAX_EVENTS_PER_BATCH = 10000
+MAX_BYTES_PER_BATCH = 1048576
+EVENT_OVERHEAD_BYTES = 26
+MAX_BATCH_SPAN_MS = 24 * 60 * 60 * 1000
+
+
+def event_size(event):
+    return len(event["message"].encode("utf-8")) + EVENT_OVERHEAD_BYTES
+
+
+def pack_log_events(events):
+    """
+    Split log events into batches that fit in one PutLogEvents request. Events must be in
+    chronological order.
+    """
+    batch = []
+    batch_bytes = 0
+    for event in events:
+        size = event_size(event)
+        if batch and (len(batch) == MAX_EVENTS_PER_BATCH or batch_bytes + size > MAX_BYTES_PER_BATCH
+                      or event["timestamp"] - batch[0]["timestamp"] >= MAX_BATCH_SPAN_MS):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(event)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+class CloudWatchLogShipper:
+    """
+    Buffers log events and ships them to CloudWatch from a background thread.
+
+    `log` never blocks. The buffer is flushed when it holds `max_batch_events` events or
+    `max_batch_bytes` bytes, or when its oldest event is `max_age` seconds old. When the buffer is
+    full, new events are sampled: only every `sample_every`-th is kept, replacing the oldest.
+
+    Batches that cannot be shipped go to `on_failed`. While `is_backlogged()` is true, e.g. older
+    batches are still spooled, new batches go straight to `on_failed` so they ship after those.
+    """
+
+    def __init__(self, client, log_group, log_stream, max_buffer_events=5000, max_batch_events=100,
+                 max_batch_bytes=256 * 1024, max_age=5, sample_every=10, on_failed=None, limiter=None,
+                 is_backlogged=None):
+        self.client = client
+        self.log_group = log_group
+        self.log_stream = log_stream
+        self.max_buffer_events = max_buffer_events
+        self.max_batch_events = min(max_batch_events, MAX_EVENTS_PER_BATCH)
+        self.max_batch_bytes = min(max_batch_bytes, MAX_BYTES_PER_BATCH)
+        self.max_age = max_age
+        self.sample_every = sample_every
+        self.on_failed = on_failed
+        self.limiter = limiter
+        self.is_backlogged = is_backlogged
+
+        self.stats = {"logged": 0, "shipped": 0, "dropped": 0, "failed": 0, "deferred": 0}
+        self.flush_latency = LatencyStats()
+
+        self._buffer = deque()
+        self._buffer_bytes = 0
+        self._oldest_at = None
+        self._overflow_count = 0
+        self._lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, message, timestamp=None):
+        if timestamp is None:
+            timestamp = int(time.time_ns() / 1000000)
+        event = {"timestamp": timestamp, "message": message}
+
+        with self._lock:
+            self.stats["logged"] += 1
+            if len(self._buffer) >= self.max_buffer_events:
+                self._overflow_count += 1
+                if self._overflow_count % self.sample_every:
+                    self.stats["dropped"] += 1
+                    return
+                dropped = self._buffer.popleft()
+                self._buffer_bytes -= event_size(dropped)
+                self.stats["dropped"] += 1
+            else:
+                self._overflow_count = 0
+
+            if not self._buffer:
+                self._oldest_at = time.monotonic()
+            self._buffer.append(event)
+            self._buffer_bytes += event_size(event)
+            if len(self._buffer) >= self.max_batch_events or self._buffer_bytes >= self.max_batch_bytes:
+                self._flush_event.set()
+
+    def queue_depth(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self.stats, queue_depth=len(self._buffer), queue_bytes=self._buffer_bytes)
+        metrics["flush_latency"] = self.flush_latency.snapshot().get("put_log_events")
+        return metrics
+
+    def flush(self):
+        with self._lock:
+            events = list(self._buffer)
+            self._buffer.clear()
+            self._buffer_bytes = 0
+            self._oldest_at = None
+        if not events:
+            return
+
+        events.sort(key=lambda event: event["timestamp"])
+        for batch in pack_log_events(events):
+            self._ship(batch)
+
+    def close(self, timeout=10):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._flush_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                oldest_at = self._oldest_at
+            timeout = self.max_age if oldest_at is None else max(0, oldest_at + self.max_age - time.monotonic())
+            self._flush_event.wait(timeout)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error while shipping cloudwatch logs: {e}")
+        self.flush()
+
+    def _ship(self, batch, retries=2):
+        if self.on_failed is not None and self.is_backlogged is not None and self.is_backlogged():
+            with self._lock:
+                self.stats["deferred"] += len(batch)
+            self.on_failed(batch)
+            return
+
+        for attempt in range(retries + 1):
+            if self.limiter is not None:
+                # Log groups are limited by bytes and calls only
+                self.limiter.acquire(size=sum(event_size(event) for event in batch))
+            start = time.monotonic()
+            try:
+                self.client.put_log_events(
+                    logGroupName=self.log_group,
+                    logStreamName=self.log_stream,
+                    logEvents=batch,
+                )
+            except Exception as e:
+                self.flush_latency.record("put_log_events", time.monotonic() - start, error=True)
+                if self.limiter is not None and is_throttling_error(e):
+                    self.limiter.on_throttle()
+                logger.error(f"Failed to ship {len(batch)} cloudwatch log events: {e}")
+                if attempt < retries:
+                    time.sleep(0.2 * (2 ** attempt) * random.uniform(0.5, 1.5))
+            else:
+                self.flush_latency.record("put_log_events", time.monotonic() - start)
+                if self.limiter is not None:
+                    self.limiter.on_success()
+                with self._lock:
+                    self.stats["shipped"] += len(batch)
+                return
+
+        with self._lock:
+            self.stats["failed"] += len(batch)
+        if self.on_failed is not None:
+            self.on_failed(batch)
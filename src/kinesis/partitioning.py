@@ -0,0 +1,155 @@
+import argparse
+import hashlib
+import os
+import uuid
+from abc import ABC, abstractmethod
+
+HASH_KEY_SPACE = 2 ** 128
+
+
+def hash_key(partition_key):
+    # Kinesis maps a partition key to a shard through the MD5 hash of the key
+    return int(hashlib.md5(partition_key.encode("utf-8")).hexdigest(), 16)
+
+
+class Partitioner(ABC):
+    """
+    Picks the partition key (and optionally an explicit hash key) for an upload. Every record of
+    one upload gets the same keys, so records stay ordered within the upload.
+    """
+    name = None
+
+    @abstractmethod
+    def partition(self, upload_id, sensor_ssid=None, bed_id=None):
+        """
+        Return the keys for the records of one upload: a dict with "PartitionKey" and
+        optionally "ExplicitHashKey".
+        """
+
+
+class StaticPartitioner(Partitioner):
+    # The original behaviour: one configured key for the whole fleet
+    name = "static"
+
+    def __init__(self, partition_key=None):
+        self.partition_key = partition_key
+
+    def partition(self, upload_id, sensor_ssid=None, bed_id=None):
+        return {"PartitionKey": self.partition_key or os.environ["PARTITION_KEY"]}
+
+
+class SensorPartitioner(Partitioner):
+    name = "sensor"
+
+    def partition(self, upload_id, sensor_ssid=None, bed_id=None):
+        return {"PartitionKey": f"sensor-{sensor_ssid}"}
+
+
+class BedPartitioner(Partitioner):
+    # Falls back to the sensor until a bed id has been assigned over BLE
+    name = "bed"
+
+    def partition(self, upload_id, sensor_ssid=None, bed_id=None):
+        if bed_id is None:
+            return {"PartitionKey": f"sensor-{sensor_ssid}"}
+        return {"PartitionKey": f"bed-{bed_id}"}
+
+
+class SessionPartitioner(Partitioner):
+    name = "session"
+
+    def partition(self, upload_id, sensor_ssid=None, bed_id=None):
+        return {"PartitionKey": f"upload-{upload_id}"}
+
+
+class ExplicitHashPartitioner(Partitioner):
+    """
+    Gives every sensor of a fleet of known size its own evenly spaced slot in the hash key space,
+    so sensors spread over the shards exactly instead of statistically.
+    """
+    name = "explicit"
+
+    def __init__(self, index=None, fleet_size=None):
+        self.index = index
+        self.fleet_size = fleet_size
+
+    def partition(self, upload_id, sensor_ssid=None, bed_id=None):
+        index = self.index if self.index is not None else int(os.environ["PARTITION_INDEX"])
+        fleet_size = self.fleet_size if self.fleet_size is not None else int(os.environ["PARTITION_FLEET_SIZE"])
+        # Aim at the middle of the slot, clear of the shard boundaries
+        explicit_hash_key = (2 * index + 1) * HASH_KEY_SPACE // (2 * fleet_size)
+        return {"PartitionKey": f"sensor-{sensor_ssid}", "ExplicitHashKey": str(explicit_hash_key)}
+
+
+PARTITIONERS = {
+    partitioner.name: partitioner
+    for partitioner in (StaticPartitioner, SensorPartitioner, BedPartitioner, SessionPartitioner,
+                        ExplicitHashPartitioner)
+}
+
+
+def get_partitioner(name=None):
+    if name is None:
+        name = os.environ.get("PARTITION_STRATEGY", StaticPartitioner.name)
+    if name not in PARTITIONERS:
+        raise ValueError(f"Unknown partition strategy {name}")
+    return PARTITIONERS[name]()
+
+
+def shard_for(keys, shard_count):
+    # Shards are assumed to split the hash key space evenly, as after a uniform scaling
+    if "ExplicitHashKey" in keys:
+        key = int(keys["ExplicitHashKey"])
+    else:
+        key = hash_key(keys["PartitionKey"])
+    return key * shard_count // HASH_KEY_SPACE
+
+
+def simulate_shard_distribution(strategy, fleet_size, shard_count, uploads_per_sensor=10, partition_key="fleet"):
+    """
+    Count the uploads each shard receives when `fleet_size` sensors each upload
+    `uploads_per_sensor` times with the given strategy.
+    """
+    counts = [0] * shard_count
+    for index in range(fleet_size):
+        if strategy == ExplicitHashPartitioner.name:
+            partitioner = ExplicitHashPartitioner(index=index, fleet_size=fleet_size)
+        elif strategy == StaticPartitioner.name:
+            partitioner = StaticPartitioner(partition_key)
+        else:
+            partitioner = get_partitioner(strategy)
+        for _ in range(uploads_per_sensor):
+            keys = partitioner.partition(upload_id=str(uuid.uuid4()), sensor_ssid=f"JXN-{index:04d}",
+                                         bed_id=f"bed-{index}")
+            counts[shard_for(keys, shard_count)] += 1
+
+    mean = sum(counts) / shard_count
+    return {
+        "strategy": strategy,
+        "fleet_size": fleet_size,
+        "shard_count": shard_count,
+        "uploads": sum(counts),
+        "counts": counts,
+        "max_over_mean": max(counts) / mean if mean else 0.0,
+        "idle_shards": counts.count(0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate how a partition strategy spreads a fleet over shards")
+    parser.add_argument("--strategy", choices=sorted(PARTITIONERS), default=None,
+                        help="strategy to simulate (default: all)")
+    parser.add_argument("--fleet", type=int, default=50, help="number of sensors")
+    parser.add_argument("--shards", type=int, default=4, help="number of shards in the stream")
+    parser.add_argument("--uploads", type=int, default=10, help="uploads per sensor")
+    args = parser.parse_args()
+
+    strategies = [args.strategy] if args.strategy else sorted(PARTITIONERS)
+    for strategy in strategies:
+        result = simulate_shard_distribution(strategy, args.fleet, args.shards, args.uploads)
+        print(f"{strategy:>8}: max/mean {result['max_over_mean']:.2f}, idle shards {result['idle_shards']}, "
+              f"uploads per shard {result['counts']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import atexit
+import logging
+import queue
+import random
+import threading
+import time
+
+from metrics import tracer
+from .throttle import is_throttling_error
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+# PutRecords API limits
+MAX_RECORDS_PER_REQUEST = 500
+MAX_BYTES_PER_REQUEST = 5 * 1024 * 1024
+MAX_BYTES_PER_RECORD = 1024 * 1024
+
+
+def record_size(record):
+    # Kinesis counts the data blob and the partition key against the size limits
+    data = record["Data"]
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return len(data) + len(record["PartitionKey"].encode("utf-8"))
+
+
+def pack_records(records):
+    """
+    Split records into batches that fit in one PutRecords request.
+    """
+    batch = []
+    batch_bytes = 0
+    for record in records:
+        size = record_size(record)
+        if batch and (len(batch) == MAX_RECORDS_PER_REQUEST or batch_bytes + size > MAX_BYTES_PER_REQUEST):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(record)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+class KinesisProducer:
+    """
+    Queues records and ships them to Kinesis from a background thread.
+
+    `put_records` never blocks: records are dropped (and counted) when the queue is full. The
+    flusher packs queued records into requests within the PutRecords limits, retries the
+    entries Kinesis reports as failed with exponential backoff, and drains the queue on shutdown.
+    Records that still fail after `max_retries` are handed to `on_failed`, if given. With a
+    `limiter`, every request is shaped to the stream's throughput and throttling slows it down.
+    """
+
+    def __init__(self, client, stream_name, max_queue_records=10000, linger=0.2, max_retries=5, backoff=0.1,
+                 on_delivered=None, on_failed=None, limiter=None):
+        self.client = client
+        self.stream_name = stream_name
+        self.linger = linger
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.on_delivered = on_delivered
+        self.on_failed = on_failed
+        self.limiter = limiter
+
+        self.stats = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "dropped": 0}
+        self._stats_lock = threading.Lock()
+
+        self._queue = queue.Queue(maxsize=max_queue_records)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put_records(self, records):
+        queued = 0
+        for record in records:
+            if record_size(record) > MAX_BYTES_PER_RECORD:
+                logger.error("Dropping a record larger than the 1 MB Kinesis limit")
+                self._count("dropped")
+                continue
+            try:
+                self._queue.put_nowait(record)
+                queued += 1
+            except queue.Full:
+                self._count("dropped", len(records) - queued)
+                logger.error(f"Kinesis queue is full. Dropped {len(records) - queued} records")
+                break
+        self._count("queued", queued)
+        return queued
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        # Blocks until everything queued so far has been sent or given up on
+        self._queue.join()
+
+    def close(self, timeout=10):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return
+                continue
+
+            records = [first]
+            deadline = time.monotonic() + self.linger
+            while len(records) < MAX_RECORDS_PER_REQUEST:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0 or self._stop_event.is_set():
+                        records.append(self._queue.get_nowait())
+                    else:
+                        records.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                for batch in pack_records(records):
+                    self._send(batch)
+            finally:
+                for _ in records:
+                    self._queue.task_done()
+
+    def _send(self, batch):
+        attempt = 0
+        while batch:
+            if self.limiter is not None:
+                self.limiter.acquire(records=len(batch), size=sum(record_size(record) for record in batch))
+            try:
+                with tracer.span("kinesis.put_records"):
+                    result = self.client.put_records(Records=batch, StreamName=self.stream_name)
+            except Exception as e:
+                failed = batch
+                throttled = is_throttling_error(e)
+                logger.error(f"Kinesis put_records failed: {e}")
+            else:
+                failed_entries = [(record, entry) for record, entry in zip(batch, result["Records"])
+                                  if "ErrorCode" in entry]
+                failed = [record for record, _ in failed_entries]
+                throttled = any(is_throttling_error(entry["ErrorCode"]) for _, entry in failed_entries)
+                delivered = len(batch) - len(failed)
+                self._count("sent", delivered)
+                if delivered and self.on_delivered is not None:
+                    self.on_delivered(delivered)
+
+            if self.limiter is not None:
+                if throttled:
+                    self.limiter.on_throttle()
+                else:
+                    self.limiter.on_success()
+
+            if not failed:
+                return
+            if attempt >= self.max_retries:
+                self._count("failed", len(failed))
+                logger.error(f"Giving up on {len(failed)} Kinesis records after {attempt} retries")
+                if self.on_failed is not None:
+                    self.on_failed(failed)
+                return
+
+            self._count("retried", len(failed))
+            time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+            attempt += 1
+            batch = failed
+
+    def _count(self, key, value=1):
+        with self._stats_lock:
+            self.stats[key] += value
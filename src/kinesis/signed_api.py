@@ -0,0 +1,144 @@
+import json
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+from metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+# Methods that can be repeated without side effects once the backend has seen them
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def request_not_sent(error):
+    # Failing to connect (refused, unresolvable, connect timeout) means the backend never saw the request
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, ConnectTimeoutError)
+
+
+class SignedApiClient:
+    """
+    SigV4 signed client for the JXN API.
+
+    Credentials are resolved once and kept frozen until botocore reports that they need a
+    refresh, the signer is reused between calls and requests go through one keep-alive session,
+    so a call only pays for signing and the request itself.
+    """
+
+    def __init__(self, session, api_key, region="us-west-2", service="execute-api", timeout=10, retries=1,
+                 backoff=0.2, pool_size=4):
+        self.session = session
+        self.api_key = api_key
+        self.region = region
+        self.service = service
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.latency = LatencyStats()
+
+        self._credentials = None
+        self._frozen_credentials = None
+        self._signer = None
+        self._signer_lock = threading.Lock()
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+    def request(self, method, endpoint, data_obj=None, timeout=None, idempotency_key=None):
+        """
+        Sign and send a request, retried with jittered backoff; the last response is returned or
+        the last error raised. Idempotent methods are retried after connection errors, timeouts
+        and 5xx responses. POST and PATCH are only retried when the request never reached the
+        backend, since a timeout or 5xx may come after the backend acted on it.
+
+        `idempotency_key` goes out as the Idempotency-Key header, so the backend can recognise
+        a call that is sent again, e.g. replayed from the spool.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        data = json.dumps(data_obj) if data_obj is not None else None
+        key = f"{method} {urlparse(endpoint).path}"
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            headers = self._sign(method, endpoint, data, idempotency_key)
+            start = time.monotonic()
+            try:
+                response = self.http.request(method, endpoint, headers=headers, data=data, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.latency.record(key, time.monotonic() - start, error=True)
+                if attempt >= self.retries or not (idempotent or request_not_sent(e)):
+                    raise
+                logger.info(f"{key} failed ({e}). Retrying")
+            else:
+                is_error = response.status_code >= 500
+                self.latency.record(key, time.monotonic() - start, error=is_error)
+                if not is_error or attempt >= self.retries or not idempotent:
+                    return response
+                logger.info(f"{key} returned {response.status_code}. Retrying")
+
+            time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+            attempt += 1
+
+    def get(self, endpoint, **kwargs):
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint, data_obj, **kwargs):
+        return self.request("POST", endpoint, data_obj, **kwargs)
+
+    def put(self, endpoint, data_obj, **kwargs):
+        return self.request("PUT", endpoint, data_obj, **kwargs)
+
+    def patch(self, endpoint, data_obj, **kwargs):
+        return self.request("PATCH", endpoint, data_obj, **kwargs)
+
+    def delete(self, endpoint, **kwargs):
+        return self.request("DELETE", endpoint, **kwargs)
+
+    def close(self):
+        self.http.close()
+
+    def prewarm(self):
+        self._get_signer()
+
+    def _sign(self, method, endpoint, data, idempotency_key=None):
+        from botocore.awsrequest import AWSRequest
+
+        headers = {"Content-Type": "application/x-amz-json-1.1", "x-api-key": self.api_key}
+        if idempotency_key is not None:
+            headers["Idempotency-Key"] = idempotency_key
+        request = AWSRequest(method=method, url=endpoint, data=data, headers=headers)
+        self._get_signer().add_auth(request)
+        return dict(request.headers.items())
+
+    def _get_signer(self):
+        from botocore.auth import SigV4Auth
+
+        with self._signer_lock:
+            if self._credentials is None:
+                self._credentials = self.session.get_credentials()
+            refresh_needed = getattr(self._credentials, "refresh_needed", None)
+            if self._signer is None or (refresh_needed is not None and refresh_needed()):
+                self._frozen_credentials = self._credentials.get_frozen_credentials()
+                self._signer = SigV4Auth(self._frozen_credentials, self.service, self.region)
+            return self._signer
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+
+THROTTLING_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "LimitExceededException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+}
+
+# Per shard write limits of a Kinesis stream
+SHARD_RECORDS_PER_SECOND = 1000
+SHARD_BYTES_PER_SECOND = 1024 * 1024
+
+
+def is_throttling_error(error):
+    # Works for botocore ClientErrors and for the ErrorCode of a failed PutRecords entry
+    if isinstance(error, str):
+        return error in THROTTLING_ERROR_CODES
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        return False
+    return response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+
+class TokenBucket:
+    """
+    Token bucket that lets callers reserve tokens ahead of time: `reserve` always takes the
+    tokens and returns how long the caller has to wait before using them.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+
+    def set_rate(self, rate):
+        self._refill()
+        self.rate = float(rate)
+
+    def reserve(self, amount):
+        self._refill()
+        self._tokens -= amount
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+class AdaptiveRateLimiter:
+    """
+    Shapes calls to one stream or log group with token buckets for records/s, bytes/s and
+    calls/s (any of them may be None for no limit).
+
+    The rates adapt AIMD style: a throttling response multiplies them by `decrease` (down to
+    `min_fraction` of the configured limit), every successful call adds `increase` times the
+    configured limit back, up to the limit itself.
+    """
+
+    def __init__(self, name, records_per_second=None, bytes_per_second=None, calls_per_second=None,
+                 decrease=0.5, increase=0.05, min_fraction=0.05):
+        self.name = name
+        self.limits = {
+            "records": records_per_second,
+            "bytes": bytes_per_second,
+            "calls": calls_per_second,
+        }
+        self.decrease = decrease
+        self.increase = increase
+        self.min_fraction = min_fraction
+
+        self.fraction = 1.0
+        self.stats = {"throttled": 0, "successes": 0, "waited_seconds": 0.0}
+        self._buckets = {key: TokenBucket(limit) for key, limit in self.limits.items() if limit}
+        self._lock = threading.Lock()
+
+    def acquire(self, records=0, size=0, calls=1):
+        amounts = {"records": records, "bytes": size, "calls": calls}
+        with self._lock:
+            wait = 0.0
+            for key, bucket in self._buckets.items():
+                # Never ask for more than a bucket can hold, or a large batch would wait forever
+                wait = max(wait, bucket.reserve(min(amounts[key], bucket.burst)))
+            self.stats["waited_seconds"] += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_success(self):
+        with self._lock:
+            self.stats["successes"] += 1
+            if self.fraction < 1.0:
+                self._set_fraction(min(1.0, self.fraction + self.increase))
+
+    def on_throttle(self):
+        with self._lock:
+            self.stats["throttled"] += 1
+            self._set_fraction(max(self.min_fraction, self.fraction * self.decrease))
+
+    def current_rates(self):
+        with self._lock:
+            return {key: bucket.rate for key, bucket in self._buckets.items()}
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, name=self.name, fraction=self.fraction,
+                        rates={key: bucket.rate for key, bucket in self._buckets.items()})
+
+    def _set_fraction(self, fraction):
+        self.fraction = fraction
+        for key, bucket in self._buckets.items():
+            bucket.set_rate(self.limits[key] * fraction)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name, **limits):
+    """
+    Return the limiter shared by everything writing to `name` (a stream or log group), creating
+    it with `limits` on first use.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(name, **limits)
+            _limiters[name] = limiter
+        return limiter
+
+
+def stream_limiter(stream_name):
+    shards = int(os.environ.get("STREAM_SHARDS", 1))
+    calls = os.environ.get("KINESIS_CALLS_PER_SECOND")
+    return get_limiter(f"kinesis:{stream_name}",
+                       records_per_second=SHARD_RECORDS_PER_SECOND * shards,
+                       bytes_per_second=SHARD_BYTES_PER_SECOND * shards,
+                       calls_per_second=float(calls) if calls else None)
+
+
+def log_group_limiter(log_group):
+    return get_limiter(f"logs:{log_group}",
+                       bytes_per_second=float(os.environ.get("CLOUDWATCH_BYTES_PER_SECOND", 1024 * 1024)),
+                       calls_per_second=float(os.environ.get("CLOUDWATCH_CALLS_PER_SECOND", 5)))
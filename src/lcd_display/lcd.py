@@ -1,18 +1,32 @@
 import threading
-import time
 from rpi_lcd import LCD
 from signal import signal, SIGTERM, SIGHUP
 
+from dispatch import Scheduler
+
 # Initialize the LCD
 lcd = LCD()
 
 
 class ScrollingText:
-    def __init__(self):
-        self._thread = None
+    """
+    Shows two lines on the LCD. Lines longer than the display scroll in 16 character chunks,
+    one every `chunk_seconds`, driven by a periodic job on the shared scheduler instead of a
+    thread of their own.
+    """
+
+    def __init__(self, scheduler=None, chunk_seconds=2):
+        if scheduler is None:
+            scheduler = Scheduler()
+            scheduler.start()
+        self.scheduler = scheduler
+        self.chunk_seconds = chunk_seconds
         self._line1 = ""
         self._line2 = ""
-        self._stop_event = threading.Event()
+        self._screens = []
+        self._screen_index = 0
+        self._job = None
+        self._lock = threading.Lock()
 
     @property
     def line1(self):
@@ -21,7 +35,7 @@ class ScrollingText:
     @line1.setter
     def line1(self, value):
         self._line1 = value
-        self._restart_thread()
+        self._restart()
 
     @property
     def line2(self):
@@ -30,7 +44,7 @@ class ScrollingText:
     @line2.setter
     def line2(self, value):
         self._line2 = value
-        self._restart_thread()
+        self._restart()
 
     def clear_line(self, line_number):
         if line_number == 1:
@@ -38,64 +52,61 @@ class ScrollingText:
         elif line_number == 2:
             self.line2 = ""
 
-    def _scroll_thread(self):
-        while not self._stop_event.is_set():
-            self._scroll_line(self._line1, self._line2)
-
-    def _scroll_line(self, text1, text2):
+    @staticmethod
+    def screens(text1, text2):
+        """
+        The (line 1, line 2) contents to cycle through. A line that fits is shown as is, unless
+        the other line scrolls, in which case it is blank while the chunks are shown.
+        """
         scroll_line1 = len(text1) > 16
         scroll_line2 = len(text2) > 16
-
-        if not scroll_line1:
-            lcd.text(text1, 1)
-        else:
-            lcd.text(" " * 16, 1)  # Clear the line
-
-        if not scroll_line2:
-            lcd.text(text2, 2)
-        else:
-            lcd.text(" " * 16, 2)  # Clear the line
-
-        if scroll_line1 or scroll_line2:
-            max_length = max(len(text1), len(text2))
-            num_chunks = (max_length - 16) // 16 + 1
-            remaining_chars = max_length % 16  # Number of characters to display at the end
-            for chunk_num in range(num_chunks):
-                chunk_start = chunk_num * 16
-                if self._stop_event.is_set():
-                    break
-                if scroll_line1:
-                    chunk1 = text1[chunk_start:chunk_start + 16]
-                else:
-                    chunk1 = ""
-                if scroll_line2:
-                    chunk2 = text2[chunk_start:chunk_start + 16]
-                else:
-                    chunk2 = ""
-                lcd.text(chunk1, 1)
-                lcd.text(chunk2, 2)
-                time.sleep(2)  # Adjust the sleep duration for scrolling speed
-                # Sleep here to control the delay between chunks
-            # Display the remaining characters at the end
-            if remaining_chars > 0:
-                lcd.text(text1[-remaining_chars:], 1)
-                lcd.text(text2[-remaining_chars:], 2)
-                time.sleep(2)  # Adjust the sleep duration for scrolling speed
-    # Adjust the sleep duration for scrolling speed
-
-    def _restart_thread(self):
-        if self._thread is not None:
-            self._stop_event.set()
-            self._thread.join()
-        self._stop_event.clear()
-        self._thread = threading.Thread(target=self._scroll_thread)
-        self._thread.start()
+        first = (" " * 16 if scroll_line1 else text1, " " * 16 if scroll_line2 else text2)
+        if not scroll_line1 and not scroll_line2:
+            return [first]
+
+        screens = [first]
+        max_length = max(len(text1), len(text2))
+        num_chunks = (max_length - 16) // 16 + 1
+        remaining_chars = max_length % 16  # Number of characters to display at the end
+        for chunk_num in range(num_chunks):
+            chunk_start = chunk_num * 16
+            chunk1 = text1[chunk_start:chunk_start + 16] if scroll_line1 else ""
+            chunk2 = text2[chunk_start:chunk_start + 16] if scroll_line2 else ""
+            screens.append((chunk1, chunk2))
+        # Display the remaining characters at the end
+        if remaining_chars > 0:
+            screens.append((text1[-remaining_chars:], text2[-remaining_chars:]))
+        return screens
+
+    def _restart(self):
+        with self._lock:
+            if self._job is not None:
+                self._job.cancel()
+                self._job = None
+            self._screens = self.screens(self._line1, self._line2)
+            self._screen_index = 0
+            self._show_next()
+            if len(self._screens) > 1:
+                self._job = self.scheduler.call_every(self.chunk_seconds, self._tick)
+
+    def _tick(self):
+        with self._lock:
+            self._show_next()
+
+    def _show_next(self):
+        # The first screen only clears the scrolling lines, the chunks follow right after it
+        text1, text2 = self._screens[self._screen_index]
+        lcd.text(text1, 1)
+        lcd.text(text2, 2)
+        self._screen_index = (self._screen_index + 1) % len(self._screens)
+        if self._screen_index == 1:
+            self._show_next()
 
     def stop(self):
-        self._stop_event.set()
-        if self._thread is not None:
-            self._thread.join()
-            self._thread = None
+        with self._lock:
+            if self._job is not None:
+                self._job.cancel()
+                self._job = None
 
 
 def safe_exit(signum, frame):
@@ -3,16 +3,17 @@ import os
 import threading
 import logging
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 
-from sseclient import SSEClient
-from bluetooth_package import BluetoothService
 from kinesis import KinesisClient
-from sensor import get_frames_within_window, format_sensor_data, delete_all_frames, set_frequency, \
-    set_rotation_interval, reset_rotation_interval, check_sensor_connection, initialize_default_sensor
-from lcd_display import ScrollingText
-from wifi import connect_to_wifi_network, check_internet_connection
-from gpio import turn_relay_off, turn_relay_on, cleanup
+from sensor import format_sensor_matrices, delete_all_frames, set_frequency, \
+    set_rotation_interval, reset_rotation_interval, check_sensor_connection, initialize_default_sensor, \
+    FramePrefetcher, FrameStreamer, FrameArchive, SensorClient, streaming_enabled, SSEIngest, SSEHub, parse_event
+from wifi import connect_to_wifi_network, check_internet_connection, reconnect_wireless_interface, get_probe, \
+    get_network_monitor
+from dispatch import PriorityDispatcher, EventQueue, Scheduler, CRITICAL, STATE, TELEMETRY, BACKGROUND, \
+    DEFAULT_LANES
+from metrics import StartupTimer, tracer
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -25,17 +26,42 @@ logger.addHandler(filelogHandler)
 logger.addHandler(logHandler)
 
 
+def occurred_at():
+    # When an event was detected, sent along so a call replayed from the spool is not taken for a new one
+    return datetime.now(timezone.utc).isoformat()
+
+
 class BedExitMonitor:
-    def __init__(self):
-        self.lcd_manager = ScrollingText()
+    # The hardware (BLE, LCD, GPIO) is only imported where it is used, so the monitor can also be
+    # built off the Pi with stand-ins for the sensor, AWS and the display (see the replay package).
+    # The scheduler, dispatcher, event queue and SSE hub can be shared by the monitors of several
+    # beds (see MultiBedMonitor); everything not handed in is created for this monitor alone
+    def __init__(self, kinesis_client=None, sensor_client=None, frame_prefetcher=None, lcd_manager=None,
+                 sensor_url=None, sensor_ssid=None, gpio_pin=4, scheduler=None, dispatcher=None, event_queue=None,
+                 sse_hub=None):
+        self.startup_timer = StartupTimer(expected=("ble_advertising", "first_sse_event"))
+        self.sensor_ssid = sensor_ssid or os.environ["SENSOR_SSID"]
+        # All deferred and periodic work (debounce, health checks, recovery, LCD) runs off one scheduler
+        self.scheduler = scheduler or Scheduler()
+        self.scheduler.start()
+        if lcd_manager is None:
+            from lcd_display import ScrollingText
+            lcd_manager = ScrollingText(self.scheduler)
+        self.lcd_manager = lcd_manager
         self.bed_id = None
         self.is_present = False
         self.is_sensor_present = False
         self.is_timer_enabled = False
-        self.timer_thread = None
+        self.presence_job = None
+        self.presence_debounce = 10
         self.frame_id = None
-        self.sensor_url = os.environ["SENSOR_URL"]
-        self.gpio_pin = 4
+        self.sensor_client = sensor_client  # None talks to SENSOR_URL through the sensor module's client
+        self.frame_prefetcher = frame_prefetcher or FramePrefetcher()
+        self.sensor_url = sensor_url or os.environ["SENSOR_URL"]
+        self.gpio_pin = gpio_pin
+        self.check_network = True  # off when the gateway checks the network once for all beds
+        self.wireless_interface = os.environ.get("WIFI_INTERFACE", "wlan0")
+        self.wifi_reconnect_job = None
 
         # all threads
         self.bluetooth_service_thread = None
@@ -43,24 +69,65 @@ class BedExitMonitor:
         self.sensor_recovery_in_progress = False
 
         # SSE Client
-        self.api_monitor_sse_client_thread = None
+        self.sse_hub = sse_hub
         self.sse_client = None
-        self.api_monitor_sse_client_thread_stop_flag = False
         self.sse_client_last_updated_at = datetime.now()
 
         # Monitor
-        self.monitor_thread = None
-
-        self.kinesis_client = KinesisClient()  # Replace `KinesisClient` with the actual client initialization code
+        self.monitor_jobs = []
+
+        self.kinesis_client = kinesis_client or KinesisClient()
+
+        # In streaming mode every frame goes out in micro-batches and exits/entries are stamped as markers
+        self.frame_streamer = None
+        if streaming_enabled():
+            self.frame_streamer = FrameStreamer(self.frame_prefetcher, self.kinesis_client.put_records,
+                                                partitioner=self.kinesis_client.partitioner,
+                                                is_present=lambda: self.is_present, bed_id=lambda: self.bed_id,
+                                                sensor_ssid=self.sensor_ssid,
+                                                aggregator=self.kinesis_client.aggregator)
+
+        # Outbound work runs on priority lanes so alerts never wait behind uploads
+        self.dispatcher = dispatcher or PriorityDispatcher()
+
+        # Sensor events are handled off the SSE loop, so a slow handler never stalls ingest.
+        # Presence and frame events share one ordering key: their handlers share is_present,
+        # is_sensor_present, is_timer_enabled and frame_id, and must see the events in wire order
+        self.presence_handlers = {
+            "attended": self.handle_attended_event,
+            "body": self.handle_body_event,
+            "newframe": self.handle_new_frame_event,
+        }
+        handlers = {
+            "presence": self.handle_presence_event,
+            "storage": self.handle_storage_event,
+        }
+        if event_queue is None:
+            self.event_key_prefix = ""
+            self.event_queue = EventQueue(handlers, max_events=int(os.environ.get("EVENT_QUEUE_SIZE", 1000)),
+                                          workers=2)
+        else:
+            # A shared queue keeps each bed's events in order, and the beds independent
+            self.event_key_prefix = f"{self.sensor_ssid}:"
+            self.event_queue = event_queue
+            self.event_queue.add_handlers({self.event_key_prefix + event_type: handler
+                                           for event_type, handler in handlers.items()})
+        self.startup_timer.mark("monitor_initialized")
 
     def start(self):
+        from bluetooth_package import BluetoothService
+        from gpio import cleanup
+
         # Cleanup GPIP
 
         cleanup()
+        self.start_workers()
+        self.watch_network()
         self.lcd_manager.line1 = "Initializing Bluetooth"
 
         # Start the Bluetooth service in a separate thread
-        bluetooth_service = BluetoothService(callback=self.ble_controller)
+        bluetooth_service = BluetoothService(callback=self.ble_controller,
+                                             on_advertising=lambda: self.startup_timer.mark("ble_advertising"))
         self.bluetooth_service_thread = threading.Thread(target=bluetooth_service.start)
         self.bluetooth_service_thread.start()
         time.sleep(2)
@@ -72,208 +139,325 @@ class BedExitMonitor:
         if network_connection:
             # Start the API Monitor
             # Set the turn timer to default value
-            reset_rotation_interval()
-            self.api_monitor_sse_client_thread = threading.Thread(target=self.api_monitor_sse_client)
-            self.api_monitor_sse_client_thread.start()
+            reset_rotation_interval(client=self.sensor_client)
+            self.start_frame_pipeline()
+            self.api_monitor_sse_client()
             time.sleep(2)
 
-            self.kinesis_client.write_cloudwatch_log(f"Sensor {os.environ['SENSOR_SSID']} Starting..")
+            self.kinesis_client.write_cloudwatch_log(f"Sensor {self.sensor_ssid} Starting..")
             self.lcd_manager.line1 = "Sensor: Connected"
             self.lcd_manager.line2 = "WiFi: Connected"
 
-            self.monitor_thread = threading.Thread(target=self.status_monitor)
-            self.monitor_thread.start()
+            self.start_status_monitor()
+            self.prewarm_aws_clients()
         else:
             self.lcd_manager.line1 = "Connect Wifi In App"
             self.lcd_manager.line2 = "WiFi: Not Connected"
 
-    def status_monitor(self):
-        i = 0
-        while True:
-            # check sensor connection
-            if self.sse_client_last_updated_at is not None:
-                time_since_last_update = (datetime.now() - self.sse_client_last_updated_at).total_seconds()
-                if time_since_last_update > 20:
-                    if not self.sensor_recovery_in_progress:
-                        self.sensor_recovery_in_progress = True
-                        logger.info("Starting sensor recovery thread")
-                        self.kinesis_client.write_cloudwatch_log(f"Sensor {os.environ['SENSOR_SSID']} lost connection. Starting recovery thread")
-                        threading.Thread(target=self.sensor_recovery).start()
-
-            # check network connection
-            is_network_connected = check_internet_connection()
-            if not is_network_connected:
-                self.lcd_manager.line2 = "WiFi: Failed"
-                logger.error("Wifi Connection lost... Attempting to reconnect")
-
-            # check bluetooth status
-            time.sleep(1)
-            i = i + 1
-            if i % 10 == 0:
-                i = 0  # Reset i to 0, not 1
-                logger.info("Health Check Passed")
-                self.kinesis_client.write_cloudwatch_log(
-                    f"Sensor {os.environ['SENSOR_SSID']}: Health Check Passed")
+    def start_workers(self):
+        self.dispatcher.start()
+        self.event_queue.start()
+
+    def start_frame_pipeline(self):
+        self.frame_prefetcher.start()
+        if self.frame_streamer is not None:
+            self.frame_streamer.start()
+
+    def prewarm_aws_clients(self):
+        # The AWS clients load lazily; warm them up in the background once the monitor is running
+        if os.environ.get("AWS_PREWARM", "1") != "1":
+            return
+
+        def prewarm():
+            if self.kinesis_client.prewarm():
+                self.startup_timer.mark("aws_clients_ready")
+
+        self.run_in_background(prewarm)
+
+    def run_in_background(self, fn):
+        # Executor for scheduled jobs that block on the network or the relay
+        return self.dispatcher.submit(BACKGROUND, fn)
+
+    def start_status_monitor(self, latency_report=True):
+        if self.monitor_jobs:
+            return
+        self.monitor_jobs = [
+            self.scheduler.call_every(1, self.check_status, executor=self.run_in_background),
+            self.scheduler.call_every(10, self.report_health),
+        ]
+        if latency_report:
+            self.monitor_jobs.append(self.scheduler.call_every(int(os.environ.get("LATENCY_REPORT_INTERVAL", 300)),
+                                                               self.report_latency))
+
+    def check_status(self):
+        # check sensor connection
+        if self.sse_client_last_updated_at is not None:
+            time_since_last_update = (datetime.now() - self.sse_client_last_updated_at).total_seconds()
+            if time_since_last_update > 20:
+                if not self.sensor_recovery_in_progress:
+                    self.sensor_recovery_in_progress = True
+                    logger.info("Starting sensor recovery")
+                    self.kinesis_client.write_cloudwatch_log(f"Sensor {self.sensor_ssid} lost connection. Starting recovery thread")
+                    if not self.run_in_background(self.sensor_recovery):
+                        # The lane is full; let the next status check try again
+                        self.sensor_recovery_in_progress = False
+
+        # check network connection
+        if not self.check_network:
+            return
+        is_network_connected = check_internet_connection()
+        if not is_network_connected:
+            self.lcd_manager.line2 = "WiFi: Failed"
+            logger.error("Wifi Connection lost... Attempting to reconnect")
+
+    def watch_network(self):
+        # Link changes on the wireless interface arrive through netlink right away, between status checks
+        network_monitor = get_network_monitor()
+        if network_monitor is not None:
+            network_monitor.subscribe(self.on_network_change)
+
+    def on_network_change(self, state):
+        # Called on the netlink thread, so anything slow goes to the scheduler
+        if state.name != self.wireless_interface:
+            return
+        get_probe().wake()
+        if state.connected:
+            self.lcd_manager.line2 = "WiFi: Connected"
+            if self.wifi_reconnect_job is not None:
+                self.wifi_reconnect_job.cancel()
+                self.wifi_reconnect_job = None
+        else:
+            logger.error(f"{state.name} lost its connection")
+            self.lcd_manager.line2 = "WiFi: Failed"
+            if self.wifi_reconnect_job is None:
+                # Give wpa_supplicant a moment to roam or reassociate on its own first
+                self.wifi_reconnect_job = self.scheduler.call_later(
+                    int(os.environ.get("WIFI_RECONNECT_GRACE", 10)), self.reconnect_wifi, 0,
+                    executor=self.run_in_background)
+
+    def reconnect_wifi(self, attempt):
+        network_monitor = get_network_monitor()
+        state = network_monitor.state(self.wireless_interface) if network_monitor is not None else None
+        if state is not None and state.connected:
+            self.wifi_reconnect_job = None
+            return
+        self.kinesis_client.write_cloudwatch_log(f"Sensor {self.sensor_ssid}: Reconnecting {self.wireless_interface}")
+        if reconnect_wireless_interface(self.wireless_interface):
+            self.wifi_reconnect_job = None
+            return
+        delay = min(300, 30 * 2 ** attempt)
+        logger.error(f"Could not reconnect {self.wireless_interface}. Trying again in {delay}s")
+        self.wifi_reconnect_job = self.scheduler.call_later(delay, self.reconnect_wifi, attempt + 1,
+                                                            executor=self.run_in_background)
+
+    def report_health(self):
+        logger.info("Health Check Passed")
+        self.kinesis_client.write_cloudwatch_log(
+            f"Sensor {self.sensor_ssid}: Health Check Passed")
+
+    def report_latency(self):
+        # Per stage p50/p99 of the exit path, dumped locally and shipped with the logs
+        logger.info(f"Latency: {tracer.format_report()}")
+        self.kinesis_client.write_cloudwatch_log(json.dumps({
+            "sensorId": self.sensor_ssid,
+            "latency": tracer.snapshot(),
+        }))
+        try:
+            tracer.dump(os.environ.get("LATENCY_DUMP_PATH", "latency.json"))
+        except OSError as e:
+            logger.error(f"Could not write the latency dump: {e}")
 
     def sensor_recovery(self):
         self.lcd_manager.line1 = "Recovering Sensor Connection"
-        is_sensor_connected = check_sensor_connection()
+        is_sensor_connected = check_sensor_connection(client=self.sensor_client)
         if is_sensor_connected:
-            logger.info("Sensor connection re-established")
-            self.kinesis_client.write_cloudwatch_log(
-                f"Sensor {os.environ['SENSOR_SSID']} connection reestablished")
-            self.lcd_manager.line1 = "Sensor: Connected"
             # This means the sse client stopped working. But the connection still exists. Restart the sse client
-            self.sse_client_last_updated_at = datetime.now()
-            self.stop_api_monitor_sse_client()
-            self.api_monitor_sse_client_thread = threading.Thread(target=self.api_monitor_sse_client)
-            self.api_monitor_sse_client_thread.start()
-            self.sensor_recovery_in_progress = False
-            logger.info("api_monitor_sse_client_thread: non blocking")
+            self.on_sensor_reconnected()
         else:
             # cycle the sensor.
             logger.info("Cycling the sensor power")
             self.kinesis_client.write_cloudwatch_log(
-                f"Sensor {os.environ['SENSOR_SSID']}: Cycling sensor power")
+                f"Sensor {self.sensor_ssid}: Cycling sensor power")
+            from gpio import turn_relay_on
             turn_relay_on(self.gpio_pin)
-            time.sleep(5)
-            turn_relay_off(self.gpio_pin)
-            # Wait for sensor to connect
-            for i in range(10):
-                is_sensor_connected = check_sensor_connection()
-                if is_sensor_connected:
-                    logger.info("Sensor connection re-established")
-                    self.kinesis_client.write_cloudwatch_log(
-                        f"Sensor {os.environ['SENSOR_SSID']} connection reestablished")
-                    self.lcd_manager.line1 = "Sensor: Connected"
-                    self.sse_client_last_updated_at = datetime.now()
-                    logger.info("Stopping sse thread")
-                    self.stop_api_monitor_sse_client()
-                    logger.info("Starting new sse thread")
-                    self.api_monitor_sse_client_thread = threading.Thread(target=self.api_monitor_sse_client)
-                    self.api_monitor_sse_client_thread.start()
-                    self.sensor_recovery_in_progress = False
-                    break
-                time.sleep(2)
+            self.scheduler.call_later(5, self.finish_power_cycle, executor=self.run_in_background)
+
+    def finish_power_cycle(self):
+        from gpio import turn_relay_off
+        turn_relay_off(self.gpio_pin)
+        # Wait for sensor to connect
+        self.wait_for_sensor(attempt=0)
+
+    def wait_for_sensor(self, attempt):
+        if check_sensor_connection(client=self.sensor_client):
+            self.on_sensor_reconnected()
+        elif attempt < 9:
+            self.scheduler.call_later(2, self.wait_for_sensor, attempt + 1, executor=self.run_in_background)
+
+    def on_sensor_reconnected(self):
+        logger.info("Sensor connection re-established")
+        self.kinesis_client.write_cloudwatch_log(
+            f"Sensor {self.sensor_ssid} connection reestablished")
+        self.lcd_manager.line1 = "Sensor: Connected"
+        self.sse_client_last_updated_at = datetime.now()
+        logger.info("Restarting sse client")
+        self.restart_api_monitor_sse_client()
+        self.sensor_recovery_in_progress = False
 
     def api_monitor_sse_client(self):
+        # Starts the SSE ingest thread. One event loop reads the stream and runs the handlers
         logger.info("starting the sse client")
         self.kinesis_client.write_cloudwatch_log(
-            f"Sensor {os.environ['SENSOR_SSID']}: Starting sse client")
-        initialize_default_sensor()
-        url = f"{self.sensor_url}/api/monitor/sse"
-        self.sse_client = SSEClient(url)
+            f"Sensor {self.sensor_ssid}: Starting sse client")
+        if self.sse_client is None:
+            url = f"{self.sensor_url}/api/monitor/sse"
+            if self.sse_hub is not None:
+                self.sse_client = self.sse_hub.client(url, self.on_sse_event, on_start=self.initialize_sensor,
+                                                      idle_timeout=20)
+            else:
+                self.sse_client = SSEIngest(url, self.on_sse_event, on_start=self.initialize_sensor, idle_timeout=20)
+        self.sse_client.start()
+
+    def initialize_sensor(self):
+        initialize_default_sensor(client=self.sensor_client)
 
-        try:
-            # Timer to periodically check the stopping flag
-            def check_stopping_flag():
-                while not self.api_monitor_sse_client_thread_stop_flag:
-                    time.sleep(1)  # Adjust the interval as needed
+    def stop_api_monitor_sse_client(self):
+        if self.sse_client is not None and self.sse_client.is_running():
+            logger.info("closing sse client")
+            self.kinesis_client.write_cloudwatch_log(
+                f"Sensor {self.sensor_ssid}: Closing sse client")
+            self.sse_client.stop()
 
-                # If flag is set, close the SSE client and exit
-                logger.info("closing sse client")
-                self.kinesis_client.write_cloudwatch_log(
-                    f"Sensor {os.environ['SENSOR_SSID']}: Closing sse client")
-                raise Exception("Closing the sse client")
-
-            self.api_monitor_sse_client_thread_stop_flag = False
-            stopping_flag_timer = threading.Thread(target=check_stopping_flag)
-            stopping_flag_timer.start()
-
-            for response in self.sse_client:
-                if self.api_monitor_sse_client_thread_stop_flag:
-                    logger.info("closing sse client")
-                    return
-                self.sse_client_last_updated_at = datetime.now()
-                data = response.data.strip()
-                if response.event == "attended":
-                    self.handle_attended_event(data)
-                if response.event == 'body':
-                    self.handle_body_event(data)
-                if response.event == 'newframe':
-                    self.handle_new_frame_event(data)
-                if response.event == 'storage':
-                    self.handle_storage_event(data)
-
-        except Exception as e:
-            print("Exception in SSEClient loop:", e)
-            return
+    def restart_api_monitor_sse_client(self):
+        self.stop_api_monitor_sse_client()
+        self.api_monitor_sse_client()
 
-    def stop_api_monitor_sse_client(self):
-        if self.api_monitor_sse_client_thread is not None and self.api_monitor_sse_client_thread.is_alive():
-            logger.info("api_monitor_sse_client_thread_stop_flag: True")
-            self.api_monitor_sse_client_thread_stop_flag = True
-            logger.info("joined")
+    async def on_sse_event(self, response):
+        # Only decode and enqueue here; the handlers run on the event queue's workers
+        received_at = time.monotonic()
+        self.sse_client_last_updated_at = datetime.now()
+        self.startup_timer.mark("first_sse_event")
+        try:
+            event = parse_event(response.event, response.data.strip(), received_at=received_at)
+            tracer.record("sse.decode", time.monotonic() - received_at)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Malformed {response.event} event {response.data!r}: {e}")
+            return
+        if event is not None:
+            key = "presence" if event.type in self.presence_handlers else event.type
+            self.event_queue.put(event, key=self.event_key_prefix + key)
 
-        self.api_monitor_sse_client_thread = None
+    def handle_presence_event(self, event):
+        self.presence_handlers[event.type](event)
 
-    def handle_attended_event(self, data):
-        is_ok = json.loads(data)['ok']
-        countdown = json.loads(data)['countdown']
+    def handle_attended_event(self, event):
         if self.is_present:
-            logger.info(data)
-            if not is_ok and countdown == 0:
+            logger.info(f"attended event: ok={event.ok} countdown={event.countdown}")
+            if not event.ok and event.countdown == 0:
                 logger.info("--- TURN TIMER EXPIRED ---")
                 self.kinesis_client.write_cloudwatch_log(
-                    f"Sensor {os.environ['SENSOR_SSID']}: Patient Turn Timer Expired")
-                self.kinesis_client.signed_request_v2(os.environ["JXN_API_URL"] + "/event",
-                                                      {"eventType": "turnTimerExpire", "sensorId": os.environ["SENSOR_SSID"]})
-                reset_rotation_interval()
+                    f"Sensor {self.sensor_ssid}: Patient Turn Timer Expired")
+                self.dispatcher.submit_ordered(CRITICAL, self.sensor_ssid, self.kinesis_client.signed_request_v2,
+                                               os.environ["JXN_API_URL"] + "/event",
+                                               {"eventType": "turnTimerExpire", "sensorId": self.sensor_ssid,
+                                                "occurredAt": occurred_at()})
+                self.dispatcher.submit(STATE, reset_rotation_interval, client=self.sensor_client)
         else:
-            reset_rotation_interval()
+            self.dispatcher.submit(STATE, reset_rotation_interval, client=self.sensor_client)
 
-    def handle_body_event(self, data):
-        self.is_sensor_present = json.loads(data)['present']
-        logger.info(f"body event: {data}")
+    def handle_body_event(self, event):
+        self.is_sensor_present = event.present
+        logger.info(f"body event: present={event.present}")
 
-        if self.is_timer_enabled and self.timer_thread is not None:
-            self.timer_thread.cancel()
+        if self.is_timer_enabled and self.presence_job is not None:
             self.run_update_patient_presence()
 
         if self.is_present and not self.is_sensor_present and not self.is_timer_enabled:
             logger.info("--- PATIENT EXIT DETECTED ---")
             logger.info("---- SENDING EXIT EVENT -----")
+            # Traced from the moment the body event came off the socket
+            trace = tracer.start_trace("bed_exit", started_at=event.received_at)
+            trace.mark("decision")
             self.kinesis_client.write_cloudwatch_log(
-                f"Sensor {os.environ['SENSOR_SSID']}: Patient Exit Detected")
-            self.kinesis_client.signed_request_v2(os.environ["JXN_API_URL"] + "/event",
-                                                  {"eventType": "bedExit", "sensorId": os.environ["SENSOR_SSID"]})
+                f"Sensor {self.sensor_ssid}: Patient Exit Detected")
+            # Alerts of one bed reach the backend in the order they were detected
+            self.dispatcher.submit_ordered(CRITICAL, self.sensor_ssid, self.send_exit_event, trace, occurred_at())
             self.run_update_patient_presence()
-            frames = get_frames_within_window(self.frame_id)
-            formatted_data = format_sensor_data(frames, self.is_present, frequency=int(os.environ["SENSOR_FREQUENCY"]))
-            self.kinesis_client.put_records(formatted_data)
+            if self.frame_streamer is not None:
+                self.frame_streamer.mark("bedExit", self.frame_id, patient_present=self.is_present)
+            else:
+                self.dispatcher.submit(TELEMETRY, self.upload_frames_within_window, self.frame_id, self.is_present)
 
         if not self.is_present and self.is_sensor_present and not self.is_timer_enabled:
             logger.info("--- PATIENT ENTRY DETECTED ---")
-            self.kinesis_client.signed_request_v2(os.environ["JXN_API_URL"] + "/event",
-                                                  {"eventType": "bedEntry", "sensorId": os.environ["SENSOR_SSID"]})
+            self.dispatcher.submit(STATE, self.kinesis_client.signed_request_v2,
+                                   os.environ["JXN_API_URL"] + "/event",
+                                   {"eventType": "bedEntry", "sensorId": self.sensor_ssid,
+                                    "occurredAt": occurred_at()})
             self.run_update_patient_presence()
+            if self.frame_streamer is not None:
+                self.frame_streamer.mark("bedEntry", self.frame_id, patient_present=self.is_present)
 
         if not self.is_timer_enabled:
             self.is_present = self.is_sensor_present
         logger.info("\n\n")
 
-    def handle_new_frame_event(self, data):
-        self.frame_id = json.loads(data)['id']
-
-    def handle_storage_event(self, data):
+    def send_exit_event(self, trace, occurred):
+        trace.mark("dispatched")
+        delivered = self.kinesis_client.signed_request_v2(os.environ["JXN_API_URL"] + "/event",
+                                                          {"eventType": "bedExit", "sensorId": self.sensor_ssid,
+                                                           "occurredAt": occurred},
+                                                          trace=trace)
+        if delivered:
+            trace.finish()
+        else:
+            # Spooled for the replayer: the alert has not reached the backend yet
+            trace.fail()
+
+    def upload_frames_within_window(self, frame_id, is_present):
+        with tracer.span("frames.fetch"):
+            frames = self.frame_prefetcher.get_frames_within_window(frame_id)
+        if frames is not None:
+            with tracer.span("frames.format"):
+                formatted_data = format_sensor_matrices(frames, is_present,
+                                                        frequency=int(os.environ["SENSOR_FREQUENCY"]),
+                                                        partitioner=self.kinesis_client.partitioner,
+                                                        bed_id=self.bed_id, sensor_ssid=self.sensor_ssid,
+                                                        aggregator=self.kinesis_client.aggregator)
+            with tracer.span("kinesis.enqueue"):
+                self.kinesis_client.put_records(formatted_data)
+
+    def handle_new_frame_event(self, event):
+        self.frame_id = event.id
+        self.frame_prefetcher.notify(self.frame_id)
+
+    def handle_storage_event(self, event):
         logger.info("############## STORAGE EVENT ###############")
         self.kinesis_client.write_cloudwatch_log(
-            f"Sensor {os.environ['SENSOR_SSID']}: Sensor Storage Full. Deleting to make space for new frames")
-        storage_field = json.loads(data)['used']
+            f"Sensor {self.sensor_ssid}: Sensor Storage Full. Deleting to make space for new frames")
+        storage_field = event.used
         logger.info(f"Storage Used: {storage_field}%")
         if storage_field > 85:
-            delete_all_frames()
+            self.dispatcher.submit(TELEMETRY, self.clear_sensor_storage, self.frame_id)
         logger.info("\n\n")
 
+    def clear_sensor_storage(self, frame_id):
+        # Archive everything still on the sensor before it is wiped
+        self.frame_prefetcher.sync(frame_id)
+        delete_all_frames(client=self.sensor_client)
+
     def update_patient_presence(self):
         logger.info(f"Updating pi is_present to {self.is_sensor_present}")
         self.is_present = self.is_sensor_present
         self.is_timer_enabled = False
 
     def run_update_patient_presence(self):
+        # (Re)starts the 10 s presence debounce
         self.is_timer_enabled = True
-        self.timer_thread = threading.Timer(10, self.update_patient_presence)
-        self.timer_thread.start()
+        if self.presence_job is None:
+            self.presence_job = self.scheduler.call_later(self.presence_debounce, self.update_patient_presence)
+        else:
+            self.presence_job.reschedule(self.presence_debounce)
 
     def ble_controller(self, parsed_info):
         input_array = parsed_info.split(',')
@@ -294,28 +478,184 @@ class BedExitMonitor:
                 logger.info("initializing sensor wifi connection")
                 connect_to_wifi_network(network_ssid=network_ssid, network_password=network_password,
                                         wireless_interface="wlan0")
-                is_network_connected = check_internet_connection()
+                is_network_connected = check_internet_connection(refresh=True)
                 # is_sensor_connected = check_sensor_connection()
                 if is_network_connected:
                     self.lcd_manager.line1 = "Sensor: Connected"
                     self.lcd_manager.line2 = "WiFi: Connected"
-                    self.kinesis_client.signed_request_v2(os.environ["JXN_API_URL"] + f"/bed/{input_array[3]}",
-                                                          {"sensorId": os.environ["SENSOR_SSID"]}, method="PATCH")
-                    self.api_monitor_sse_client_thread = threading.Thread(target=self.api_monitor_sse_client)
-                    self.api_monitor_sse_client_thread.start()
-                    time.sleep(2)
-
-                    self.monitor_thread = threading.Thread(target=self.status_monitor)
-                    self.monitor_thread.start()
+                    self.dispatcher.submit(STATE, self.kinesis_client.signed_request_v2,
+                                           os.environ["JXN_API_URL"] + f"/bed/{input_array[3]}",
+                                           {"sensorId": self.sensor_ssid}, method="PATCH")
+                    self.start_frame_pipeline()
+                    self.api_monitor_sse_client()
+
+                    # Don't block the BLE main loop while the stream comes up
+                    self.scheduler.call_later(2, self.start_status_monitor)
+                    self.scheduler.call_later(2, self.prewarm_aws_clients)
+        elif command == "bed_id":
+            if len(input_array) >= 2:
+                self.set_bed_id(input_array[1])
+
+    def set_bed_id(self, bed_id):
+        self.bed_id = bed_id
+        logger.info(f"setting the bed id: {self.bed_id}")
+        self.dispatcher.submit(STATE, self.kinesis_client.signed_request_v2,
+                               os.environ["JXN_API_URL"] + f"/bed/{self.bed_id}",
+                               {"sensorId": self.sensor_ssid}, method="PATCH")
+
+
+def load_sensor_configs(path):
+    """
+    The beds of a multi-bed gateway, from a JSON list such as
+    [{"ssid": "sensor-a", "url": "http://192.168.4.10", "gpio_pin": 4, "bed_id": "12"}, ...]
+    """
+    with open(path) as f:
+        sensors = json.load(f)
+    for sensor in sensors:
+        if "ssid" not in sensor or "url" not in sensor:
+            raise ValueError(f"Sensor config {sensor} needs an ssid and a url")
+    return sensors
+
+
+class MultiBedMonitor:
+    """
+    Monitors several beds from one process. Every bed gets a BedExitMonitor of its own, with its
+    own presence state machine, sensor client, prefetcher and frame archive. The AWS clients with
+    their producer, log shipper and spool, the scheduler, the dispatcher lanes, the event queue
+    workers, the SSE event loop and the HTTP session to the sensors are shared, so a bed adds
+    state but no threads (frame streaming, when enabled, still runs a thread per bed).
+    """
+
+    def __init__(self, sensors, kinesis_client=None, lcd_manager=None):
+        self.scheduler = Scheduler()
+        self.scheduler.start()
+        if lcd_manager is None:
+            from lcd_display import ScrollingText
+            lcd_manager = ScrollingText(self.scheduler)
+        self.lcd_manager = lcd_manager
+        self.gateway_id = os.environ.get("GATEWAY_ID", "gateway")
+        self.kinesis_client = kinesis_client or KinesisClient(source=self.gateway_id)
+        self.dispatcher = PriorityDispatcher(lanes=dict(DEFAULT_LANES, **{
+            TELEMETRY: int(os.environ.get("TELEMETRY_WORKERS", 2)),
+        }))
+        self.event_queue = EventQueue({}, max_events=int(os.environ.get("EVENT_QUEUE_SIZE", 1000)) * len(sensors),
+                                      workers=int(os.environ.get("EVENT_QUEUE_WORKERS", 4)))
+        self.sse_hub = SSEHub()
+        self.http_session = SensorClient.new_session(pool_connections=len(sensors))
+        self.bluetooth_service_thread = None
+        self.monitor_jobs = []
+
+        self.monitors = {}
+        for sensor in sensors:
+            ssid = sensor["ssid"]
+            sensor_client = SensorClient(sensor["url"], session=self.http_session)
+            # Prefetching runs on the telemetry lane instead of a thread per bed
+            prefetcher = FramePrefetcher(archive=FrameArchive(sensor.get("archive_path", f"frames-{ssid}.ring")),
+                                         fetch_frames=sensor_client.iter_frames, executor=self.run_telemetry,
+                                         session=sensor["url"])
+            monitor = BedExitMonitor(kinesis_client=self.kinesis_client, sensor_client=sensor_client,
+                                     frame_prefetcher=prefetcher, lcd_manager=self.lcd_manager,
+                                     sensor_url=sensor["url"], sensor_ssid=ssid, gpio_pin=sensor.get("gpio_pin", 4),
+                                     scheduler=self.scheduler, dispatcher=self.dispatcher,
+                                     event_queue=self.event_queue, sse_hub=self.sse_hub)
+            monitor.check_network = False
+            monitor.bed_id = sensor.get("bed_id")
+            self.monitors[ssid] = monitor
+
+    def run_telemetry(self, fn):
+        return self.dispatcher.submit(TELEMETRY, fn)
+
+    def run_in_background(self, fn):
+        return self.dispatcher.submit(BACKGROUND, fn)
+
+    def start(self):
+        from bluetooth_package import BluetoothService
+        from gpio import cleanup
+
+        cleanup()
+        self.dispatcher.start()
+        self.event_queue.start()
+        # The first bed's monitor follows the network for the gateway, on the shared display
+        next(iter(self.monitors.values())).watch_network()
+        self.lcd_manager.line1 = "Initializing Bluetooth"
+
+        bluetooth_service = BluetoothService(callback=self.ble_controller)
+        self.bluetooth_service_thread = threading.Thread(target=bluetooth_service.start)
+        self.bluetooth_service_thread.start()
+        time.sleep(2)
+
+        self.lcd_manager.line2 = f"Initializing {len(self.monitors)} Sensors"
+        if check_internet_connection():
+            self.start_monitoring()
+            self.lcd_manager.line1 = f"Sensors: {len(self.monitors)} Connected"
+            self.lcd_manager.line2 = "WiFi: Connected"
+        else:
+            self.lcd_manager.line1 = "Connect Wifi In App"
+            self.lcd_manager.line2 = "WiFi: Not Connected"
+
+    def start_monitoring(self):
+        for monitor in self.monitors.values():
+            self.dispatcher.submit(STATE, reset_rotation_interval, client=monitor.sensor_client)
+            monitor.start_frame_pipeline()
+            monitor.api_monitor_sse_client()
+            monitor.start_status_monitor(latency_report=False)
+        if self.monitor_jobs:
+            return
+        self.kinesis_client.write_cloudwatch_log(f"Gateway {self.gateway_id}: monitoring {len(self.monitors)} beds")
+        # The network and the latency report are checked once for all beds
+        first = next(iter(self.monitors.values()))
+        self.monitor_jobs = [
+            self.scheduler.call_every(1, self.check_network, executor=self.run_in_background),
+            self.scheduler.call_every(int(os.environ.get("LATENCY_REPORT_INTERVAL", 300)), first.report_latency),
+        ]
+        first.prewarm_aws_clients()
+
+    def check_network(self):
+        if not check_internet_connection():
+            self.lcd_manager.line2 = "WiFi: Failed"
+            logger.error("Wifi Connection lost... Attempting to reconnect")
+
+    def monitor_for(self, sensor_ssid=None):
+        # Commands without a sensor go to the first one, as on a single-bed device
+        if not sensor_ssid:
+            return next(iter(self.monitors.values()))
+        monitor = self.monitors.get(sensor_ssid)
+        if monitor is None:
+            logger.error(f"No sensor {sensor_ssid} on this gateway")
+        return monitor
+
+    def ble_controller(self, parsed_info):
+        # The single-bed commands, where "wifi,<ssid>,<password>,<bed>,<sensor>" and
+        # "bed_id,<bed>,<sensor>" may name the sensor the bed belongs to
+        input_array = parsed_info.split(',')
+        command = input_array[0].lower()
+        if command in ("start", "stop"):
+            for monitor in self.monitors.values():
+                monitor.ble_controller(command)
+        elif command == "wifi":
+            if len(input_array) >= 4:
+                network_ssid, network_password = input_array[1:3]
+                logger.info("initializing sensor wifi connection")
+                connect_to_wifi_network(network_ssid=network_ssid, network_password=network_password,
+                                        wireless_interface="wlan0")
+                if check_internet_connection(refresh=True):
+                    self.lcd_manager.line1 = f"Sensors: {len(self.monitors)} Connected"
+                    self.lcd_manager.line2 = "WiFi: Connected"
+                    monitor = self.monitor_for(input_array[4] if len(input_array) >= 5 else None)
+                    if monitor is not None:
+                        monitor.set_bed_id(input_array[3])
+                    self.start_monitoring()
         elif command == "bed_id":
             if len(input_array) >= 2:
-                bed_id = input_array[1]
-                self.bed_id = bed_id
-                logger.info(f"setting the bed id: {self.bed_id}")
-                self.kinesis_client.signed_request_v2(os.environ["JXN_API_URL"] + f"/bed/{self.bed_id}",
-                                                      {"sensorId": os.environ["SENSOR_SSID"]}, method="PATCH")
+                monitor = self.monitor_for(input_array[2] if len(input_array) >= 3 else None)
+                if monitor is not None:
+                    monitor.set_bed_id(input_array[1])
 
 
 if __name__ == '__main__':
-    service = BedExitMonitor()
+    if os.environ.get("SENSORS_CONFIG"):
+        # One process for all the beds listed in the config, e.g. on a gateway
+        service = MultiBedMonitor(load_sensor_configs(os.environ["SENSORS_CONFIG"]))
+    else:
+        service = BedExitMonitor()
     service.start()
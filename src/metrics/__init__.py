@@ -0,0 +1,4 @@
+from .latency import LatencyStats
+from .startup import StartupTimer
+from .histogram import Histogram
+from .tracing import Tracer, Trace, tracer
@@ -0,0 +1,93 @@
+import math
+import threading
+
+
+class Histogram:
+    """
+    HDR style histogram of durations in seconds. Values are kept in log-linear buckets with
+    `significant_bits` of precision (7 bits: within 1.6 %), from `resolution` seconds up, so
+    memory stays small whatever the number of samples and percentiles stay accurate.
+    """
+
+    def __init__(self, significant_bits=7, resolution=1e-6):
+        self.significant_bits = significant_bits
+        self.resolution = resolution
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._sub_buckets = 1 << significant_bits
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, value):
+        index = self._index(max(0, int(value / self.resolution)))
+        with self._lock:
+            self._counts[index] = self._counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def merge(self, other):
+        with other._lock:
+            counts = dict(other._counts)
+            count, total, low, high = other.count, other.total, other.min, other.max
+        with self._lock:
+            for index, bucket_count in counts.items():
+                self._counts[index] = self._counts.get(index, 0) + bucket_count
+            self.count += count
+            self.total += total
+            if low is not None and (self.min is None or low < self.min):
+                self.min = low
+            if high is not None and (self.max is None or high > self.max):
+                self.max = high
+
+    def percentile(self, percentile):
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(percentile / 100.0 * self.count))
+            if rank >= self.count:
+                return self.max
+            seen = 0
+            for index in sorted(self._counts):
+                seen += self._counts[index]
+                if seen >= rank:
+                    # Never report outside the values actually seen
+                    return min(max(self._value(index), self.min), self.max)
+            return self.max
+
+    def snapshot(self):
+        summary = {
+            "count": self.count,
+            "min": self.min or 0.0,
+            "max": self.max or 0.0,
+            "mean": self.total / self.count if self.count else 0.0,
+        }
+        for name, percentile in (("p50", 50), ("p90", 90), ("p99", 99), ("p999", 99.9)):
+            summary[name] = self.percentile(percentile)
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._counts = {}
+            self.count = 0
+            self.total = 0.0
+            self.min = None
+            self.max = None
+
+    def _index(self, value):
+        # Values below 2 ** bits get a bucket each, above that every power of two is split into
+        # 2 ** (bits - 1) buckets
+        exponent = max(0, value.bit_length() - self.significant_bits)
+        return exponent * self._sub_buckets + (value >> exponent)
+
+    def _value(self, index):
+        # Middle of the bucket, in seconds
+        exponent, mantissa = divmod(index, self._sub_buckets)
+        low = mantissa << exponent
+        high = ((mantissa + 1) << exponent) - 1
+        return (low + high) / 2.0 * self.resolution
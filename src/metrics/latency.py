@@ -0,0 +1,38 @@
+import threading
+
+
+class LatencyStats:
+    """
+    Thread safe latency counters keyed by endpoint (or any other label). Durations are in seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, key, duration, error=False):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = {"count": 0, "errors": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+                self._stats[key] = stats
+            stats["count"] += 1
+            if error:
+                stats["errors"] += 1
+            stats["total"] += duration
+            stats["last"] = duration
+            if duration > stats["max"]:
+                stats["max"] = duration
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {}
+            for key, stats in self._stats.items():
+                stats = dict(stats)
+                stats["mean"] = stats["total"] / stats["count"] if stats["count"] else 0.0
+                snapshot[key] = stats
+            return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
@@ -0,0 +1,66 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+
+def process_started_at():
+    """
+    Monotonic time at which this process was started. On Linux this comes from /proc, so it
+    includes the interpreter start and imports; elsewhere it falls back to the current time.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces, the fields after it do not
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        started_since_boot = start_ticks / os.sysconf("SC_CLK_TCK")
+        return time.monotonic() - (time.clock_gettime(time.CLOCK_BOOTTIME) - started_since_boot)
+    except (OSError, IndexError, ValueError, AttributeError):
+        return time.monotonic()
+
+
+class StartupTimer:
+    """
+    Records how long after process start named milestones are reached (only the first time
+    each one is reached) and logs a report once all `expected` milestones are in.
+    """
+
+    def __init__(self, expected=(), started_at=None):
+        self.started_at = started_at if started_at is not None else process_started_at()
+        self.expected = tuple(expected)
+        self._marks = {}
+        self._reported = False
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        with self._lock:
+            if name in self._marks:
+                return self._marks[name]
+            elapsed = time.monotonic() - self.started_at
+            self._marks[name] = elapsed
+            report = not self._reported and all(milestone in self._marks for milestone in self.expected)
+            if report:
+                self._reported = True
+        logger.info(f"Startup: {name} after {elapsed:.2f}s")
+        if report and self.expected:
+            logger.info(f"Startup report: {self.format_report()}")
+        return elapsed
+
+    def report(self):
+        with self._lock:
+            return dict(self._marks)
+
+    def format_report(self):
+        return ", ".join(f"{name} {elapsed:.2f}s"
+                         for name, elapsed in sorted(self.report().items(), key=lambda item: item[1]))
@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from .histogram import Histogram
+
+
+class Trace:
+    """
+    One pass through an instrumented path, e.g. from a `body` event to the acknowledged
+    `bedExit` POST. Stages are recorded as `<name>.<stage>` in the tracer's histograms.
+    """
+
+    def __init__(self, tracer, name, started_at=None):
+        self.tracer = tracer
+        self.name = name
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.stages = []
+
+    def mark(self, stage):
+        # Time from the start of the trace until now
+        elapsed = time.monotonic() - self.started_at
+        self.stages.append((stage, elapsed))
+        self.tracer.record(f"{self.name}.{stage}", elapsed)
+        return elapsed
+
+    @contextmanager
+    def span(self, stage):
+        # Duration of the block itself
+        with self.tracer.span(f"{self.name}.{stage}") as duration:
+            yield duration
+        self.stages.append((stage, duration["seconds"]))
+
+    def finish(self):
+        # Only for a pass that completed; see `fail`
+        return self.mark("total")
+
+    def fail(self):
+        # A pass that did not complete is counted apart, so it cannot flatter "total"
+        return self.mark("failed")
+
+
+class Tracer:
+    """
+    Keeps one histogram per stage. Everything uses the monotonic clock and costs a dict lookup
+    and a histogram update, so it can stay on in production.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, duration):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram())
+        histogram.record(duration)
+
+    @contextmanager
+    def span(self, stage):
+        duration = {"seconds": 0.0}
+        start = time.monotonic()
+        try:
+            yield duration
+        finally:
+            duration["seconds"] = time.monotonic() - start
+            self.record(stage, duration["seconds"])
+
+    def start_trace(self, name, started_at=None):
+        return Trace(self, name, started_at)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {stage: histogram.snapshot() for stage, histogram in sorted(histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def format_report(self):
+        return "; ".join(f"{stage} n={stats['count']} p50={stats['p50'] * 1000:.1f}ms "
+                         f"p99={stats['p99'] * 1000:.1f}ms max={stats['max'] * 1000:.1f}ms"
+                         for stage, stats in self.snapshot().items())
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+
+
+# Shared by the whole process, so every module records into the same histograms
+tracer = Tracer()
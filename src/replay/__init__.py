@@ -0,0 +1,4 @@
+# The recorder and the replayer load the sensor and kinesis packages, which read their
+# configuration on import; import them from their modules once the environment is set
+from .recording import RecordingWriter, read_recording
+from .fakes import CallLog, FakeSensor, FakeKinesis, FakeCloudWatchLogs, FakeApi, NullDisplay
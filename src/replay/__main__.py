@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record a sensor's SSE stream, replay a recording through the "
+                                                 "monitor with stand-ins for the sensor and AWS, or run a fake "
+                                                 "sensor")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record = subparsers.add_parser("record", help="record the SSE stream and frames of a live sensor")
+    record.add_argument("path", help="recording to write (gzip JSON lines)")
+    record.add_argument("--sensor-url", default=os.environ.get("SENSOR_URL"), help="default: $SENSOR_URL")
+    record.add_argument("--duration", type=float, default=None, help="seconds to record (default: until ^C)")
+    record.add_argument("--no-frames", action="store_true", help="only record the events")
+
+    replay = subparsers.add_parser("replay", help="replay a recording and report what the monitor did")
+    replay.add_argument("path", help="recording to replay")
+    replay.add_argument("--speed", type=float, default=1.0,
+                        help="multiple of the recorded speed, 0 for as fast as possible (default: 1)")
+    replay.add_argument("--api-latency", type=float, default=0, help="seconds every backend call takes")
+    replay.add_argument("--calls", action="store_true", help="list every outbound call")
+    serve = subparsers.add_parser("serve", help="run a fake sensor to load test the monitor against")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--frame-rate", type=float, default=10, help="frames per second (default: 10)")
+    serve.add_argument("--pin-frame-rate", action="store_true", help="ignore the frequency the monitor sets")
+    serve.add_argument("--rows", type=int, default=64, help="grid rows (default: 64)")
+    serve.add_argument("--cols", type=int, default=32, help="grid columns (default: 32)")
+    serve.add_argument("--storage-frames", type=int, default=10000, help="frames kept before the oldest go")
+    serve.add_argument("--presence-cycle", type=float, nargs=2, metavar=("IN_BED", "OUT_OF_BED"),
+                       help="seconds in and out of bed, repeated")
+    serve.add_argument("--latency", type=float, default=0, help="seconds added to every request")
+    serve.add_argument("--jitter", type=float, default=0, help="up to this many more seconds per request")
+    serve.add_argument("--error-rate", type=float, default=0, help="share of requests answered with a 500")
+    serve.add_argument("--drop-rate", type=float, default=0, help="share of requests whose connection is dropped")
+    serve.add_argument("--sse-stall-after", type=float, default=None,
+                       help="seconds after which SSE connections go silent")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if not args.sensor_url:
+            parser.error("--sensor-url or $SENSOR_URL is required")
+        os.environ["SENSOR_URL"] = args.sensor_url
+        from .recorder import SSERecorder
+
+        recorder = SSERecorder(args.sensor_url, args.path, record_frames=not args.no_frames)
+        try:
+            stats = recorder.run(args.duration)
+        except KeyboardInterrupt:
+            stats = recorder.stats
+        print(f"Recorded {stats['events']} events and {stats['frames']} frames to {args.path}")
+    elif args.command == "serve":
+        from .sensor_server import FakeSensorServer
+
+        server = FakeSensorServer(args.host, args.port, frame_rate=args.frame_rate, rows=args.rows, cols=args.cols,
+                                  storage_frames=args.storage_frames, presence_cycle=args.presence_cycle,
+                                  pin_frame_rate=args.pin_frame_rate, latency=args.latency, jitter=args.jitter,
+                                  error_rate=args.error_rate, drop_rate=args.drop_rate,
+                                  sse_stall_after=args.sse_stall_after)
+        server.start()
+        print(f"Fake sensor on {server.url}. Start the monitor with SENSOR_URL={server.url}")
+        try:
+            while True:
+                time.sleep(10)
+                print(json.dumps(dict(server.stats, frame_id=server.frame_id, storage_used=server.storage_used())))
+        except KeyboardInterrupt:
+            server.stop()
+    else:
+        from .replayer import Replayer
+
+        report = Replayer(args.path, speed=args.speed, api_latency=args.api_latency).run()
+        if not args.calls:
+            report.pop("calls")
+        print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Stand-ins for the sensor, AWS and the display, so the monitor can run against a recording
+without any of them. Every outbound call is written to a shared `CallLog`.
+"""
+import json
+import threading
+import time
+from collections import namedtuple
+
+FakeResponse = namedtuple("FakeResponse", ["status_code", "text"])
+
+
+class CallLog:
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._calls = []
+        self._lock = threading.Lock()
+
+    def record(self, target, **details):
+        with self._lock:
+            self._calls.append((round(time.monotonic() - self.started_at, 6), target, details))
+
+    def calls(self, target=None):
+        with self._lock:
+            return [call for call in self._calls if target is None or call[1] == target]
+
+    def counts(self):
+        counts = {}
+        for _, target, _ in self.calls():
+            counts[target] = counts.get(target, 0) + 1
+        return counts
+
+
+class FakeSensor:
+    """
+    Serves the frames of a recording, but only those the replay has already announced with a
+    `newframe` event, like the real sensor would.
+    """
+
+    def __init__(self, frames, call_log):
+        self.frames = frames
+        self.call_log = call_log
+        self.ids = sorted(frames)
+        self.latest_id = None
+
+    def announce(self, frame_id):
+        self.latest_id = frame_id
+
+    def iter_frames(self, after_frame, before_frame):
+        self.call_log.record("sensor.frames", after=after_frame, before=before_frame)
+        latest_id = self.latest_id if self.latest_id is not None else -1
+        for frame_id in self.ids:
+            if after_frame < frame_id <= min(before_frame, latest_id):
+                yield frame_id, self.frames[frame_id]
+
+    def get_frames(self, after_frame, before_frame):
+        return [{"id": frame_id, "readings": [readings]}
+                for frame_id, readings in self.iter_frames(after_frame, before_frame)]
+
+    def set_frequency(self, new_frequency):
+        self.call_log.record("sensor.frequency", value=new_frequency)
+
+    def set_rotation_interval(self, new_interval):
+        self.call_log.record("sensor.rotation", value=new_interval)
+
+    def reset_rotation_interval(self):
+        self.call_log.record("sensor.rotation_reset")
+
+    def delete_all_frames(self):
+        self.call_log.record("sensor.delete_frames")
+        return True
+
+    def check_connection(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeKinesis:
+
+    def __init__(self, call_log):
+        self.call_log = call_log
+
+    def put_records(self, StreamName, Records):
+        self.call_log.record("kinesis.put_records", stream=StreamName, records=len(Records),
+                             bytes=sum(len(record["Data"]) for record in Records))
+        return {"FailedRecordCount": 0, "Records": [{"SequenceNumber": "0"} for _ in Records]}
+
+    def put_record(self, StreamName, Data, PartitionKey, **kwargs):
+        self.call_log.record("kinesis.put_records", stream=StreamName, records=1, bytes=len(Data))
+        return {"SequenceNumber": "0"}
+
+
+class FakeCloudWatchLogs:
+
+    def __init__(self, call_log):
+        self.call_log = call_log
+
+    def put_log_events(self, logGroupName, logStreamName, logEvents, **kwargs):
+        self.call_log.record("logs.put_log_events", events=len(logEvents))
+        return {}
+
+
+class FakeApi:
+    """
+    Replaces `SignedApiClient`. `latency` seconds are spent on every call, to see how a slow
+    backend holds up the lanes.
+    """
+
+    def __init__(self, call_log, latency=0):
+        self.call_log = call_log
+        self.latency = latency
+
+    def request(self, method, endpoint, data_obj=None, timeout=None, idempotency_key=None):
+        if self.latency:
+            time.sleep(self.latency)
+        self.call_log.record("api", method=method, endpoint=endpoint, data=data_obj)
+        return FakeResponse(200, json.dumps({"ok": True}))
+
+    def get(self, endpoint, **kwargs):
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint, data_obj=None, **kwargs):
+        return self.request("POST", endpoint, data_obj, **kwargs)
+
+    def put(self, endpoint, data_obj=None, **kwargs):
+        return self.request("PUT", endpoint, data_obj, **kwargs)
+
+    def patch(self, endpoint, data_obj=None, **kwargs):
+        return self.request("PATCH", endpoint, data_obj, **kwargs)
+
+    def delete(self, endpoint, **kwargs):
+        return self.request("DELETE", endpoint, **kwargs)
+
+    def prewarm(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class NullDisplay:
+    # Takes the place of the LCD's ScrollingText
+
+    def __init__(self):
+        self.line1 = ""
+        self.line2 = ""
+
+    def stop(self):
+        pass
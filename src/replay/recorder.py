@@ -0,0 +1,92 @@
+import asyncio
+import json
+import logging
+
+from sensor.sse import AsyncSSEClient
+from .recording import RecordingWriter
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+
+class SSERecorder:
+    """
+    Records a live sensor's SSE stream into a recording file. Frames announced by `newframe`
+    events are fetched in the background (plus `backfill` frames before the first one, so an
+    early exit still has a full window) without holding up the stream.
+    """
+
+    def __init__(self, sensor_url, path, sensor_client=None, record_frames=True, backfill=300, batch_size=300):
+        self.sensor_url = sensor_url
+        self.path = path
+        self.sensor_client = sensor_client
+        self.record_frames = record_frames
+        self.backfill = backfill
+        self.batch_size = batch_size
+        self.stats = {"events": 0, "frames": 0}
+
+        self._writer = None
+        self._fetched = None
+        self._wanted = None
+        self._wanted_event = None
+
+    def run(self, duration=None):
+        asyncio.run(self.record(duration))
+        return self.stats
+
+    async def record(self, duration=None):
+        if self.sensor_client is None:
+            from sensor.sensor_client import SensorClient
+            self.sensor_client = SensorClient(self.sensor_url)
+
+        self._writer = RecordingWriter(self.path, sensor_url=self.sensor_url)
+        self._wanted_event = asyncio.Event()
+        client = AsyncSSEClient(f"{self.sensor_url}/api/monitor/sse", self._on_event)
+        tasks = [asyncio.create_task(client.run())]
+        if self.record_frames:
+            tasks.append(asyncio.create_task(self._fetch_frames()))
+        try:
+            await asyncio.wait(tasks, timeout=duration)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._writer.close()
+            logger.info(f"Recorded {self.stats['events']} events and {self.stats['frames']} frames to {self.path}")
+
+    async def _on_event(self, event):
+        self._writer.event(event.event, event.data, event.id)
+        self.stats["events"] += 1
+        if event.event == "newframe" and self.record_frames:
+            frame_id = json.loads(event.data)["id"]
+            if self._fetched is None or frame_id < self._fetched:
+                self._fetched = max(0, frame_id - 1 - self.backfill)
+            self._wanted = frame_id
+            self._wanted_event.set()
+
+    async def _fetch_frames(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wanted_event.wait()
+            self._wanted_event.clear()
+            while self._fetched < self._wanted:
+                after_frame = self._fetched
+                before_frame = min(self._wanted, after_frame + self.batch_size)
+                try:
+                    frames = await loop.run_in_executor(
+                        None, lambda: list(self.sensor_client.iter_frames(after_frame, before_frame)))
+                except Exception as e:
+                    logger.error(f"Failed to record frames {after_frame}-{before_frame}: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                for frame_id, readings in frames:
+                    self._writer.frame(frame_id, readings)
+                self.stats["frames"] += len(frames)
+                self._fetched = before_frame
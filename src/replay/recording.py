@@ -0,0 +1,75 @@
+"""
+Recordings are gzip compressed JSON lines. The first line is a header, every following line is
+either an SSE event or a frame fetched from the sensor, stamped with the seconds since the
+recording started:
+
+    {"format": "bed-exit-recording", "version": 1, "sensor_url": "...", "recorded_at": "..."}
+    {"t": 0.512, "event": "body", "data": "{\\"present\\": true}", "id": "17"}
+    {"t": 0.530, "frame": 1042, "readings": [[0, 12, ...], ...]}
+"""
+import gzip
+import json
+import threading
+import time
+from datetime import datetime
+
+RECORDING_FORMAT = "bed-exit-recording"
+RECORDING_VERSION = 1
+
+
+class RecordingWriter:
+
+    def __init__(self, path, sensor_url=None):
+        self.path = path
+        self.started_at = time.monotonic()
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._write({
+            "format": RECORDING_FORMAT,
+            "version": RECORDING_VERSION,
+            "sensor_url": sensor_url,
+            "recorded_at": datetime.now().isoformat(),
+        })
+
+    def event(self, event, data, event_id=None, t=None):
+        self._write({"t": self._offset(t), "event": event, "data": data, "id": event_id})
+
+    def frame(self, frame_id, readings, t=None):
+        if hasattr(readings, "tolist"):
+            readings = readings.tolist()
+        self._write({"t": self._offset(t), "frame": frame_id, "readings": readings})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _offset(self, t):
+        return round(time.monotonic() - self.started_at if t is None else t, 6)
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+def read_recording(path):
+    """
+    Return `(header, events, frames)`: the events as `(t, event, data, id)` tuples in recorded
+    order, and the frames as a dict of frame id to readings.
+    """
+    events = []
+    frames = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != RECORDING_FORMAT:
+            raise ValueError(f"{path} is not a recording")
+        if header.get("version") != RECORDING_VERSION:
+            raise ValueError(f"Unsupported recording version {header.get('version')}")
+        for line in f:
+            entry = json.loads(line)
+            if "event" in entry:
+                events.append((entry["t"], entry["event"], entry["data"], entry.get("id")))
+            else:
+                frames[entry["frame"]] = entry["readings"]
+    events.sort(key=lambda event: event[0])
+    return header, events, frames
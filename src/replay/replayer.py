@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from .fakes import CallLog, FakeSensor, FakeKinesis, FakeCloudWatchLogs, FakeApi, NullDisplay
+from .recording import read_recording
+
+# The monitor reads its configuration from the environment, some of it at import time
+REPLAY_ENVIRONMENT = {
+    "SENSOR_URL": "http://replay.invalid",
+    "SENSOR_SSID": "replay",
+    "SENSOR_FREQUENCY": "1",
+    "SENSOR_ROTATION": "120",
+    "JXN_API_URL": "http://replay.invalid/api",
+    "STREAM_NAME": "replay-stream",
+    "API_KEY": "replay",
+    "PARTITION_KEY": "replay",
+    "AWS_REGION": "us-east-1",
+}
+for name, value in REPLAY_ENVIRONMENT.items():
+    os.environ.setdefault(name, value)
+
+from kinesis import KinesisClient  # noqa: E402
+from metrics import tracer  # noqa: E402
+from sensor import FrameArchive, FramePrefetcher  # noqa: E402
+from sensor.sse import SSEEvent  # noqa: E402
+from spool import Spool  # noqa: E402
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+
+class Replayer:
+    """
+    Feeds a recording through a real `BedExitMonitor` (event queue, dispatcher, scheduler,
+    prefetcher, producer, spool) with the sensor, AWS and the display replaced by the stand-ins
+    in `fakes`, and reports throughput, the pipeline metrics and every outbound call.
+
+    `speed` scales the gaps between events; 0 replays as fast as the monitor takes them. The
+    monitor's timers run on the wall clock, so only the presence debounce is scaled along with
+    the events. At speed 0 the debounce is not scaled, so timing-dependent decisions can differ
+    from the recording; use it to measure throughput.
+    """
+
+    def __init__(self, recording_path, speed=1.0, api_latency=0):
+        self.recording_path = recording_path
+        self.speed = speed
+        self.api_latency = api_latency
+        self.call_log = CallLog()
+
+    def run(self):
+        from main import BedExitMonitor
+
+        header, events, frames = read_recording(self.recording_path)
+        workdir = tempfile.mkdtemp(prefix="replay-")
+        sensor = FakeSensor(frames, self.call_log)
+        kinesis_client = KinesisClient(kinesis_client=FakeKinesis(self.call_log),
+                                       cloudwatchlogs_client=FakeCloudWatchLogs(self.call_log),
+                                       signed_api=FakeApi(self.call_log, latency=self.api_latency),
+                                       spool=Spool(os.path.join(workdir, "outbound.db")))
+        prefetcher = FramePrefetcher(archive=FrameArchive(os.path.join(workdir, "frames.ring")),
+                                     fetch_frames=sensor.iter_frames)
+        monitor = BedExitMonitor(kinesis_client=kinesis_client, sensor_client=sensor, frame_prefetcher=prefetcher,
+                                 lcd_manager=NullDisplay())
+        if self.speed:
+            monitor.presence_debounce /= self.speed
+
+        tracer.reset()
+        monitor.start_workers()
+        monitor.start_frame_pipeline()
+        try:
+            start = time.monotonic()
+            asyncio.run(self._feed(monitor, sensor, events))
+            fed_at = time.monotonic()
+            self._wait_until_idle(monitor)
+            report = self._report(header, monitor, len(events), fed_at - start, time.monotonic() - start)
+        finally:
+            self._shutdown(monitor)
+            shutil.rmtree(workdir, ignore_errors=True)
+        return report
+
+    async def _feed(self, monitor, sensor, events):
+        start = time.monotonic()
+        for t, event, data, event_id in events:
+            if self.speed:
+                delay = start + t / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if event == "newframe":
+                sensor.announce(json.loads(data)["id"])
+            await monitor.on_sse_event(SSEEvent(event, data, event_id))
+
+    def _wait_until_idle(self, monitor):
+        # Handlers submit to the dispatcher and the scheduler, which can submit again; loop until all are quiet
+        while True:
+            monitor.event_queue.join()
+            monitor.dispatcher.join()
+            if monitor.scheduler.pending() == 0 and monitor.event_queue.depth() == 0:
+                break
+            time.sleep(0.01)
+        monitor.kinesis_client.producer.flush()
+        monitor.kinesis_client.log_shipper.flush()
+
+    def _report(self, header, monitor, event_count, feed_seconds, wall_seconds):
+        return {
+            "recording": self.recording_path,
+            "recorded_at": header.get("recorded_at"),
+            "speed": self.speed,
+            "events": event_count,
+            "feed_seconds": round(feed_seconds, 3),
+            "wall_seconds": round(wall_seconds, 3),
+            "events_per_second": round(event_count / feed_seconds, 1) if feed_seconds else None,
+            "event_queue": monitor.event_queue.metrics(),
+            "dispatcher": monitor.dispatcher.metrics(),
+            "scheduler": monitor.scheduler.metrics(),
+            "producer": dict(monitor.kinesis_client.producer.stats),
+            "latency": tracer.snapshot(),
+            "outbound": self.call_log.counts(),
+            "calls": [(t, target, details) for t, target, details in self.call_log.calls()
+                      if not target.startswith("sensor.frames")],
+        }
+
+    def _shutdown(self, monitor):
+        if monitor.frame_streamer is not None:
+            monitor.frame_streamer.stop()
+        monitor.frame_prefetcher.stop()
+        monitor.event_queue.stop()
+        monitor.dispatcher.stop()
+        monitor.scheduler.stop()
+        monitor.kinesis_client.close()
@@ -0,0 +1,358 @@
+"""
+A local stand-in for the sensor's HTTP API, for load testing the edge process at frame rates
+and grid sizes the real sensor is not set up for. It serves the endpoints the monitor uses:
+
+    PUT    /api/frequency                   frame rate (unless pinned)
+    PUT    /api/monitor/storage/frequency
+    PUT    /api/monitor/attended/interval   turn timer length in seconds
+    PUT    /api/monitor/attended/ok         restart the turn timer
+    GET    /api/monitor/frames?after=&before=&exclude=risks
+    DELETE /api/monitor/frames
+    GET    /api/monitor/sse                 newframe, body, attended and storage events
+
+and two of its own: `PUT /fake/present` (true/false) to move the patient and `GET /fake/stats`.
+"""
+import itertools
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+FRAMES_PER_CHUNK = 50
+
+
+class FakeSensorServer:
+    """
+    Generates `rows` x `cols` frames at `frame_rate` per second and serves them like the sensor.
+
+    The patient gets in and out of bed on `presence_cycle`, a `(seconds in bed, seconds out)`
+    pair, or only through `set_present`. Faults: every request except the SSE stream is delayed
+    by `latency` plus up to `jitter` seconds, fails with a 500 at `error_rate` and has its
+    connection dropped at `drop_rate`; SSE connections go silent after `sse_stall_after` seconds,
+    to exercise the monitor's idle timeout.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, frame_rate=10, rows=64, cols=32, storage_frames=10000,
+                 presence_cycle=None, pin_frame_rate=False, latency=0, jitter=0, error_rate=0, drop_rate=0,
+                 sse_stall_after=None, storage_interval=10, seed=None):
+        self.frame_rate = frame_rate
+        self.rows = rows
+        self.cols = cols
+        self.storage_frames = storage_frames
+        self.presence_cycle = presence_cycle
+        self.pin_frame_rate = pin_frame_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.sse_stall_after = sse_stall_after
+        self.storage_interval = storage_interval
+        self.stats = {"frames": 0, "requests": {}, "errors": 0, "drops": 0, "events": 0, "sse_connections": 0,
+                      "slow_subscribers": 0}
+
+        self.present = False
+        self.rotation_interval = 120
+        self.frame_id = 0
+        self._random = random.Random(seed)
+        self._rng = np.random.default_rng(seed)
+        self._baseline = self._rng.integers(0, 8, size=(rows, cols), dtype=np.uint16)
+        self._frames = deque(maxlen=storage_frames)  # (frame id, readings as JSON)
+        self._frames_lock = threading.Lock()
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+        self._event_id = 0
+        self._timer_started_at = time.monotonic()
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._server_thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="fake-sensor", daemon=True)
+        self._thread.start()
+        self._server_thread = threading.Thread(target=self.httpd.serve_forever, name="fake-sensor-http",
+                                               daemon=True)
+        self._server_thread.start()
+        logger.info(f"Fake sensor serving {self.rows}x{self.cols} frames at {self.frame_rate}/s on {self.url}")
+
+    def stop(self):
+        self._stop_event.set()
+        with self._subscribers_lock:
+            for subscriber in self._subscribers:
+                try:
+                    subscriber.put_nowait(None)
+                except queue.Full:
+                    pass
+        if self._server_thread is not None:
+            self.httpd.shutdown()
+            self._server_thread.join()
+            self._server_thread = None
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def set_present(self, present):
+        if present != self.present:
+            self.present = present
+            self._timer_started_at = time.monotonic()
+            self._publish("body", {"present": present})
+
+    def storage_used(self):
+        with self._frames_lock:
+            return round(100.0 * len(self._frames) / self.storage_frames, 1)
+
+    def frames_between(self, after_frame, before_frame):
+        with self._frames_lock:
+            if not self._frames:
+                return []
+            # Frame ids are consecutive, so the window is a slice of the deque
+            oldest_id = self._frames[0][0]
+            start = max(0, after_frame + 1 - oldest_id)
+            stop = max(start, before_frame + 1 - oldest_id)
+            return list(itertools.islice(self._frames, start, stop))
+
+    def delete_frames(self):
+        with self._frames_lock:
+            self._frames.clear()
+
+    def _run(self):
+        next_frame_at = time.monotonic()
+        next_second_at = next_frame_at + 1
+        next_storage_at = next_frame_at + self.storage_interval
+        cycle_started_at = next_frame_at
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            if now < next_frame_at:
+                self._stop_event.wait(next_frame_at - now)
+                continue
+            # Fixed rate; a server that fell behind catches up by at most a second of frames
+            next_frame_at = max(next_frame_at + 1.0 / self.frame_rate, now - 1)
+            self._new_frame()
+
+            if now >= next_second_at:
+                next_second_at += 1
+                if self.presence_cycle is not None:
+                    in_bed, out_of_bed = self.presence_cycle
+                    self.set_present((now - cycle_started_at) % (in_bed + out_of_bed) < in_bed)
+                self._publish("attended", self._attended())
+            if now >= next_storage_at:
+                next_storage_at += self.storage_interval
+                self._publish("storage", {"used": self.storage_used()})
+
+    def _new_frame(self):
+        readings = self._baseline + self._rng.integers(0, 4, size=self._baseline.shape, dtype=np.uint16)
+        if self.present:
+            top, left = self.rows // 4, self.cols // 4
+            readings[top:self.rows - top, left:self.cols - left] += 200
+        with self._frames_lock:
+            self.frame_id += 1
+            frame_id = self.frame_id
+            self._frames.append((frame_id, json.dumps(readings.tolist(), separators=(",", ":"))))
+        self.stats["frames"] += 1
+        self._publish("newframe", {"id": frame_id})
+
+    def _attended(self):
+        countdown = 0
+        if self.present:
+            countdown = max(0, int(self.rotation_interval - (time.monotonic() - self._timer_started_at)))
+        return {"ok": not self.present or countdown > 0, "countdown": countdown}
+
+    def _publish(self, event, data):
+        with self._subscribers_lock:
+            self._event_id += 1
+            message = f"id: {self._event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.put_nowait(message)
+                except queue.Full:
+                    # A client that cannot keep up is cut off, like a full socket buffer would
+                    self._subscribers.discard(subscriber)
+                    with subscriber.mutex:
+                        subscriber.queue.clear()
+                    subscriber.put_nowait(None)
+                    self.stats["slow_subscribers"] += 1
+
+    def _subscribe(self):
+        subscriber = queue.Queue(maxsize=10000)
+        with self._subscribers_lock:
+            self._subscribers.add(subscriber)
+        self.stats["sse_connections"] += 1
+        return subscriber
+
+    def _unsubscribe(self, subscriber):
+        with self._subscribers_lock:
+            self._subscribers.discard(subscriber)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(SensorRequestHandler):
+            sensor = server
+
+        return Handler
+
+
+class SensorRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    sensor = None
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, format, *args):
+        pass  # one line per request drowns the edge's own logs
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        endpoint = f"{method} {url.path}"
+        sensor = self.sensor
+        sensor.stats["requests"][endpoint] = sensor.stats["requests"].get(endpoint, 0) + 1
+        body = self._read_body()
+
+        if endpoint == "GET /api/monitor/sse":
+            self._serve_sse()
+            return
+
+        delay = sensor.latency + sensor._random.uniform(0, sensor.jitter)
+        if delay:
+            time.sleep(delay)
+        if sensor._random.random() < sensor.drop_rate:
+            sensor.stats["drops"] += 1
+            self.close_connection = True
+            return
+        if sensor._random.random() < sensor.error_rate:
+            sensor.stats["errors"] += 1
+            self._send(500)
+            return
+
+        if endpoint == "GET /api/monitor/frames":
+            query = parse_qs(url.query)
+            self._serve_frames(int(query.get("after", [0])[0]), int(query.get("before", [0])[0]),
+                               "risks" in query.get("exclude", [""])[0].split(","))
+        elif endpoint == "DELETE /api/monitor/frames":
+            sensor.delete_frames()
+            self._send(204)
+        elif endpoint == "PUT /api/frequency":
+            if not sensor.pin_frame_rate:
+                sensor.frame_rate = max(1, int(body))
+            self._send(204)
+        elif endpoint == "PUT /api/monitor/storage/frequency":
+            self._send(204)
+        elif endpoint == "PUT /api/monitor/attended/interval":
+            sensor.rotation_interval = int(body)
+            sensor._timer_started_at = time.monotonic()
+            self._send(204)
+        elif endpoint == "PUT /api/monitor/attended/ok":
+            sensor._timer_started_at = time.monotonic()
+            self._send(204)
+        elif endpoint == "PUT /fake/present":
+            sensor.set_present(bool(body))
+            self._send(204)
+        elif endpoint == "GET /fake/stats":
+            self._send(200, json.dumps(dict(sensor.stats, frame_id=sensor.frame_id, present=sensor.present,
+                                            storage_used=sensor.storage_used())).encode("utf-8"))
+        else:
+            self._send(404)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return None
+        return json.loads(self.rfile.read(length))
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve_frames(self, after_frame, before_frame, exclude_risks):
+        # Sent chunked, a few frames at a time, so large windows stream like they do from the sensor
+        frames = self.sensor.frames_between(after_frame, before_frame)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        risks = "" if exclude_risks else ',"risks":[]'
+        for start in range(0, max(len(frames), 1), FRAMES_PER_CHUNK):
+            parts = [f'{{"id":{frame_id},"readings":[{readings}]{risks}}}'
+                     for frame_id, readings in frames[start:start + FRAMES_PER_CHUNK]]
+            text = ("[" if start == 0 else ",") + ",".join(parts)
+            if start + FRAMES_PER_CHUNK >= len(frames):
+                text += "]"
+            self._write_chunk(text.encode("utf-8"))
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def _serve_sse(self):
+        sensor = self.sensor
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        subscriber = sensor._subscribe()
+        stall_at = None if sensor.sse_stall_after is None else time.monotonic() + sensor.sse_stall_after
+        try:
+            # New clients learn the current presence right away
+            self.wfile.write(f"event: body\ndata: {json.dumps({'present': sensor.present})}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            while not sensor._stop_event.is_set():
+                if stall_at is not None and time.monotonic() >= stall_at:
+                    # Hold the connection open without sending anything until the client gives up
+                    sensor._unsubscribe(subscriber)
+                    while not sensor._stop_event.is_set() and self.rfile.read(1):
+                        pass
+                    return
+                try:
+                    message = subscriber.get(timeout=5)
+                except queue.Empty:
+                    message = b": keep-alive\n\n"
+                if message is None:
+                    return
+                self.wfile.write(message)
+                self.wfile.flush()
+                sensor.stats["events"] += 1
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            sensor._unsubscribe(subscriber)
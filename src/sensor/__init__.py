@@ -1 +1,8 @@
 from .sensor_utils import *
+from .sensor_client import SensorClient
+from .frame_stream import iter_json_array, read_frames_into
+from .frame_archive import FrameArchive
+from .frame_prefetcher import FramePrefetcher
+from .frame_streamer import FrameStreamer, streaming_enabled
+from .sse import SSEIngest, SSEHub, AsyncSSEClient, SSEParser
+from .events import parse_event, BodyEvent, AttendedEvent, NewFrameEvent, StorageEvent
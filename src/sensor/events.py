@@ -0,0 +1,55 @@
+import json
+import time
+from collections import namedtuple
+
+
+class BodyEvent(namedtuple("BodyEvent", ["present", "received_at"])):
+    __slots__ = ()
+    type = "body"
+
+    @classmethod
+    def from_payload(cls, payload, received_at):
+        return cls(bool(payload["present"]), received_at)
+
+
+class AttendedEvent(namedtuple("AttendedEvent", ["ok", "countdown", "received_at"])):
+    __slots__ = ()
+    type = "attended"
+
+    @classmethod
+    def from_payload(cls, payload, received_at):
+        return cls(bool(payload["ok"]), payload["countdown"], received_at)
+
+
+class NewFrameEvent(namedtuple("NewFrameEvent", ["id", "received_at"])):
+    __slots__ = ()
+    type = "newframe"
+
+    @classmethod
+    def from_payload(cls, payload, received_at):
+        return cls(payload["id"], received_at)
+
+
+class StorageEvent(namedtuple("StorageEvent", ["used", "received_at"])):
+    __slots__ = ()
+    type = "storage"
+
+    @classmethod
+    def from_payload(cls, payload, received_at):
+        return cls(payload["used"], received_at)
+
+
+EVENT_TYPES = {event_type.type: event_type for event_type in (BodyEvent, AttendedEvent, NewFrameEvent, StorageEvent)}
+
+
+def parse_event(name, data, received_at=None):
+    """
+    Decode the data of an SSE event into its typed event, or return None for event names the
+    monitor does not handle. The JSON is decoded exactly once, here.
+    """
+    event_type = EVENT_TYPES.get(name)
+    if event_type is None:
+        return None
+    if received_at is None:
+        received_at = time.monotonic()
+    return event_type.from_payload(json.loads(data), received_at)
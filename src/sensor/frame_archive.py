@@ -0,0 +1,220 @@
+import logging
+import os
+import threading
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+ARCHIVE_MAGIC = 0x4A584E52494E4731  # "JXNRING1"
+ARCHIVE_VERSION = 2
+
+# header slots
+_MAGIC = 0
+_VERSION = 1
+_CAPACITY = 2
+_ROWS = 3
+_COLS = 4
+_DTYPE = 5
+_HEAD = 6
+_COUNT = 7
+_SESSION = 8
+_HEADER_SLOTS = 9
+_HEADER_BYTES = _HEADER_SLOTS * 8
+
+
+def _dtype_code(dtype):
+    return ord(dtype.kind) * 256 + dtype.itemsize
+
+
+class FrameArchive:
+    """
+    Fixed-size ring of pressure matrices kept in a memory-mapped file.
+
+    The file holds a small header, the frame id of every slot and the frames themselves in a
+    compact numeric dtype. Frames are kept oldest to newest by frame id, so a window lookup is
+    a binary search over the ring. Windows that do not wrap around the end of the ring are
+    returned as views into the file; they are only valid until the ring overwrites those slots.
+
+    The file outlives the process, so the header also records which session (e.g. which sensor)
+    filled it; `start_session` drops frames that were archived under another one.
+    """
+
+    def __init__(self, path=None, capacity=None, dtype=np.uint16):
+        if path is None:
+            path = os.environ.get("SENSOR_ARCHIVE_PATH", "frames.ring")
+        if capacity is None:
+            capacity = int(os.environ.get("SENSOR_ARCHIVE_FRAMES", 10000))
+        self.path = path
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+
+        self._lock = threading.Lock()
+        self._header = None
+        self._ids = None
+        self._data = None
+        self._session = 0
+
+        if os.path.exists(self.path):
+            self._open_existing()
+
+    @property
+    def shape(self):
+        if self._header is None:
+            return None
+        return int(self._header[_ROWS]), int(self._header[_COLS])
+
+    @property
+    def newest_id(self):
+        with self._lock:
+            if not len(self):
+                return None
+            return self._newest_id()
+
+    @property
+    def session(self):
+        if self._header is None:
+            return None
+        return int(self._header[_SESSION]) or None
+
+    def __len__(self):
+        if self._header is None:
+            return 0
+        return int(self._header[_COUNT])
+
+    def append(self, frame_id, readings):
+        matrix = np.asarray(readings)
+        with self._lock:
+            if self._header is None or self.shape != matrix.shape:
+                self._create(matrix.shape)
+
+            count = int(self._header[_COUNT])
+            if count and frame_id <= self._newest_id():
+                return  # already archived, or older than the ring allows
+
+            head = int(self._header[_HEAD])
+            if np.issubdtype(self.dtype, np.integer):
+                info = np.iinfo(self.dtype)
+                matrix = np.clip(np.rint(matrix), info.min, info.max)
+            self._data[head] = matrix
+            self._ids[head] = frame_id
+            self._header[_HEAD] = (head + 1) % self.capacity
+            self._header[_COUNT] = min(count + 1, self.capacity)
+
+    def clear(self):
+        with self._lock:
+            if self._header is not None:
+                self._header[_HEAD] = 0
+                self._header[_COUNT] = 0
+
+    def start_session(self, session):
+        """
+        Mark the archive as filled from `session`. Frames archived under another session, or by
+        a process that did not record one, are dropped.
+        """
+        marker = zlib.crc32(str(session).encode("utf-8")) or 1
+        with self._lock:
+            self._session = marker
+            if self._header is None or int(self._header[_SESSION]) == marker:
+                return
+            if len(self):
+                logger.info(f"Frame archive {self.path} holds frames of another session. Clearing it")
+            self._header[_HEAD] = 0
+            self._header[_COUNT] = 0
+            self._header[_SESSION] = marker
+
+    def get_window(self, after_frame, before_frame):
+        """
+        Return `(ids, frames)` for the archived frames with `after_frame < id <= before_frame`,
+        or `(None, None)` if none are archived.
+        """
+        with self._lock:
+            count = len(self)
+            if not count:
+                return None, None
+            start = self._lower_bound(after_frame + 1)
+            stop = self._lower_bound(before_frame + 1)
+            if start >= stop:
+                return None, None
+
+            first = self._slot(start)
+            last = self._slot(stop - 1)
+            if first <= last:
+                return self._ids[first:last + 1], self._data[first:last + 1]
+            ids = np.concatenate((self._ids[first:], self._ids[:last + 1]))
+            frames = np.concatenate((self._data[first:], self._data[:last + 1]))
+            return ids, frames
+
+    def get_frames_within_window(self, frame_id, window_size=300):
+        if frame_id is None:
+            return None
+        after_frame = max(0, frame_id - window_size)
+        _, frames = self.get_window(after_frame, frame_id)
+        return frames
+
+    def flush(self):
+        with self._lock:
+            if self._header is not None:
+                self._header.flush()
+                self._ids.flush()
+                self._data.flush()
+
+    def _open_existing(self):
+        header = np.memmap(self.path, dtype=np.int64, mode="r+", shape=(_HEADER_SLOTS,))
+        if header[_MAGIC] != ARCHIVE_MAGIC or header[_VERSION] != ARCHIVE_VERSION \
+                or header[_CAPACITY] != self.capacity or header[_DTYPE] != _dtype_code(self.dtype):
+            logger.info(f"Frame archive {self.path} does not match the configuration. It will be recreated")
+            del header
+            return
+        self._map(header, (int(header[_ROWS]), int(header[_COLS])))
+        logger.info(f"Opened frame archive {self.path} with {len(self)} frames")
+
+    def _create(self, shape):
+        rows, cols = shape
+        data_bytes = self.capacity * rows * cols * self.dtype.itemsize
+        self._header = self._ids = self._data = None
+        with open(self.path, "wb") as f:
+            f.truncate(_HEADER_BYTES + self.capacity * 8 + data_bytes)
+
+        header = np.memmap(self.path, dtype=np.int64, mode="r+", shape=(_HEADER_SLOTS,))
+        header[:] = (ARCHIVE_MAGIC, ARCHIVE_VERSION, self.capacity, rows, cols, _dtype_code(self.dtype), 0, 0,
+                     self._session)
+        self._map(header, shape)
+        self._ids[:] = -1
+        logger.info(f"Created frame archive {self.path} for {self.capacity} frames of {rows}x{cols}")
+
+    def _map(self, header, shape):
+        self._header = header
+        self._ids = np.memmap(self.path, dtype=np.int64, mode="r+", offset=_HEADER_BYTES,
+                              shape=(self.capacity,))
+        self._data = np.memmap(self.path, dtype=self.dtype, mode="r+",
+                               offset=_HEADER_BYTES + self.capacity * 8, shape=(self.capacity,) + tuple(shape))
+
+    def _slot(self, index):
+        # Maps a logical index (0 = oldest frame) to its slot in the ring
+        count = int(self._header[_COUNT])
+        head = int(self._header[_HEAD])
+        return (head - count + index) % self.capacity
+
+    def _newest_id(self):
+        return int(self._ids[self._slot(len(self) - 1)])
+
+    def _lower_bound(self, frame_id):
+        # Logical index of the first frame with an id >= frame_id
+        low, high = 0, len(self)
+        while low < high:
+            mid = (low + high) // 2
+            if self._ids[self._slot(mid)] < frame_id:
+                low = mid + 1
+            else:
+                high = mid
+        return low
@@ -0,0 +1,157 @@
+import logging
+import os
+import threading
+
+from .frame_archive import FrameArchive
+from .sensor_utils import iter_frames
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+
+class FramePrefetcher:
+    """
+    Pulls frames from the sensor in small batches as `newframe` events arrive and keeps them in
+    the on-disk frame archive, so the exit path only has to read frames that are already local.
+
+    By default the fetching runs on a thread of its own. With an `executor` (a callable taking a
+    zero-argument function, e.g. a dispatcher lane) it runs there instead, at most one fetch per
+    prefetcher at a time, so many prefetchers can share a few threads.
+
+    The archive is kept across restarts. It is only reused for the same `session` (the sensor URL
+    by default) and only if the first frame id announced after startup does not go back behind it.
+    """
+
+    def __init__(self, window_size=300, batch_size=None, archive=None, fetch_frames=None, executor=None,
+                 session=None):
+        self.window_size = window_size
+        # Callable yielding (frame id, readings) for after < id <= before; the sensor by default
+        self.fetch_frames = fetch_frames or iter_frames
+        self.executor = executor
+        if batch_size is None:
+            batch_size = int(os.environ.get("SENSOR_PREFETCH_BATCH", 30))
+        self.batch_size = batch_size
+
+        if archive is None:
+            archive = FrameArchive()
+        self.archive = archive
+        archive.start_session(os.environ.get("SENSOR_URL") if session is None else session)
+        self._frames_lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+        self._cursor = archive.newest_id  # highest frame id already requested from the sensor
+        self._latest_id = None  # highest frame id announced by the sensor
+        self._reset_pending = False
+        self._fetch_queued = False
+
+        self._new_frame_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        if self.executor is not None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._new_frame_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def notify(self, frame_id):
+        if frame_id is None:
+            return
+        with self._frames_lock:
+            if self._latest_id is None:
+                # First id since startup; the sensor may have restarted and counted from 1 again
+                newest_id = self.archive.newest_id
+                if newest_id is not None and frame_id < newest_id:
+                    logger.info(f"Frame id {frame_id} is behind the archive ({newest_id}). Clearing it")
+                    self.archive.clear()
+                    self._reset_pending = True
+            elif frame_id < self._latest_id:
+                # The sensor restarted and its frame ids started over
+                logger.info(f"Frame id went backwards ({self._latest_id} -> {frame_id}). Resetting prefetch state")
+                self.archive.clear()
+                self._reset_pending = True
+            self._latest_id = frame_id
+            if self.executor is None:
+                self._new_frame_event.set()
+                return
+            if self._fetch_queued or self._stop_event.is_set():
+                return
+            self._fetch_queued = True
+        if self.executor(self._fetch_latest) is False:
+            with self._frames_lock:
+                self._fetch_queued = False
+
+    def get_frames_within_window(self, frame_id):
+        if frame_id is None:
+            return None
+
+        # Only the frames announced since the last batch still need fetching
+        try:
+            self._catch_up(frame_id)
+        except Exception as e:
+            logger.error(f"Error while fetching the remaining frames: {e}")
+
+        return self.archive.get_frames_within_window(frame_id, self.window_size)
+
+    def sync(self, frame_id):
+        # Makes sure everything up to frame_id is archived, e.g. before the sensor storage is wiped
+        if frame_id is not None:
+            self._catch_up(frame_id)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._new_frame_event.wait()
+            self._new_frame_event.clear()
+            if self._stop_event.is_set():
+                break
+            self._fetch_latest()
+
+    def _fetch_latest(self):
+        with self._frames_lock:
+            self._fetch_queued = False
+            latest_id = self._latest_id
+        if latest_id is None:
+            return
+        try:
+            self._catch_up(latest_id)
+        except Exception as e:
+            logger.error(f"Error while prefetching frames: {e}")
+
+    def _catch_up(self, frame_id):
+        with self._fetch_lock:
+            with self._frames_lock:
+                if self._reset_pending:
+                    self._cursor = None
+                    self._reset_pending = False
+            if self._cursor is None or self._cursor > frame_id:
+                self._cursor = max(0, frame_id - self.window_size)
+            elif frame_id - self._cursor > self.archive.capacity:
+                self._cursor = frame_id - self.archive.capacity
+
+            while self._cursor < frame_id and not self._stop_event.is_set():
+                after_frame = self._cursor
+                before_frame = min(after_frame + self.batch_size, frame_id)
+                try:
+                    # The archive rejects ids at or below its newest, so write each batch in id order
+                    frames = sorted(self.fetch_frames(after_frame, before_frame), key=lambda frame: frame[0])
+                    for fid, readings in frames:
+                        self.archive.append(fid, readings)
+                except Exception as e:
+                    logger.error(f"Failed to prefetch frames {after_frame}-{before_frame}: {e}")
+                    return
+                self._cursor = before_frame
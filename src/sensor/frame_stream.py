@@ -0,0 +1,80 @@
+import codecs
+import json
+
+import numpy as np
+
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_array(chunks):
+    """
+    Yield the elements of a top level JSON array one at a time from an iterable of byte or text
+    chunks, so only one element has to be held in memory at once.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = utf8.decode(chunk)
+        buffer += chunk
+
+        while True:
+            buffer = buffer.lstrip(_WHITESPACE)
+            if not started:
+                if not buffer:
+                    break
+                if buffer[0] != "[":
+                    raise ValueError("Expected a JSON array")
+                buffer = buffer[1:]
+                started = True
+                continue
+            if buffer.startswith(","):
+                buffer = buffer[1:]
+                continue
+            if buffer.startswith("]"):
+                return
+            try:
+                element, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break  # element is incomplete, wait for more data
+            if end == len(buffer):
+                break  # a number could still continue in the next chunk
+            buffer = buffer[end:]
+            yield element
+
+    raise ValueError("Truncated JSON array")
+
+
+def iter_frames(chunks):
+    """
+    Yield `(frame_id, readings)` for every frame in a `/api/monitor/frames` response body, keeping
+    only the first readings matrix of each frame.
+    """
+    for frame in iter_json_array(chunks):
+        yield frame["id"], frame["readings"][0]
+
+
+def read_frames_into(frames, max_frames, dtype=np.uint16):
+    """
+    Write `(frame_id, readings)` pairs into a buffer that is allocated once, when the first frame
+    shows the grid size. Returns `(ids, matrices)` trimmed to the number of frames read.
+    """
+    ids = np.empty(max_frames, dtype=np.int64)
+    buffer = None
+    count = 0
+    for frame_id, readings in frames:
+        if count == max_frames:
+            break
+        if buffer is None:
+            matrix = np.asarray(readings)
+            buffer = np.empty((max_frames,) + matrix.shape, dtype=dtype)
+        ids[count] = frame_id
+        buffer[count] = readings
+        count += 1
+
+    if buffer is None:
+        return None, None
+    return ids[:count], buffer[:count]
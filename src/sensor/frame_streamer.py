@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from .sensor_utils import format_sensor_matrices, partition_keys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+
+def streaming_enabled():
+    # "1" streams every frame in micro-batches instead of dumping a window on exit
+    return os.environ.get("FRAME_STREAMING", "0") == "1"
+
+
+class FrameStreamer:
+    """
+    Streams every frame the prefetcher archives to Kinesis in micro-batches of at most
+    `max_frames` frames, flushed at the latest `max_age` seconds after the previous batch.
+
+    All batches and markers of one streamer share a stream id and therefore their partition
+    keys, so they land on one shard in order. Batches carry `stream_id`, `sequence` and the ids
+    of their first and last frame in the record header; markers are plain JSON records with
+    `"type": "marker"` that are sent right after the frames up to their frame id.
+    """
+
+    def __init__(self, prefetcher, put_records, partitioner=None, is_present=None, bed_id=None, max_frames=None,
+                 max_age=None, linger=0.5, sensor_ssid=None, aggregator=None):
+        self.prefetcher = prefetcher
+        self.archive = prefetcher.archive
+        self.put_records = put_records
+        self.partitioner = partitioner
+        self.aggregator = aggregator
+        self.is_present = is_present or (lambda: False)
+        self.bed_id = bed_id or (lambda: None)
+        if max_frames is None:
+            max_frames = int(os.environ.get("FRAME_STREAMING_BATCH", 30))
+        if max_age is None:
+            max_age = float(os.environ.get("FRAME_STREAMING_MAX_AGE", 5))
+        self.max_frames = max_frames
+        self.max_age = max_age
+        self.linger = linger
+        self.sensor_ssid = sensor_ssid or os.environ.get("SENSOR_SSID")
+
+        self.stream_id = str(uuid.uuid4())
+        self.stats = {"batches": 0, "frames": 0, "markers": 0, "errors": 0}
+        self._sequence = 0
+        self._cursor = None  # highest frame id already streamed
+        self._last_flush_at = time.monotonic()
+        self._markers = []
+        self._markers_lock = threading.Lock()
+        self._pump_lock = threading.Lock()
+
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def mark(self, event, frame_id, **fields):
+        """
+        Stamp an event (e.g. "bedExit") into the stream. Never blocks: the marker is sent by the
+        streaming thread once the frames up to `frame_id` have gone out.
+        """
+        marker = dict(fields, type="marker", event=event, frame_id=frame_id,
+                      time=datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+        with self._markers_lock:
+            self._markers.append(marker)
+        self._wake_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self.linger)
+            self._wake_event.clear()
+            try:
+                self._pump()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Error while streaming frames: {e}")
+        try:
+            self._pump(force=True)
+        except Exception as e:
+            logger.error(f"Error while flushing streamed frames: {e}")
+
+    def _pump(self, force=False):
+        with self._pump_lock:
+            with self._markers_lock:
+                markers, self._markers = self._markers, []
+            for marker in markers:
+                if marker["frame_id"] is not None:
+                    self.prefetcher.sync(marker["frame_id"])
+                    self._stream_frames(marker["frame_id"], force=True)
+                self._send_marker(marker)
+            self._stream_frames(self.archive.newest_id, force=force)
+
+    def _stream_frames(self, before_frame, force):
+        newest_id = self.archive.newest_id
+        if newest_id is None or before_frame is None:
+            return
+        if self._cursor is None:
+            self._cursor = max(-1, newest_id - self.max_frames)
+        elif self._cursor > newest_id:
+            # The archive was reset after the sensor's frame ids started over
+            logger.info(f"Frame id went backwards ({self._cursor} -> {newest_id}). Restarting the stream cursor")
+            self._cursor = -1
+
+        while self._cursor < before_frame:
+            ids, frames = self.archive.get_window(self._cursor, before_frame)
+            if ids is None:
+                return
+            if not force and len(ids) < self.max_frames and time.monotonic() - self._last_flush_at < self.max_age:
+                return
+            # Copy out of the ring before the frames can be overwritten
+            ids = np.array(ids[:self.max_frames])
+            frames = np.array(frames[:self.max_frames])
+            self._send_batch(ids, frames)
+            self._cursor = int(ids[-1])
+
+    def _send_batch(self, ids, frames):
+        header = {
+            "stream_id": self.stream_id,
+            "sequence": self._sequence,
+            "first_frame_id": int(ids[0]),
+            "last_frame_id": int(ids[-1]),
+        }
+        records = format_sensor_matrices(frames, self.is_present(), frequency=int(os.environ["SENSOR_FREQUENCY"]),
+                                         partitioner=self.partitioner, bed_id=self.bed_id(),
+                                         upload_id=self.stream_id, header=header, sensor_ssid=self.sensor_ssid,
+                                         aggregator=self.aggregator)
+        self.put_records(records)
+        self._sequence += 1
+        self._last_flush_at = time.monotonic()
+        self.stats["batches"] += 1
+        self.stats["frames"] += len(ids)
+
+    def _send_marker(self, marker):
+        marker = dict(marker, stream_id=self.stream_id, sequence=self._sequence)
+        keys = partition_keys(self.partitioner, self.stream_id, sensor_ssid=self.sensor_ssid, bed_id=self.bed_id())
+        self.put_records([dict(keys, Data=json.dumps(marker))])
+        self._sequence += 1
+        self.stats["markers"] += 1
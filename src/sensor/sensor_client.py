@@ -0,0 +1,135 @@
+import logging
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LatencyStats
+from .frame_stream import iter_frames
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+
+class SensorClient:
+    """
+    HTTP client for the sensor API. All calls go through one keep-alive session, so sensor
+    round-trips reuse pooled connections instead of opening a new TCP connection each time.
+    Clients for several sensors can share one `session` (see `new_session`), which keeps a
+    connection pool per sensor; a shared session is left open by `close`.
+    """
+
+    def __init__(self, base_url, timeout=5, retries=2, backoff=0.2, pool_size=4, session=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.latency = LatencyStats()
+
+        self.owns_session = session is None
+        self.session = session or self.new_session(pool_size=pool_size)
+
+    @staticmethod
+    def new_session(pool_connections=1, pool_size=4):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def request(self, method, path, timeout=None, retries=None, **kwargs):
+        """
+        Send a request to the sensor. Connection errors, timeouts and 5xx responses are retried
+        with jittered exponential backoff; the last response is returned or the last error raised.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if retries is None:
+            retries = self.retries
+        url = f"{self.base_url}{path}"
+        endpoint = f"{method} {path.split('?')[0]}"
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.latency.record(endpoint, time.monotonic() - start, error=True)
+                if attempt >= retries:
+                    raise
+                logger.info(f"{endpoint} failed ({e}). Retrying")
+            else:
+                is_error = response.status_code >= 500
+                self.latency.record(endpoint, time.monotonic() - start, error=is_error)
+                if not is_error or attempt >= retries:
+                    return response
+                logger.info(f"{endpoint} returned {response.status_code}. Retrying")
+                # A streamed body holds its pooled connection until closed
+                response.close()
+
+            time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+            attempt += 1
+
+    def put(self, path, payload, **kwargs):
+        headers = {"Content-Type": "application/json"}
+        return self.request("PUT", path, headers=headers, json=payload, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def set_frequency(self, new_frequency):
+        response1 = self.put("/api/frequency", new_frequency)
+        response2 = self.put("/api/monitor/storage/frequency", new_frequency)
+        return response1.status_code == 204 and response2.status_code == 204
+
+    def set_rotation_interval(self, new_interval):
+        response = self.put("/api/monitor/attended/interval", new_interval)
+        return response.status_code == 204
+
+    def reset_rotation_interval(self):
+        response = self.put("/api/monitor/attended/ok", True)
+        return response.status_code == 204
+
+    def delete_all_frames(self):
+        response = self.delete("/api/monitor/frames")
+        return response.status_code == 204
+
+    def get_frames(self, after_frame, before_frame, timeout=10):
+        response = self.get(f"/api/monitor/frames?after={after_frame}&before={before_frame}&exclude=risks",
+                            timeout=timeout)
+        if response.status_code == 200:
+            return response.json()
+        return None
+
+    def iter_frames(self, after_frame, before_frame, timeout=10, chunk_size=16384):
+        """
+        Stream `(frame_id, readings)` pairs from the frames endpoint as the body arrives, instead
+        of decoding the whole response at once.
+        """
+        response = self.get(f"/api/monitor/frames?after={after_frame}&before={before_frame}&exclude=risks",
+                            timeout=timeout, stream=True)
+        with response:
+            response.raise_for_status()
+            for frame in iter_frames(response.iter_content(chunk_size=chunk_size)):
+                yield frame
+
+    def check_connection(self):
+        # Deleting frames doubles as the connection check, as it always has
+        response = self.delete("/api/monitor/frames", retries=0)
+        return response.status_code == 204
+
+    def close(self):
+        if self.owns_session:
+            self.session.close()
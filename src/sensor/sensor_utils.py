@@ -4,9 +4,12 @@ import os
 import uuid
 from datetime import datetime
 
-import requests
+from .frame_stream import read_frames_into
+from .sensor_client import SensorClient
 
-sensor_url = os.environ["SENSOR_URL"]
+# The module's client for single-sensor setups; a multi-bed gateway gives every monitor its own
+sensor_url = os.environ.get("SENSOR_URL", "")
+sensor_client = SensorClient(sensor_url)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -19,59 +22,35 @@ logger.addHandler(filelogHandler)
 logger.addHandler(logHandler)
 
 
-def initialize_default_sensor():
+# The functions below talk to the module's sensor client unless they are given another one,
+# e.g. a stand-in sensor when replaying a recording
+
+
+def initialize_default_sensor(client=None):
     # Initialize the sensor default values
     logger.info("Initializing Sensor Values")
-    set_frequency(int(os.environ["SENSOR_FREQUENCY"]))
-    set_rotation_interval(int(os.environ["SENSOR_ROTATION"]))
+    set_frequency(int(os.environ["SENSOR_FREQUENCY"]), client=client)
+    set_rotation_interval(int(os.environ["SENSOR_ROTATION"]), client=client)
     # reset_rotation_interval()
 
 
-def set_frequency(new_frequency):
-    url = f"{sensor_url}/api/frequency"
-    url2 = f"{sensor_url}/api/monitor/storage/frequency"
-    headers = {"Content-Type": "application/json"}
-    payload = new_frequency
-    response1 = requests.put(url, headers=headers, json=payload)
-    response2 = requests.put(url2, headers=headers, json=payload)
-
-    if response1.status_code == 204 and response2.status_code == 204:
-        return True
-    else:
-        return False  # or raise an exception, depending on your requirements
-
-
-def set_rotation_interval(new_interval):
-    url = f"{sensor_url}/api/monitor/attended/interval"
-    headers = {"Content-Type": "application/json"}
-    payload = new_interval
-    response1 = requests.put(url, headers=headers, json=payload)
+def set_frequency(new_frequency, client=None):
+    return (client or sensor_client).set_frequency(new_frequency)
 
-    if response1.status_code == 204:
-        return True
-    else:
-        return False  # or raise an exception, depending on your requirements
 
+def set_rotation_interval(new_interval, client=None):
+    return (client or sensor_client).set_rotation_interval(new_interval)
 
-def reset_rotation_interval():
-    url = f"{sensor_url}/api/monitor/attended/ok"
-    headers = {"Content-Type": "application/json"}
-    payload = True
-    response1 = requests.put(url, headers=headers, json=payload)
 
-    if response1.status_code == 204:
-        return True
-    else:
-        return False  #
+def reset_rotation_interval(client=None):
+    return (client or sensor_client).reset_rotation_interval()
 
 
-def delete_all_frames():
-    url = f"{sensor_url}/api/monitor/frames"
-    response = requests.delete(url)
-    if response.status_code == 204:
+def delete_all_frames(client=None):
+    if (client or sensor_client).delete_all_frames():
         logger.info("All frames deleted successfully.")
     else:
-        logger.error("Failed to delete frames. Status code:", response.status_code)
+        logger.error("Failed to delete frames.")
 
 
 def get_frames_within_window(frame_id):
@@ -84,14 +63,23 @@ def get_frames_within_window(frame_id):
         after_frame = frame_id - 300
     before_frame = frame_id
 
-    url = f"{sensor_url}/api/monitor/frames?after={after_frame}&before={before_frame}&exclude=risks"
-    response = requests.get(url)
+    return get_frames(after_frame, before_frame)
 
-    if response.status_code == 200:
-        frames = json.loads(response.text)
-        return frames
-    else:
-        return None  # or raise an exception, depending on your requirements
+
+def get_frames(after_frame, before_frame):
+    return sensor_client.get_frames(after_frame, before_frame)
+
+
+def iter_frames(after_frame, before_frame):
+    return sensor_client.iter_frames(after_frame, before_frame)
+
+
+def get_frame_matrices_within_window(frame_id, window_size=300):
+    # Streams the window straight into one numeric buffer instead of a list of parsed frames
+    if frame_id is None:
+        return None, None
+    after_frame = max(0, frame_id - window_size)
+    return read_frames_into(iter_frames(after_frame, frame_id), window_size)
 
 
 def format_sensor_data(readings, is_present, frequency):
@@ -106,20 +94,56 @@ def format_sensor_data(readings, is_present, frequency):
     #     "readings": format_readings(readings)
     # }
 
+    return format_sensor_matrices([obj["readings"][0] for obj in readings], is_present, frequency,
+                                  timestamp=timestamp)
+
+
+def partition_keys(partitioner, upload_id, sensor_ssid=None, bed_id=None):
+    # Without a partitioner every upload uses the configured PARTITION_KEY, the original behaviour
+    if partitioner is None:
+        return {"PartitionKey": os.environ["PARTITION_KEY"]}
+    return partitioner.partition(upload_id=upload_id, sensor_ssid=sensor_ssid, bed_id=bed_id)
+
+
+def format_sensor_matrices(matrices, is_present, frequency, timestamp=None, partitioner=None, bed_id=None,
+                           upload_id=None, header=None, sensor_ssid=None, aggregator=None):
+    # matrices is a sequence of pressure matrices, either nested lists or numpy arrays. `header`
+    # holds extra fields for every record, e.g. the frame ids of a streamed micro-batch.
+    # `aggregator` (see kinesis.aggregation.FrameAggregator) packs the window into a few aggregated
+    # records; without one every frame is a JSON record of its own
+    if timestamp is None:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    uid = upload_id or str(uuid.uuid4())
+    extra = header or {}
+    # All records of one upload share their keys, which keeps them in order on one shard
+    if sensor_ssid is None:
+        sensor_ssid = os.environ.get("SENSOR_SSID")
+    keys = partition_keys(partitioner, uid, sensor_ssid=sensor_ssid, bed_id=bed_id)
+
+    if aggregator is not None:
+        record_header = dict(extra, **{
+            "id": uid,
+            "time": timestamp,
+            "patient_present": is_present,
+            "frames_per_hour": frequency,
+        })
+        return [dict(keys, Data=data) for data in aggregator(record_header, matrices, keys["PartitionKey"])]
+
     output_array = []
-    uid = str(uuid.uuid4())
-    for i, obj in enumerate(readings):
-        output_obj = {
-            "PartitionKey": os.environ["PARTITION_KEY"],
-            "Data": json.dumps({
+    for i, matrix in enumerate(matrices):
+        if hasattr(matrix, "tolist"):
+            matrix = matrix.tolist()
+        output_obj = dict(keys, **{
+            "Data": json.dumps(dict(extra, **{
                 "id": uid,
                 "frame": i,
                 "time": timestamp,
                 "patient_present": is_present,
                 "frames_per_hour": frequency,
-                "readings": obj["readings"][0]
-            })
-        }
+                "readings": matrix
+            }))
+        })
         output_array.append(output_obj)
     return output_array
 
@@ -135,18 +159,16 @@ def format_readings(readings):
     return output_array
 
 
-def check_sensor_connection():
-    url = f"{sensor_url}/api/monitor/frames"
+def check_sensor_connection(client=None):
     logger.info("check_sensor_connection: checking...")
 
     try:
-        response = requests.delete(url, timeout=5)  # Set a timeout value (e.g., 5 seconds)
-        if response.status_code == 204:
+        if (client or sensor_client).check_connection():
             logger.info("Sensor Connection: Valid")
             return True
         else:
             logger.info("Sensor Connection: Invalid")
             return False
     except Exception as e:
-        logger.error("Error while checking sensor connection:", e)
+        logger.error(f"Error while checking sensor connection: {e}")
         return False
@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+SSEEvent = namedtuple("SSEEvent", ["event", "data", "id"])
+
+
+class SSEParser:
+    """
+    Incremental parser for the text/event-stream format: feed it one line at a time and it
+    returns an `SSEEvent` whenever a blank line completes one.
+    """
+
+    def __init__(self):
+        self.last_event_id = None
+        self.retry = None
+        self._reset()
+
+    def feed(self, line):
+        line = line.rstrip("\r\n")
+        if not line:
+            return self._dispatch()
+        if line.startswith(":"):
+            return None  # comment / keep-alive
+
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            self._event = value
+        elif field == "data":
+            self._data.append(value)
+        elif field == "id" and "\0" not in value:
+            self._id = value
+        elif field == "retry" and value.isdigit():
+            self.retry = int(value) / 1000.0
+        return None
+
+    def _dispatch(self):
+        if self._id is not None:
+            self.last_event_id = self._id
+        if not self._data:
+            self._reset()
+            return None
+        event = SSEEvent(self._event or "message", "\n".join(self._data), self.last_event_id)
+        self._reset()
+        return event
+
+    def _reset(self):
+        self._event = None
+        self._data = []
+        self._id = None
+
+
+class SSEStreamError(Exception):
+    pass
+
+
+class AsyncSSEClient:
+    """
+    Minimal SSE consumer on top of asyncio streams. Reconnects with `Last-Event-ID` and
+    exponential backoff, and treats a stream that stays silent for `idle_timeout` seconds as
+    dead. `on_event` is a coroutine function called with every `SSEEvent`, in order.
+    """
+
+    def __init__(self, url, on_event, idle_timeout=20, reconnect_delay=1, max_reconnect_delay=30):
+        self.url = url
+        self.on_event = on_event
+        self.idle_timeout = idle_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.parser = SSEParser()
+        self.stats = {"connects": 0, "events": 0, "idle_timeouts": 0, "errors": 0}
+
+    async def run(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                await self.consume()
+                delay = self.reconnect_delay
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                self.stats["idle_timeouts"] += 1
+                logger.info(f"No SSE data for {self.idle_timeout}s. Reconnecting")
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"SSE stream failed: {e}")
+            if self.parser.retry is not None:
+                delay = max(delay, self.parser.retry)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def consume(self):
+        """
+        Read one connection until the server closes it. Raises on errors and idle timeouts; the
+        socket is closed however this returns, including cancellation.
+        """
+        url = urlparse(self.url)
+        port = url.port or (443 if url.scheme == "https" else 80)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(url.hostname, port, ssl=url.scheme == "https"), self.idle_timeout)
+        try:
+            writer.write(self._request(url))
+            await writer.drain()
+            chunked = await self._read_headers(reader)
+            self.stats["connects"] += 1
+            self.parser = self._new_parser()
+
+            lines = self._iter_chunked_lines(reader) if chunked else self._iter_lines(reader)
+            async for line in lines:
+                event = self.parser.feed(line)
+                if event is not None:
+                    self.stats["events"] += 1
+                    await self.on_event(event)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def _new_parser(self):
+        # Keep the resume state of the previous connection
+        parser = SSEParser()
+        parser.last_event_id = self.parser.last_event_id
+        parser.retry = self.parser.retry
+        return parser
+
+    def _request(self, url):
+        path = url.path or "/"
+        if url.query:
+            path += "?" + url.query
+        headers = [
+            f"GET {path} HTTP/1.1",
+            f"Host: {url.netloc}",
+            "Accept: text/event-stream",
+            "Cache-Control: no-cache",
+        ]
+        if self.parser.last_event_id is not None:
+            headers.append(f"Last-Event-ID: {self.parser.last_event_id}")
+        return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1")
+
+    async def _readline(self, reader):
+        line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        if not line:
+            raise SSEStreamError("Connection closed by the sensor")
+        return line
+
+    async def _read_headers(self, reader):
+        status = (await self._readline(reader)).decode("latin-1").split(" ", 2)
+        if len(status) < 2 or status[1] != "200":
+            raise SSEStreamError(f"Unexpected SSE response: {' '.join(status).strip()}")
+        chunked = False
+        while True:
+            line = (await self._readline(reader)).decode("latin-1").strip()
+            if not line:
+                return chunked
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "transfer-encoding" and "chunked" in value.lower():
+                chunked = True
+
+    async def _iter_lines(self, reader):
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            if not line:
+                return
+            yield line.decode("utf-8")
+
+    async def _iter_chunked_lines(self, reader):
+        buffer = b""
+        while True:
+            size_line = await self._readline(reader)
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                return
+            buffer += await asyncio.wait_for(reader.readexactly(size + 2), self.idle_timeout)
+            buffer = buffer[:-2]  # chunk trailer CRLF
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line.decode("utf-8")
+
+
+class SSEIngest:
+    """
+    Runs an `AsyncSSEClient` on its own event loop thread. `stop()` cancels the consumer,
+    which closes the socket, and waits for the thread to finish, so restarts never leak.
+    `on_start`, if given, runs in the loop's executor before the first connection.
+    """
+
+    def __init__(self, url, on_event, on_start=None, **client_kwargs):
+        self.client = AsyncSSEClient(url, on_event, **client_kwargs)
+        self.on_start = on_start
+        self._loop = None
+        self._task = None
+        self._thread = None
+        self._started = threading.Event()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._started.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self, timeout=5):
+        if not self.is_running():
+            self._thread = None
+            return
+        deadline = time.monotonic() + timeout
+        while self._thread.is_alive() and time.monotonic() < deadline:
+            # Cancel again until it sticks, see `cancel_and_wait`
+            self._loop.call_soon_threadsafe(self._task.cancel)
+            self._thread.join(0.1)
+        if self._thread.is_alive():
+            logger.error("SSE ingest thread did not stop in time")
+        self._thread = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._task = self._loop.create_task(self._main())
+            self._loop.call_soon(self._started.set)
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._started.set()
+            self._loop.run_until_complete(self._loop.shutdown_default_executor())
+            self._loop.close()
+
+    async def _main(self):
+        await run_client(self.client, self.on_start)
+
+
+async def cancel_and_wait(tasks):
+    # Before Python 3.12 `wait_for` drops a cancel that races with its read completing, so
+    # keep cancelling until the tasks are done
+    pending = set(tasks)
+    while pending:
+        for task in pending:
+            task.cancel()
+        _, pending = await asyncio.wait(pending, timeout=0.1)
+
+
+async def run_client(client, on_start=None):
+    if on_start is not None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, on_start)
+        except Exception as e:
+            logger.error(f"SSE start hook failed: {e}")
+    await client.run()
+
+
+class SSEHub:
+    """
+    Runs the SSE consumers of several sensors on one shared event loop thread, instead of a
+    thread and a loop per sensor. `client()` returns a handle with the same `start`, `stop` and
+    `is_running` as `SSEIngest`; the loop thread starts with the first client.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def client(self, url, on_event, on_start=None, **client_kwargs):
+        return HubClient(self, AsyncSSEClient(url, on_event, **client_kwargs), on_start)
+
+    def loop(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="sse-hub", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def stop(self, timeout=5):
+        with self._lock:
+            if self._thread is None:
+                return
+            loop, thread = self._loop, self._thread
+            self._thread = None
+
+        async def shutdown():
+            await cancel_and_wait([task for task in asyncio.all_tasks() if task is not asyncio.current_task()])
+            await loop.shutdown_default_executor()
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout)
+        except Exception as e:
+            logger.error(f"SSE hub did not shut down cleanly: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        loop.close()
+
+
+class HubClient:
+
+    def __init__(self, hub, client, on_start=None):
+        self.hub = hub
+        self.client = client
+        self.on_start = on_start
+        self._loop = None
+        self._task = None
+
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._loop = self.hub.loop()
+
+        async def create_task():
+            return asyncio.get_running_loop().create_task(run_client(self.client, self.on_start))
+
+        self._task = asyncio.run_coroutine_threadsafe(create_task(), self._loop).result()
+
+    def stop(self, timeout=5):
+        # Cancelling the consumer closes its socket; wait for that before returning
+        if not self.is_running():
+            return
+        task = self._task
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_and_wait([task]), self._loop).result(timeout)
+        except Exception as e:
+            logger.error(f"SSE client did not stop in time: {e}")
@@ -0,0 +1 @@
+from .spool import Spool, SpoolReplayer
@@ -0,0 +1,220 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+
+class Spool:
+    """
+    Crash-safe, append-only store for outbound calls, backed by SQLite in WAL mode.
+
+    Entries are delivered in the order they were appended (per kind) and marked delivered
+    afterwards; `compact` removes delivered entries and truncates the WAL.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.environ.get("SPOOL_PATH", "outbound.db")
+        self.path = path
+        self._lock = threading.Lock()
+        self._in_flight = set()  # ids a caller is delivering itself, hidden from the replayer
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL keeps the database consistent through any crash and only syncs at checkpoints,
+        # so appending an alert does not wait on an fsync. A power cut can lose the last commits
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbound ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "kind TEXT NOT NULL, "
+            "payload BLOB NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "delivered INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbound_pending ON outbound (delivered, kind, id)")
+
+    def append(self, kind, payload, in_flight=False):
+        """
+        Store an entry and return its id. With `in_flight` the caller delivers the entry itself
+        and must `release` it afterwards; until then the replayer leaves it alone.
+        """
+        with self._lock:
+            cursor = self._conn.execute("INSERT INTO outbound (kind, payload, created_at) VALUES (?, ?, ?)",
+                                        (kind, payload, time.time()))
+            if in_flight:
+                self._in_flight.add(cursor.lastrowid)
+            return cursor.lastrowid
+
+    def release(self, entry_id):
+        with self._lock:
+            self._in_flight.discard(entry_id)
+
+    def pending(self, limit=50):
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT id, kind, payload, attempts FROM outbound WHERE delivered = 0 ORDER BY id LIMIT ?",
+                (limit + len(self._in_flight),)).fetchall()
+            return [entry for entry in entries if entry[0] not in self._in_flight][:limit]
+
+    def has_pending(self, kind, before_id=None):
+        # Entries other callers are delivering right now do not count: they are not waiting for the replayer
+        query = "SELECT id FROM outbound WHERE delivered = 0 AND kind = ?"
+        params = [kind]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id LIMIT ?", params + [len(self._in_flight) + 1])
+            return any(entry_id not in self._in_flight for entry_id, in rows)
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbound WHERE delivered = 0").fetchone()[0]
+
+    def mark_delivered(self, entry_id):
+        with self._lock:
+            self._conn.execute("UPDATE outbound SET delivered = 1 WHERE id = ?", (entry_id,))
+
+    def mark_failed(self, entry_id):
+        with self._lock:
+            self._conn.execute("UPDATE outbound SET attempts = attempts + 1 WHERE id = ?", (entry_id,))
+
+    def compact(self):
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM outbound WHERE delivered = 1").rowcount
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SpoolReplayer:
+    """
+    Delivers pending spool entries from a background thread.
+
+    `deliverers` maps an entry kind to a callable taking the payload and returning True once the
+    entry is delivered. A failure keeps the entry (and every later entry of the same kind) in the
+    spool and backs off before the next attempt. Replay is limited to `max_per_second` entries.
+
+    Only entries of the `droppable_kinds` (telemetry, logs) are given up after `max_attempts`;
+    every other kind, such as the alerts, is retried until it is delivered, however long the
+    outage lasts.
+    """
+
+    def __init__(self, spool, deliverers, max_per_second=None, max_attempts=50, max_backoff=60,
+                 compact_interval=300, droppable_kinds=()):
+        if max_per_second is None:
+            max_per_second = float(os.environ.get("SPOOL_REPLAY_RATE", 5))
+        self.spool = spool
+        self.deliverers = deliverers
+        self.max_per_second = max_per_second
+        self.max_attempts = max_attempts
+        self.droppable_kinds = frozenset(droppable_kinds)
+        self.max_backoff = max_backoff
+        self.compact_interval = compact_interval
+
+        self._backoff = 0
+        self._last_compaction = time.monotonic()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wake(self):
+        self._wake_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self._backoff or 5)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+
+            try:
+                failed = self._replay()
+            except Exception as e:
+                logger.error(f"Error while replaying the spool: {e}")
+                failed = True
+
+            if failed:
+                self._backoff = min(self.max_backoff, max(1, self._backoff * 2))
+            else:
+                self._backoff = 0
+                if time.monotonic() - self._last_compaction > self.compact_interval:
+                    self._last_compaction = time.monotonic()
+                    deleted = self.spool.compact()
+                    if deleted:
+                        logger.info(f"Compacted {deleted} delivered spool entries")
+
+    def _replay(self):
+        failed = False
+        blocked_kinds = set()
+        while not self._stop_event.is_set():
+            entries = self.spool.pending()
+            if not entries:
+                return failed
+
+            progressed = False
+            for entry_id, kind, payload, attempts in entries:
+                if kind in blocked_kinds:
+                    continue
+                deliver = self.deliverers.get(kind)
+                if deliver is None:
+                    logger.error(f"No deliverer for spool entry kind {kind}. Dropping entry {entry_id}")
+                    self.spool.mark_delivered(entry_id)
+                    progressed = True
+                    continue
+
+                start = time.monotonic()
+                try:
+                    delivered = deliver(payload)
+                except Exception as e:
+                    logger.error(f"Replaying spool entry {entry_id} ({kind}) failed: {e}")
+                    delivered = False
+
+                if delivered:
+                    self.spool.mark_delivered(entry_id)
+                    progressed = True
+                elif kind in self.droppable_kinds and attempts + 1 >= self.max_attempts:
+                    logger.error(f"Dropping spool entry {entry_id} ({kind}) after {attempts + 1} attempts")
+                    self.spool.mark_delivered(entry_id)
+                    progressed = True
+                else:
+                    self.spool.mark_failed(entry_id)
+                    blocked_kinds.add(kind)
+                    failed = True
+
+                if self.max_per_second:
+                    delay = 1.0 / self.max_per_second - (time.monotonic() - start)
+                    if delay > 0 and self._stop_event.wait(delay):
+                        return failed
+
+            if not progressed:
+                return failed
@@ -1 +1,4 @@
 from .wifi import *
+from .connectivity import ReachabilityProbe, get_probe
+from .netlink import NetworkMonitor, InterfaceState, get_network_monitor
+from .wpa_ctrl import WpaControl, WpaCtrlError
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import ssl
+import threading
+import time
+from urllib.parse import urlparse
+
+from metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+
+def default_targets():
+    # The endpoints the monitor actually depends on, from its configuration
+    targets = {}
+    if os.environ.get("JXN_API_URL"):
+        targets["api"] = os.environ["JXN_API_URL"]
+    if os.environ.get("AWS_REGION"):
+        targets["kinesis"] = f"https://kinesis.{os.environ['AWS_REGION']}.amazonaws.com"
+    if os.environ.get("SENSOR_URL"):
+        targets["sensor"] = os.environ["SENSOR_URL"]
+    return targets
+
+
+class ReachabilityProbe:
+    """
+    Tracks whether the monitor's dependencies can be reached, so status checks read a cached
+    answer instead of waiting on the network.
+
+    One background thread connects to every target concurrently (TCP, plus the TLS handshake for
+    https), each attempt bounded by `timeout`. While everything is reachable the time between
+    rounds doubles from `min_interval` up to `max_interval`; as soon as a target fails, rounds
+    run every `degraded_interval` until it recovers. Results older than `ttl` count as unknown.
+
+    The network is up (`is_online`) when any target in `upstream` is reachable; the sensor is
+    on the local network and says nothing about the internet.
+    """
+
+    def __init__(self, targets=None, upstream=("api", "kinesis"), timeout=2, min_interval=5, max_interval=60,
+                 degraded_interval=1, ttl=None):
+        self.targets = dict(default_targets() if targets is None else targets)
+        self.upstream = tuple(name for name in upstream if name in self.targets) or tuple(self.targets)
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.degraded_interval = degraded_interval
+        self.ttl = ttl if ttl is not None else 2 * max_interval + timeout
+        self.latency = LatencyStats()
+        self.interval = degraded_interval
+
+        self._results = {}  # name -> (reachable, checked_at, error)
+        self._rounds = 0
+        self._condition = threading.Condition()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._ssl_context = ssl.create_default_context()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="reachability", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def is_reachable(self, name):
+        """
+        True or False from the last probe of `name`, or None while it is unknown or stale.
+        """
+        with self._condition:
+            result = self._results.get(name)
+        if result is None or time.monotonic() - result[1] > self.ttl:
+            return None
+        return result[0]
+
+    def is_online(self, wait=None):
+        """
+        Whether any upstream target is reachable. Never blocks once the first round is done;
+        before that it waits up to `wait` seconds (default: a little over one probe timeout).
+        """
+        if self._rounds == 0:
+            self.wait_for_round(0, self.timeout + 1 if wait is None else wait)
+        return any(self.is_reachable(name) for name in self.upstream)
+
+    def wake(self):
+        # Start the next round now, e.g. when a link changed; does not wait for it
+        self.interval = self.degraded_interval
+        self._wake_event.set()
+
+    def refresh(self, timeout=None):
+        # Probe right away, e.g. after joining a network, and wait for the result
+        with self._condition:
+            rounds = self._rounds
+        self._wake_event.set()
+        self.wait_for_round(rounds, self.timeout + 1 if timeout is None else timeout)
+        return self.is_online(wait=0)
+
+    def wait_for_round(self, after_round, timeout):
+        self.start()
+        with self._condition:
+            return self._condition.wait_for(lambda: self._rounds > after_round, timeout)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._condition:
+            return {name: {"reachable": reachable, "age": round(now - checked_at, 1), "error": error}
+                    for name, (reachable, checked_at, error) in self._results.items()}
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                healthy = self.probe()
+            except Exception as e:
+                logger.error(f"Reachability probe failed: {e}")
+                healthy = False
+            if healthy:
+                self.interval = max(self.min_interval, min(self.interval * 2, self.max_interval))
+            else:
+                self.interval = self.degraded_interval
+            self._wake_event.wait(self.interval)
+            self._wake_event.clear()
+
+    def probe(self):
+        """
+        Run one round over all targets and return whether every one of them was reachable.
+        """
+        results = asyncio.run(self._probe_all()) if self.targets else []
+        now = time.monotonic()
+        with self._condition:
+            for name, reachable, error in results:
+                previous = self._results.get(name)
+                if previous is None or previous[0] != reachable:
+                    if reachable:
+                        logger.info(f"{name} ({self.targets[name]}) is reachable")
+                    else:
+                        logger.info(f"{name} ({self.targets[name]}) is unreachable: {error}")
+                self._results[name] = (reachable, now, error)
+            self._rounds += 1
+            self._condition.notify_all()
+        return all(reachable for _, reachable, _ in results)
+
+    async def _probe_all(self):
+        return await asyncio.gather(*(self._probe(name, url) for name, url in self.targets.items()))
+
+    async def _probe(self, name, url):
+        parsed = urlparse(url)
+        secure = parsed.scheme == "https"
+        port = parsed.port or (443 if secure else 80)
+        start = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(parsed.hostname, port, ssl=self._ssl_context if secure else None),
+                self.timeout)
+        except (OSError, ssl.SSLError, asyncio.TimeoutError) as e:
+            self.latency.record(name, time.monotonic() - start, error=True)
+            return name, False, str(e) or type(e).__name__
+        self.latency.record(name, time.monotonic() - start)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (OSError, ssl.SSLError):
+            pass
+        return name, True, None
+
+
+_probe = None
+_probe_lock = threading.Lock()
+
+
+def get_probe():
+    """
+    The process wide probe over `default_targets()`, started on first use.
+    """
+    global _probe
+    with _probe_lock:
+        if _probe is None:
+            _probe = ReachabilityProbe()
+            _probe.start()
+        return _probe
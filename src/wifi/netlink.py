@@ -0,0 +1,406 @@
+import errno
+import logging
+import select
+import socket
+import struct
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+# linux/netlink.h and linux/rtnetlink.h
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTM_NEWLINK, RTM_DELLINK, RTM_GETLINK = 16, 17, 18
+RTM_NEWADDR, RTM_DELADDR, RTM_GETADDR = 20, 21, 22
+RTM_NEWROUTE, RTM_DELROUTE, RTM_GETROUTE = 24, 25, 26
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+IFLA_IFNAME, IFLA_OPERSTATE, IFLA_CARRIER = 3, 16, 33
+IFA_ADDRESS, IFA_LOCAL, IFA_LABEL = 1, 2, 3
+RTA_DST, RTA_OIF, RTA_GATEWAY, RTA_TABLE = 1, 4, 5, 15
+IFF_UP = 0x1
+IFF_LOWER_UP = 0x10000
+RT_TABLE_MAIN = 254
+RT_SCOPE_UNIVERSE = 0
+
+NLMSGHDR = struct.Struct("=IHHII")
+IFINFOMSG = struct.Struct("=BxHiII")
+IFADDRMSG = struct.Struct("=BBBBI")
+RTMSG = struct.Struct("=BBBBBBBBI")
+RTATTR = struct.Struct("=HH")
+
+OPERSTATES = ("unknown", "notpresent", "down", "lowerlayerdown", "testing", "dormant", "up")
+
+LinkEvent = namedtuple("LinkEvent", ["action", "index", "name", "up", "carrier", "operstate"])
+AddressEvent = namedtuple("AddressEvent", ["action", "index", "family", "address", "prefix_len", "scope"])
+RouteEvent = namedtuple("RouteEvent", ["action", "family", "dst", "dst_len", "gateway", "oif", "table"])
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def parse_attributes(data, offset=0):
+    attributes = {}
+    while offset + RTATTR.size <= len(data):
+        length, attr_type = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attributes[attr_type & 0x3fff] = data[offset + RTATTR.size:offset + length]
+        offset += _align(length)
+    return attributes
+
+
+def _address(family, value):
+    if value is None:
+        return None
+    return socket.inet_ntop(family, value)
+
+
+def parse_messages(data):
+    """
+    Decode the link, address and route messages in one netlink datagram into `LinkEvent`,
+    `AddressEvent` and `RouteEvent` tuples, in order. Other message types are skipped; the end of
+    a dump is reported as the string "done".
+    """
+    events = []
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, msg_type, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        body = data[offset + NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+        if msg_type == NLMSG_DONE:
+            events.append("done")
+        elif msg_type == NLMSG_ERROR:
+            code = struct.unpack_from("=i", body)[0] if len(body) >= 4 else 0
+            if code:
+                raise OSError(-code, f"netlink error: {errno.errorcode.get(-code, -code)}")
+        elif msg_type in (RTM_NEWLINK, RTM_DELLINK):
+            _, index, flags, _ = IFINFOMSG.unpack_from(body)[1:]
+            attributes = parse_attributes(body, IFINFOMSG.size)
+            name = attributes.get(IFLA_IFNAME, b"").split(b"\0", 1)[0].decode("utf-8", "replace")
+            carrier = bool(flags & IFF_LOWER_UP)
+            if IFLA_CARRIER in attributes:
+                carrier = bool(attributes[IFLA_CARRIER][0])
+            operstate = "unknown"
+            if IFLA_OPERSTATE in attributes and attributes[IFLA_OPERSTATE][0] < len(OPERSTATES):
+                operstate = OPERSTATES[attributes[IFLA_OPERSTATE][0]]
+            action = "new" if msg_type == RTM_NEWLINK else "del"
+            events.append(LinkEvent(action, index, name, bool(flags & IFF_UP), carrier, operstate))
+        elif msg_type in (RTM_NEWADDR, RTM_DELADDR):
+            family, prefix_len, _, scope, index = IFADDRMSG.unpack_from(body)
+            attributes = parse_attributes(body, IFADDRMSG.size)
+            # IFA_LOCAL is the interface's own address on point-to-point links, IFA_ADDRESS the peer
+            address = _address(family, attributes.get(IFA_LOCAL, attributes.get(IFA_ADDRESS)))
+            action = "new" if msg_type == RTM_NEWADDR else "del"
+            events.append(AddressEvent(action, index, family, address, prefix_len, scope))
+        elif msg_type in (RTM_NEWROUTE, RTM_DELROUTE):
+            family, dst_len, _, _, table, _, _, _, _ = RTMSG.unpack_from(body)
+            attributes = parse_attributes(body, RTMSG.size)
+            if RTA_TABLE in attributes:
+                table = struct.unpack("=I", attributes[RTA_TABLE][:4])[0]
+            oif = struct.unpack("=i", attributes[RTA_OIF][:4])[0] if RTA_OIF in attributes else None
+            action = "new" if msg_type == RTM_NEWROUTE else "del"
+            events.append(RouteEvent(action, family, _address(family, attributes.get(RTA_DST)), dst_len,
+                                     _address(family, attributes.get(RTA_GATEWAY)), oif, table))
+    return events
+
+
+class InterfaceState(namedtuple("InterfaceState", ["name", "index", "up", "carrier", "addresses",
+                                                   "default_route"])):
+    __slots__ = ()
+
+    @property
+    def connected(self):
+        # Associated and configured: the link has carrier and a routable address
+        return self.up and self.carrier and bool(self.addresses)
+
+
+class NetworkMonitor:
+    """
+    Follows the state of a few network interfaces through rtnetlink: link, address and default
+    route changes arrive as kernel notifications, so changes are seen within milliseconds and
+    the thread sleeps in `select` while nothing happens.
+
+    Subscribers are called with an `InterfaceState` whenever the state of a watched interface
+    changes, on the monitor's thread; they must return quickly. The state is resynchronised with
+    a full dump at start and whenever the kernel reports that notifications were lost.
+
+    If the socket fails, or a resync does, the socket is reopened and the state dumped again,
+    retrying with backoff. Until that works `state` returns None, so callers fall back to polling;
+    changes that happened meanwhile are published once the state is back.
+    """
+
+    def __init__(self, interfaces=("wlan0", "wlan1")):
+        self.interfaces = tuple(interfaces)
+        self.stats = {"messages": 0, "changes": 0, "resyncs": 0}
+
+        self._links = {}  # index -> LinkEvent, for every interface
+        self._addresses = {}  # index -> set of routable addresses
+        self._default_routes = set()  # (family, oif)
+        self._states = {}
+        self._subscribers = []
+        self._condition = threading.Condition()
+        self._unavailable = False
+        self._sock = None
+        self._wake_r, self._wake_w = None, None
+        self._thread = None
+        self.retry_delay = 1
+        self.max_retry_delay = 30
+
+    @staticmethod
+    def available():
+        return hasattr(socket, "AF_NETLINK")
+
+    def subscribe(self, callback):
+        with self._condition:
+            self._subscribers.append(callback)
+
+    def state(self, name):
+        with self._condition:
+            return None if self._unavailable else self._states.get(name)
+
+    def wait_for(self, name, predicate, timeout):
+        """
+        Block until the state of `name` satisfies `predicate`, or `timeout` seconds pass.
+        Returns the last state either way.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._unavailable or (self._states.get(name) is not None and predicate(self._states[name])),
+                timeout)
+            return self.state(name)
+
+    def wait_for_change(self, name, timeout):
+        # Block until the state of `name` changes, or `timeout` seconds pass
+        with self._condition:
+            current = self.state(name)
+            self._condition.wait_for(lambda: self.state(name) != current, timeout)
+            return self.state(name)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        try:
+            self._open()
+            self._wake_r, self._wake_w = socket.socketpair()
+            self._resync()
+        except OSError:
+            self._close()
+            raise
+        self._thread = threading.Thread(target=self._run, name="netlink", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._wake_w.send(b"x")
+        self._thread.join()
+        self._thread = None
+        self._close()
+
+    def _close(self):
+        for sock in (self._sock, self._wake_r, self._wake_w):
+            if sock is not None:
+                sock.close()
+        self._sock = None
+        self._wake_r, self._wake_w = None, None
+
+    def _open(self):
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        # A dump that never completes fails the resync instead of blocking the thread for good
+        self._sock.settimeout(5)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self._sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_IFADDR
+                         | RTMGRP_IPV6_ROUTE))
+
+    def _run(self):
+        while True:
+            readable, _, _ = select.select([self._sock, self._wake_r], [], [])
+            if self._wake_r in readable:
+                return
+            try:
+                data = self._sock.recv(1 << 16)
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    logger.info("Netlink notifications were lost. Resynchronising")
+                else:
+                    logger.error(f"Netlink socket failed: {e}. Reopening it")
+                if not self._recover(reopen=e.errno != errno.ENOBUFS):
+                    return
+                continue
+            try:
+                self.apply(parse_messages(data))
+            except Exception as e:
+                logger.error(f"Could not handle netlink message: {e}")
+
+    def _recover(self, reopen):
+        # Returns False if the monitor was stopped before the state could be resynchronised
+        delay = self.retry_delay
+        while True:
+            try:
+                if reopen:
+                    self._reopen()
+                self._resync()
+            except OSError as e:
+                if not reopen:
+                    logger.error(f"Could not resynchronise the network state: {e}. Reopening the socket")
+                    reopen = True
+                    continue
+                logger.error(f"Could not resynchronise the network state: {e}. Retrying in {delay}s")
+                self._set_unavailable(True)
+                readable, _, _ = select.select([self._wake_r], [], [], delay)
+                if readable:
+                    return False
+                delay = min(delay * 2, self.max_retry_delay)
+            else:
+                self._set_unavailable(False)
+                return True
+
+    def _reopen(self):
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+        self._open()
+
+    def _set_unavailable(self, unavailable):
+        with self._condition:
+            if self._unavailable == unavailable:
+                return
+            self._unavailable = unavailable
+            self._condition.notify_all()
+        if unavailable:
+            logger.error("Network state unavailable until netlink recovers")
+        else:
+            logger.info("Network state resynchronised")
+
+    def _resync(self):
+        # The dumps are read into fresh maps and swapped in together, so subscribers see one change
+        # against the state before the resync rather than the partial state of each dump
+        self.stats["resyncs"] += 1
+        links, addresses, default_routes = {}, {}, set()
+        for msg_type, header in ((RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)),
+                                 (RTM_GETADDR, IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)),
+                                 (RTM_GETROUTE, RTMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0, 0, 0, 0, 0))):
+            self._sock.send(NLMSGHDR.pack(NLMSGHDR.size + len(header), msg_type, NLM_F_REQUEST | NLM_F_DUMP,
+                                          msg_type, 0) + header)
+            # Only one dump can be in flight; notifications that arrive meanwhile are applied too
+            while True:
+                events = parse_messages(self._sock.recv(1 << 16))
+                self._update(links, addresses, default_routes, [event for event in events if event != "done"])
+                if "done" in events:
+                    break
+        with self._condition:
+            self._links, self._addresses, self._default_routes = links, addresses, default_routes
+            changed, subscribers = self._refresh_states()
+        self._publish(changed, subscribers)
+
+    def apply(self, events):
+        """
+        Update the state from parsed netlink events and notify subscribers of every watched
+        interface whose state changed.
+        """
+        with self._condition:
+            self._update(self._links, self._addresses, self._default_routes, events)
+            changed, subscribers = self._refresh_states()
+        self._publish(changed, subscribers)
+
+    def _update(self, links, addresses, default_routes, events):
+        for event in events:
+            self.stats["messages"] += 1
+            if isinstance(event, LinkEvent):
+                if event.action == "new":
+                    links[event.index] = event
+                else:
+                    links.pop(event.index, None)
+                    addresses.pop(event.index, None)
+            elif isinstance(event, AddressEvent):
+                if event.scope != RT_SCOPE_UNIVERSE:
+                    continue  # link-local addresses exist without any network
+                interface_addresses = addresses.setdefault(event.index, set())
+                if event.action == "new":
+                    interface_addresses.add(event.address)
+                else:
+                    interface_addresses.discard(event.address)
+            elif isinstance(event, RouteEvent):
+                if event.dst_len != 0 or event.table != RT_TABLE_MAIN or event.oif is None:
+                    continue  # only default routes matter here
+                if event.action == "new":
+                    default_routes.add((event.family, event.oif))
+                else:
+                    default_routes.discard((event.family, event.oif))
+
+    def _refresh_states(self):
+        # Called with the condition held. Returns the states that changed and the subscribers to tell
+        changed = []
+        for name in self.interfaces:
+            state = self._build_state(name)
+            if state != self._states.get(name):
+                self._states[name] = state
+                changed.append(state)
+        if changed:
+            self.stats["changes"] += len(changed)
+            self._condition.notify_all()
+        return changed, list(self._subscribers)
+
+    def _publish(self, changed, subscribers):
+        for state in changed:
+            logger.info(f"{state.name}: {'connected' if state.connected else 'disconnected'} "
+                        f"(up={state.up}, carrier={state.carrier}, addresses={sorted(state.addresses)}, "
+                        f"default_route={state.default_route})")
+            for callback in subscribers:
+                try:
+                    callback(state)
+                except Exception as e:
+                    logger.error(f"Network state subscriber failed: {e}")
+
+    def _build_state(self, name):
+        link = next((link for link in self._links.values() if link.name == name), None)
+        if link is None:
+            return InterfaceState(name, None, False, False, frozenset(), False)
+        return InterfaceState(name, link.index, link.up, link.carrier,
+                              frozenset(self._addresses.get(link.index, ())),
+                              any(oif == link.index for _, oif in self._default_routes))
+
+
+_monitor = None
+_monitor_failed = False
+_monitor_lock = threading.Lock()
+
+
+def get_network_monitor():
+    """
+    The process wide monitor of wlan0 and wlan1, started on first use; None where rtnetlink is
+    not available or the monitor could not be started. A failed start is not retried.
+    """
+    global _monitor, _monitor_failed
+    with _monitor_lock:
+        if _monitor is None and not _monitor_failed and NetworkMonitor.available():
+            monitor = NetworkMonitor()
+            try:
+                monitor.start()
+            except OSError as e:
+                logger.error(f"Cannot follow the network state: {e}. Polling instead")
+                _monitor_failed = True
+                return None
+            _monitor = monitor
+        return _monitor
@@ -1,7 +1,12 @@
 import logging
+import os
 import subprocess
 import time
 
+from .connectivity import get_probe
+from .netlink import get_network_monitor
+from .wpa_ctrl import WpaControl, WpaCtrlError
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 logHandler = logging.StreamHandler()
@@ -12,22 +17,60 @@ filelogHandler.setFormatter(formatter)
 logger.addHandler(filelogHandler)
 logger.addHandler(logHandler)
 
-def restart_wireless_interface(wireless_interface):
+WIFI_CONNECT_TIMEOUT = int(os.environ.get("WIFI_CONNECT_TIMEOUT", 60))
+
+
+def wait_for_link(wireless_interface, predicate, timeout):
+    # The interface state once `predicate` holds; None without netlink or for an unknown interface
+    network_monitor = get_network_monitor()
+    if network_monitor is None or network_monitor.state(wireless_interface) is None:
+        return None
+    return network_monitor.wait_for(wireless_interface, predicate, timeout)
+
+
+def restart_wireless_interface(wireless_interface, timeout=10):
     subprocess.run(["sudo", "systemctl", "restart", f"wpa_supplicant@{wireless_interface}"])
-    time.sleep(2)
 
-    # Disable the wireless interface
-    subprocess.run(["sudo", "wpa_cli", "-i", wireless_interface, "reconfigure"])
-    time.sleep(2)
+    # Carry on as soon as the new wpa_supplicant answers on its control socket
+    with WpaControl(wireless_interface) as wpa:
+        try:
+            if wpa.wait_ready(timeout):
+                wpa.command("RECONFIGURE")
+            else:
+                logger.error(f"wpa_supplicant on {wireless_interface} did not come up within {timeout}s")
+        except (OSError, WpaCtrlError) as e:
+            logger.error(f"Could not reconfigure {wireless_interface}: {e}")
 
     subprocess.run(["sudo", "ifconfig", "-i", wireless_interface, "reconfigure"])
-    time.sleep(2)
 
     enable_wireless_interface("wlan0")
-    time.sleep(2)
-
     enable_wireless_interface("wlan1")
-    time.sleep(2)
+
+
+def reconnect_wireless_interface(wireless_interface, timeout=30):
+    """
+    Ask wpa_supplicant to reassociate and wait until netlink shows the interface connected
+    again; restarts the interface if that does not happen within `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    with WpaControl(wireless_interface) as wpa:
+        try:
+            wpa.attach()
+            wpa.command("RECONNECT")
+            associated = wpa.wait_connected(timeout=timeout)
+        except (OSError, WpaCtrlError) as e:
+            logger.error(f"Could not reconnect {wireless_interface}: {e}")
+            associated = False
+    if associated:
+        state = wait_for_link(wireless_interface, lambda state: state.connected,
+                              max(0, deadline - time.monotonic()))
+        if state is not None and state.connected:
+            return True
+    logger.info(f"{wireless_interface} did not reconnect. Restarting it")
+    restart_wireless_interface(wireless_interface)
+    network_monitor = get_network_monitor()
+    state = network_monitor.state(wireless_interface) if network_monitor is not None else None
+    return state is not None and state.connected
 
 
 def enable_wireless_interface(wireless_interface):
@@ -35,9 +78,7 @@ def enable_wireless_interface(wireless_interface):
     subprocess.run(["sudo", "ifconfig", wireless_interface, "up"])
 
 
-def connect_to_wifi_network(network_ssid, network_password, wireless_interface):
-    # Generate the configuration file
-    logger.info("initializing sensor wifi connection")
+def write_wpa_supplicant_config(network_ssid, network_password, wireless_interface):
     config_text = \
         f"""
 ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev
@@ -54,51 +95,67 @@ network={{
     with open(f"/etc/wpa_supplicant/wpa_supplicant-{wireless_interface}.conf", "w") as f:
         f.write(config_text)
 
-    # Restart the wireless interface
-    restart_wireless_interface(wireless_interface)
 
-    # Wait until the connection is established
-    while True:
-        status = subprocess.check_output(["sudo", "wpa_cli", "-i", wireless_interface, "status"]).decode("utf-8")
-        status_dict = dict(line.split("=") for line in status.splitlines() if "=" in line)
-        if status_dict.get("ssid") == network_ssid:
-            logger.info("Successfully connected to WiFi network")
-            break
-        time.sleep(1)
+def connect_to_wifi_network(network_ssid, network_password, wireless_interface, timeout=None):
+    """
+    Replace the configured network with `network_ssid` and wait until the interface is associated
+    and has an address, at most `timeout` seconds (WIFI_CONNECT_TIMEOUT). Returns whether it is.
+
+    A running wpa_supplicant is reconfigured over its control socket; otherwise the configuration
+    file is written and the service restarted.
+    """
+    logger.info("initializing sensor wifi connection")
+    timeout = WIFI_CONNECT_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    with WpaControl(wireless_interface) as wpa:
+        try:
+            if wpa.wait_ready(0):
+                # Attach first so the connected event cannot be missed
+                wpa.attach()
+                for network in wpa.list_networks():
+                    wpa.remove_network(network["id"])
+                wpa.add_network(network_ssid, network_password)
+                if not wpa.save_config():
+                    write_wpa_supplicant_config(network_ssid, network_password, wireless_interface)
+            else:
+                write_wpa_supplicant_config(network_ssid, network_password, wireless_interface)
+                restart_wireless_interface(wireless_interface)
+                wpa.wait_ready(max(0, deadline - time.monotonic()))
+            connected = wpa.wait_connected(network_ssid, max(0, deadline - time.monotonic()))
+        except (OSError, WpaCtrlError) as e:
+            logger.error(f"Could not configure {wireless_interface}: {e}")
+            connected = False
+    if not connected:
+        logger.error(f"Could not connect to WiFi network {network_ssid}")
+        return False
+    logger.info("Successfully connected to WiFi network")
+
+    # Usable once DHCP has handed out an address
+    wait_for_link(wireless_interface, lambda state: state.connected, max(0, deadline - time.monotonic()))
+    return True
 
 
 def disconnect_from_wifi_network(wireless_interface):
-    # Get the current network id for wlan1
     logger.info("Running disconnecting wifi")
-
-    cmd = ["sudo", "wpa_cli", "-i", wireless_interface, "list_networks"]
-    output = subprocess.check_output(cmd, universal_newlines=True)
-    logger.info("Disconnecting wlan1 output: ", output)
-    network_id = None
-    for line in output.splitlines()[1:]:
-        fields = line.split()
-        if len(fields) >= 3 and fields[2] == "CURRENT":
-            network_id = fields[0]
-            break
-
-    # If a network is currently connected, disconnect from it
-    logger.info("disconnecting wlan1 network connection")
-    if network_id is not None:
-        subprocess.Popen(["sudo", "wpa_cli", "-i", wireless_interface, "disable_network", network_id])
-        subprocess.Popen(["sudo", "wpa_cli", "-i", wireless_interface, "remove_network", network_id])
-        subprocess.Popen(["sudo", "wpa_cli", "-i", wireless_interface, "save_config"])
-
-
-def check_internet_connection():
-    try:
-        # Run the ping command to Google DNS (8.8.8.8) with a single packet and 1-second timeout
-        subprocess.run(["ping", "-c", "3", "-W", "1", "8.8.8.8"], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                       check=True)
-        # If the ping command returns with no errors, the internet connection is valid
-        return True
-    except subprocess.CalledProcessError:
-        # If an error occurs (e.g., timeout or unreachable host), the internet connection is not valid
+    with WpaControl(wireless_interface) as wpa:
+        try:
+            current = [network["id"] for network in wpa.list_networks() if "[CURRENT]" in network["flags"]]
+            # If a network is currently connected, disconnect from it
+            logger.info(f"disconnecting {wireless_interface} network connection")
+            for network_id in current:
+                wpa.command(f"DISABLE_NETWORK {network_id}")
+                wpa.remove_network(network_id)
+            if current:
+                wpa.save_config()
+        except (OSError, WpaCtrlError) as e:
+            logger.error(f"Could not disconnect {wireless_interface}: {e}")
+
+
+def check_internet_connection(refresh=False):
+    # Reads the cached state of the background reachability probe of the API and Kinesis endpoints,
+    # instead of pinging 8.8.8.8. `refresh` probes right away and waits, e.g. after joining a network
+    probe = get_probe()
+    connected = probe.refresh() if refresh else probe.is_online()
+    if not connected:
         logger.info("connection status: invalid")
-        return False
-
-
+    return connected
@@ -0,0 +1,216 @@
+import itertools
+import logging
+import os
+import socket
+import tempfile
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+logHandler = logging.StreamHandler()
+filelogHandler = logging.FileHandler("logs.log")
+formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logHandler.setFormatter(formatter)
+filelogHandler.setFormatter(formatter)
+logger.addHandler(filelogHandler)
+logger.addHandler(logHandler)
+
+WPA_CTRL_DIR = os.environ.get("WPA_CTRL_DIR", "/var/run/wpa_supplicant")
+
+CONNECTED = "CTRL-EVENT-CONNECTED"
+DISCONNECTED = "CTRL-EVENT-DISCONNECTED"
+SSID_TEMP_DISABLED = "CTRL-EVENT-SSID-TEMP-DISABLED"  # e.g. a wrong passphrase
+NETWORK_NOT_FOUND = "CTRL-EVENT-NETWORK-NOT-FOUND"
+
+_counter = itertools.count()
+
+
+class WpaCtrlError(Exception):
+    pass
+
+
+class WpaControl:
+    """
+    Client for the UNIX control socket of the wpa_supplicant running on `interface`, the socket
+    `wpa_cli` talks to. `request` sends a command and returns the reply. After `attach`,
+    wpa_supplicant also sends unsolicited events ("<3>CTRL-EVENT-CONNECTED ..."); the ones that
+    arrive while waiting for a reply are kept for `wait_event`.
+
+    Every wait has a deadline. Use it as a context manager, or call `close`, to remove the
+    client's socket file.
+    """
+
+    def __init__(self, interface, ctrl_dir=None, timeout=5):
+        self.interface = interface
+        self.path = os.path.join(ctrl_dir or WPA_CTRL_DIR, interface)
+        self.timeout = timeout
+        self.attached = False
+        self._sock = None
+        self._local_path = None
+        self._events = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        if self._sock is not None:
+            return
+        self._local_path = os.path.join(tempfile.gettempdir(), f"wpa_ctrl_{os.getpid()}-{next(_counter)}")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind(self._local_path)
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            self._unlink()
+            raise
+        self._sock = sock
+
+    def close(self):
+        if self._sock is None:
+            return
+        if self.attached:
+            try:
+                self.request("DETACH", timeout=1)
+            except (OSError, WpaCtrlError):
+                pass
+            self.attached = False
+        self._sock.close()
+        self._sock = None
+        self._unlink()
+
+    def wait_ready(self, timeout):
+        """
+        Wait until wpa_supplicant answers on its control socket, e.g. after a restart.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.open()
+                if self.request("PING", timeout=max(0.1, min(1, deadline - time.monotonic()))) == "PONG":
+                    return True
+            except (OSError, WpaCtrlError):
+                self.close()
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+
+    def request(self, command, timeout=None):
+        self.open()
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        self._sock.send(command.encode("utf-8"))
+        while True:
+            message = self._receive(deadline)
+            if message is None:
+                raise WpaCtrlError(f"No reply to {command.split(' ', 1)[0]} from {self.path}")
+            if message.startswith("<"):
+                self._events.append(message)
+                continue
+            return message.rstrip("\n")
+
+    def command(self, command, timeout=None):
+        # For commands that answer OK or FAIL
+        reply = self.request(command, timeout)
+        if reply != "OK":
+            raise WpaCtrlError(f"{command.split(' ', 1)[0]} failed: {reply}")
+
+    def attach(self):
+        if not self.attached:
+            self.command("ATTACH")
+            self.attached = True
+
+    def wait_event(self, prefixes, timeout):
+        """
+        Return the first event (without its "<level>" prefix) starting with one of `prefixes`,
+        or None after `timeout` seconds. Other events are dropped.
+        """
+        if isinstance(prefixes, str):
+            prefixes = (prefixes,)
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._events:
+                message = self._events.popleft()
+            else:
+                message = self._receive(deadline)
+                if message is None:
+                    return None
+            event = message.split(">", 1)[1] if message.startswith("<") else message
+            if event.startswith(tuple(prefixes)):
+                return event
+
+    def status(self):
+        reply = self.request("STATUS")
+        return dict(line.split("=", 1) for line in reply.splitlines() if "=" in line)
+
+    def list_networks(self):
+        # network id / ssid / bssid / flags, tab separated under a header line
+        networks = []
+        for line in self.request("LIST_NETWORKS").splitlines()[1:]:
+            fields = line.split("\t")
+            if len(fields) >= 4:
+                networks.append({"id": fields[0], "ssid": fields[1], "bssid": fields[2], "flags": fields[3]})
+        return networks
+
+    def add_network(self, ssid, psk):
+        """
+        Add and select a WPA-PSK network; the other networks are disabled by the selection.
+        Returns the new network id.
+        """
+        network_id = self.request("ADD_NETWORK")
+        if not network_id.isdigit():
+            raise WpaCtrlError(f"ADD_NETWORK failed: {network_id}")
+        # The SSID goes in as hex so quotes and other special characters need no escaping
+        self.command(f"SET_NETWORK {network_id} ssid {ssid.encode('utf-8').hex()}")
+        self.command(f'SET_NETWORK {network_id} psk "{psk}"')
+        self.command(f"SELECT_NETWORK {network_id}")
+        return network_id
+
+    def remove_network(self, network_id):
+        self.command(f"REMOVE_NETWORK {network_id}")
+
+    def save_config(self):
+        # Fails unless the configuration file has update_config=1
+        try:
+            self.command("SAVE_CONFIG")
+            return True
+        except WpaCtrlError as e:
+            logger.error(f"Could not save the wpa_supplicant configuration: {e}")
+            return False
+
+    def wait_connected(self, ssid=None, timeout=30):
+        """
+        Wait until the interface is associated (to `ssid`, if given). Returns False at the
+        deadline, or early when wpa_supplicant gives up on the network (e.g. a wrong passphrase).
+        """
+        self.attach()
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.status()
+            if status.get("wpa_state") == "COMPLETED" and (ssid is None or status.get("ssid") == ssid):
+                return True
+            event = self.wait_event((CONNECTED, SSID_TEMP_DISABLED), deadline - time.monotonic())
+            if event is None:
+                return False
+            if event.startswith(SSID_TEMP_DISABLED) and (ssid is None or f'ssid="{ssid}"' in event):
+                logger.error(f"wpa_supplicant disabled the network: {event}")
+                return False
+
+    def _receive(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        self._sock.settimeout(remaining)
+        try:
+            return self._sock.recv(4096).decode("utf-8", "replace")
+        except socket.timeout:
+            return None
+
+    def _unlink(self):
+        try:
+            os.unlink(self._local_path)
+        except (OSError, TypeError):
+            pass
@@ -0,0 +1,124 @@
+import threading
+import time
+from unittest import TestCase
+
+from dispatch.dispatcher import BACKGROUND, CRITICAL, PriorityDispatcher, STATE, TELEMETRY
+
+
+class TestPriorityDispatcher(TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.ran = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.release.set()
+
+    def blocking(self, name):
+        self.release.wait(5)
+        self.record(name)
+
+    def record(self, name):
+        with self.lock:
+            self.ran.append(name)
+
+    def wait_for(self, predicate):
+        deadline = time.monotonic() + 5
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_critical_work_does_not_wait_behind_other_lanes(self):
+        dispatcher = PriorityDispatcher()
+        dispatcher.start()
+        for lane in (STATE, TELEMETRY, BACKGROUND):
+            dispatcher.submit(lane, self.blocking, lane)
+        self.assertTrue(dispatcher.submit(CRITICAL, self.record, "bedExit"))
+
+        self.wait_for(lambda: self.ran)
+        self.assertEqual(self.ran, ["bedExit"])
+        self.release.set()
+        dispatcher.join()
+        self.assertEqual(sorted(self.ran), sorted(["bedExit", STATE, TELEMETRY, BACKGROUND]))
+        dispatcher.stop()
+
+    def test_workers_per_lane(self):
+        dispatcher = PriorityDispatcher(lanes={CRITICAL: 2, STATE: 1})
+        dispatcher.start()
+        started = []
+
+        def job(name):
+            started.append(name)
+            self.blocking(name)
+
+        for name in ("c1", "c2"):
+            dispatcher.submit(CRITICAL, job, name)
+        for name in ("s1", "s2"):
+            dispatcher.submit(STATE, job, name)
+
+        self.wait_for(lambda: len(started) == 3)
+        time.sleep(0.05)
+        # Both critical workers are busy; the second state job waits for the only state worker
+        self.assertEqual(sorted(started), ["c1", "c2", "s1"])
+        self.assertEqual(dispatcher.queue_depths(), {CRITICAL: 0, STATE: 1})
+
+        self.release.set()
+        dispatcher.join()
+        self.assertEqual(sorted(self.ran), ["c1", "c2", "s1", "s2"])
+        dispatcher.stop()
+
+    def test_ordered_work_of_one_key_runs_in_order(self):
+        dispatcher = PriorityDispatcher(lanes={CRITICAL: 2})
+        dispatcher.start()
+        started = []
+
+        def job(name, wait):
+            started.append(name)
+            if wait:
+                self.blocking(name)
+            else:
+                self.record(name)
+
+        # The exit of bed A is stuck; its turn timer waits behind it, bed B does not
+        dispatcher.submit_ordered(CRITICAL, "bed-a", job, "a:bedExit", True)
+        dispatcher.submit_ordered(CRITICAL, "bed-a", job, "a:turnTimerExpire", False)
+        other = next(key for key in ("bed-b", "bed-c", "bed-d", "bed-e") if hash(key) % 2 != hash("bed-a") % 2)
+        dispatcher.submit_ordered(CRITICAL, other, job, "b:bedExit", False)
+
+        self.wait_for(lambda: "b:bedExit" in self.ran)
+        time.sleep(0.05)
+        self.assertEqual(sorted(started), ["a:bedExit", "b:bedExit"])
+
+        self.release.set()
+        dispatcher.join()
+        self.assertEqual(self.ran, ["b:bedExit", "a:bedExit", "a:turnTimerExpire"])
+        dispatcher.stop()
+
+    def test_full_lane_rejects_work(self):
+        dispatcher = PriorityDispatcher(lanes={TELEMETRY: 1}, max_queue=1)
+        self.assertTrue(dispatcher.submit(TELEMETRY, self.record, "first"))
+        self.assertFalse(dispatcher.submit(TELEMETRY, self.record, "second"))
+
+        dispatcher.start()
+        dispatcher.join()
+        self.assertEqual(self.ran, ["first"])
+        self.assertTrue(dispatcher.submit(TELEMETRY, self.record, "third"))
+        dispatcher.join()
+        self.assertEqual(self.ran, ["first", "third"])
+        dispatcher.stop()
+
+    def test_join_waits_for_running_work_and_errors_are_contained(self):
+        dispatcher = PriorityDispatcher(lanes={STATE: 1})
+        dispatcher.start()
+        dispatcher.submit(STATE, lambda: 1 / 0)
+        dispatcher.submit(STATE, self.blocking, "slow")
+        threading.Timer(0.1, self.release.set).start()
+
+        start = time.monotonic()
+        dispatcher.join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(self.ran, ["slow"])
+        stats = dispatcher.metrics()["run_time"][STATE]
+        self.assertEqual((stats["count"], stats["errors"]), (2, 1))
+        dispatcher.stop()
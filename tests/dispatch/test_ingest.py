@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from unittest import TestCase
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+
+from dispatch.ingest import EventQueue
+from sensor.events import AttendedEvent, BodyEvent, NewFrameEvent, parse_event
+
+
+def newframe(frame_id):
+    return NewFrameEvent(frame_id, time.monotonic())
+
+
+def body(present):
+    return BodyEvent(present, time.monotonic())
+
+
+class TestEventQueue(TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.release = threading.Event()
+
+    def blocking_handler(self, event):
+        self.release.wait(5)
+        self.handled.append(event)
+
+    def wait_until_idle(self, event_queue):
+        deadline = time.monotonic() + 5
+        while event_queue.depth() or event_queue.metrics()["handled"] < event_queue.metrics()["queued"]:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_parse_event(self):
+        self.assertEqual(parse_event("body", '{"present": true}', received_at=1.0), BodyEvent(True, 1.0))
+        self.assertEqual(parse_event("attended", '{"ok": false, "countdown": 0}', received_at=1.0),
+                         AttendedEvent(False, 0, 1.0))
+        self.assertIsNone(parse_event("unknown", "{}"))
+
+    def test_overflow_coalesces_but_never_drops_body(self):
+        event_queue = EventQueue({"newframe": self.blocking_handler, "body": self.blocking_handler},
+                                 max_events=3, workers=2)
+        event_queue.start()
+        event_queue.put(newframe(1))  # picked up by a worker and blocks it
+        event_queue.put(body(True))  # blocks the other worker
+        time.sleep(0.05)
+        for frame_id in range(2, 10):
+            event_queue.put(newframe(frame_id))
+        for present in (False, True, False):
+            event_queue.put(body(present))
+
+        stats = event_queue.metrics()
+        self.assertGreater(stats["coalesced"], 0)
+        self.assertEqual(stats["dropped"], 0)
+        self.assertEqual(stats["overflowed"], 3)
+
+        self.release.set()
+        self.wait_until_idle(event_queue)
+        event_queue.stop()
+
+        frames = [event.id for event in self.handled if event.type == "newframe"]
+        bodies = [event.present for event in self.handled if event.type == "body"]
+        self.assertEqual(frames[0], 1)
+        self.assertEqual(frames[-1], 9)  # the newest frame id always survives coalescing
+        self.assertEqual(bodies, [True, False, True, False])
+
+    def test_slow_type_does_not_block_others(self):
+        event_queue = EventQueue({"newframe": self.handled.append, "body": self.blocking_handler}, workers=2)
+        event_queue.start()
+        event_queue.put(body(True))
+        for frame_id in range(5):
+            event_queue.put(newframe(frame_id))
+
+        deadline = time.monotonic() + 5
+        while len(self.handled) < 5:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        self.assertEqual([event.id for event in self.handled], list(range(5)))
+
+        self.release.set()
+        self.wait_until_idle(event_queue)
+        event_queue.stop()
+        self.assertIn("newframe", event_queue.metrics()["queue_lag"])
+
+    def test_shared_queue_keeps_sources_apart(self):
+        event_queue = EventQueue({}, workers=2)
+        handled = {"a": [], "b": []}
+        event_queue.add_handlers({"a:body": self.blocking_handler, "b:body": handled["b"].append})
+        event_queue.start()
+        event_queue.put(body(True), key="a:body")
+        for present in (True, False, True):
+            event_queue.put(body(present), key="b:body")
+        self.assertFalse(event_queue.put(body(True), key="c:body"))
+
+        deadline = time.monotonic() + 5
+        while len(handled["b"]) < 3:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        self.assertEqual([event.present for event in handled["b"]], [True, False, True])
+        self.assertEqual(self.handled, [])  # the other source is still busy
+
+        self.release.set()
+        event_queue.join()
+        event_queue.stop()
+        self.assertEqual(len(self.handled), 1)
+
+    def test_mixed_types_on_one_key_stay_in_wire_order(self):
+        event_queue = EventQueue({"presence": self.blocking_handler}, max_events=3, workers=2)
+        event_queue.start()
+        event_queue.put(body(True), key="presence")  # blocks the key's worker
+        time.sleep(0.05)
+        events = [newframe(1), newframe(2), body(False), newframe(3), newframe(4)]
+        for event in events:
+            event_queue.put(event, key="presence")
+
+        self.release.set()
+        event_queue.join()
+        event_queue.stop()
+        # A newframe only coalesces with the newframe right before it, never across the body event
+        self.assertEqual([(event.type, getattr(event, "id", None)) for event in self.handled],
+                         [("body", None), ("newframe", 1), ("newframe", 2), ("body", None), ("newframe", 4)])
+        self.assertEqual(event_queue.metrics()["coalesced"], 1)
@@ -0,0 +1,68 @@
+import threading
+import time
+from unittest import TestCase
+
+from dispatch.scheduler import Scheduler
+
+
+class TestScheduler(TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.scheduler.start()
+        self.calls = []
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_runs_in_due_order(self):
+        self.scheduler.call_later(0.06, self.calls.append, "c")
+        self.scheduler.call_later(0.02, self.calls.append, "a")
+        self.scheduler.call_later(0.04, self.calls.append, "b")
+        time.sleep(0.15)
+        self.assertEqual(self.calls, ["a", "b", "c"])
+
+    def test_cancel_and_reschedule(self):
+        cancelled = self.scheduler.call_later(0.03, self.calls.append, "cancelled")
+        debounced = self.scheduler.call_later(0.03, self.calls.append, "debounced")
+        cancelled.cancel()
+        time.sleep(0.02)
+        debounced.reschedule(0.05)  # pushes it out instead of adding a second run
+        time.sleep(0.04)
+        self.assertEqual(self.calls, [])
+        time.sleep(0.05)
+        self.assertEqual(self.calls, ["debounced"])
+        self.assertEqual(self.scheduler.pending(), 0)
+
+    def test_periodic(self):
+        job = self.scheduler.call_every(0.02, self.calls.append, "tick")
+        time.sleep(0.11)
+        job.cancel()
+        runs = len(self.calls)
+        self.assertGreaterEqual(runs, 4)
+        time.sleep(0.05)
+        self.assertEqual(len(self.calls), runs)
+
+    def test_periodic_job_skips_while_still_running(self):
+        release = threading.Event()
+
+        def executor(fn):
+            threading.Thread(target=fn).start()
+
+        def slow():
+            self.calls.append("run")
+            release.wait(5)
+
+        job = self.scheduler.call_every(0.01, slow, executor=executor)
+        time.sleep(0.1)
+        release.set()
+        job.cancel()
+        self.assertEqual(self.calls, ["run"])
+        self.assertGreater(self.scheduler.metrics()["skipped"], 0)
+
+    def test_failing_job_does_not_stop_the_scheduler(self):
+        self.scheduler.call_later(0.01, lambda: 1 / 0)
+        self.scheduler.call_later(0.02, self.calls.append, "after")
+        time.sleep(0.06)
+        self.assertEqual(self.calls, ["after"])
+        self.assertEqual(self.scheduler.metrics()["errors"], 1)
@@ -0,0 +1,94 @@
+import json
+import os
+from unittest import TestCase
+
+import numpy as np
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+
+from kinesis.aggregation import FrameAggregator, aggregate_frames, deaggregate, deaggregate_frames, encode_frame, \
+    get_aggregator, is_aggregated
+from kinesis.partitioning import StaticPartitioner
+from sensor.sensor_utils import format_sensor_matrices
+
+
+class TestAggregation(TestCase):
+
+    def setUp(self):
+        self.header = {"id": "upload", "time": "2024-01-01 00:00:00.000000", "patient_present": False,
+                       "frames_per_hour": 3600, "encoding": "json"}
+        self.matrices = [[[i, i + 1], [i + 2, i + 3]] for i in range(300)]
+
+    def test_round_trip(self):
+        records = aggregate_frames(self.header, [encode_frame(m) for m in self.matrices])
+        self.assertEqual(len(records), 1)
+        self.assertTrue(is_aggregated(records[0]))
+
+        frames = deaggregate_frames(records[0])
+        self.assertEqual(len(frames), 300)
+        self.assertEqual(frames[7], {"id": "upload", "time": "2024-01-01 00:00:00.000000", "patient_present": False,
+                                     "frames_per_hour": 3600, "frame": 7, "readings": self.matrices[7]})
+
+    def test_split_respects_record_limit(self):
+        bodies = [encode_frame(m) for m in self.matrices]
+        records = aggregate_frames(self.header, bodies, max_record_bytes=1000)
+        self.assertGreater(len(records), 1)
+
+        frames = []
+        for record in records:
+            self.assertLessEqual(len(record), 1000)
+            frames.extend(deaggregate_frames(record))
+        self.assertEqual([frame["frame"] for frame in frames], list(range(300)))
+        self.assertEqual([frame["readings"] for frame in frames], self.matrices)
+
+    def test_shared_header_is_stored_once(self):
+        record = aggregate_frames(self.header, [encode_frame(m) for m in self.matrices])[0]
+        header, bodies = deaggregate(record)
+        self.assertEqual(header["first_frame"], 0)
+        self.assertEqual(json.loads(bodies[0]), self.matrices[0])
+        self.assertEqual(record.count(b"patient_present"), 1)
+
+    def test_oversized_frame_raises(self):
+        with self.assertRaises(ValueError):
+            aggregate_frames(self.header, [b"x" * 2000], max_record_bytes=1000)
+
+    def test_no_frames(self):
+        self.assertEqual(aggregate_frames(self.header, []), [])
+
+
+class TestFormatSensorMatrices(TestCase):
+
+    def setUp(self):
+        self.matrices = [np.full((4, 3), i) for i in range(50)]
+        self.partitioner = StaticPartitioner("pk")
+
+    def test_aggregated_window(self):
+        for encoding in ("json", "binary"):
+            aggregator = FrameAggregator(encoding=encoding, max_record_bytes=1000)
+            records = format_sensor_matrices(self.matrices, True, 3600, partitioner=self.partitioner,
+                                             upload_id="upload", aggregator=aggregator)
+            self.assertGreater(len(records), 1)
+            frames = []
+            for record in records:
+                self.assertEqual(record["PartitionKey"], "pk")
+                self.assertLessEqual(len(record["Data"]) + len("pk"), 1000)
+                frames.extend(deaggregate_frames(record["Data"]))
+            self.assertEqual([frame["frame"] for frame in frames], list(range(50)))
+            self.assertEqual([frame["readings"][0][0] for frame in frames], list(range(50)))
+            self.assertEqual((frames[0]["id"], frames[0]["patient_present"]), ("upload", True))
+
+    def test_json_records_without_aggregator(self):
+        records = format_sensor_matrices(self.matrices, False, 3600, partitioner=self.partitioner,
+                                         upload_id="upload")
+        self.assertEqual(len(records), 50)
+        data = json.loads(records[3]["Data"])
+        self.assertEqual((data["id"], data["frame"], data["readings"][0][0]), ("upload", 3, 3))
+
+    def test_aggregation_is_opt_in(self):
+        os.environ.pop("KINESIS_AGGREGATION", None)
+        self.assertIsNone(get_aggregator())
+        os.environ["KINESIS_AGGREGATION"] = "1"
+        try:
+            self.assertIsInstance(get_aggregator(), FrameAggregator)
+        finally:
+            del os.environ["KINESIS_AGGREGATION"]
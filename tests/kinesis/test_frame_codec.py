@@ -0,0 +1,89 @@
+import json
+from unittest import TestCase, skipIf
+
+import numpy as np
+
+from kinesis.aggregation import aggregate_encoded_frames, aggregate_frames, deaggregate_frames, encode_frame
+from kinesis.frame_codec import COMPRESSION_LZ4, COMPRESSION_NONE, COMPRESSION_ZLIB, decode_frames, \
+    encode_frames, lz4_frame
+
+
+def lying_patient(count=300, rows=64, cols=27, seed=1):
+    # Mostly empty mat with a slowly drifting body shaped pressure area and a little sensor noise
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:rows, 0:cols]
+    frames = []
+    for i in range(count):
+        center = 20 + 10 * np.sin(i / 50.0)
+        body = 400 * np.exp(-((y - center) ** 2 / 200.0 + (x - 13) ** 2 / 30.0))
+        noise = rng.integers(0, 2, size=(rows, cols)) * (body > 5)
+        frames.append(np.rint(body).astype(np.int64) + noise)
+    return np.array(frames)
+
+
+def corpus():
+    rng = np.random.default_rng(7)
+    return {
+        "single_frame": rng.integers(0, 1000, size=(1, 4, 3)),
+        "empty_mat": np.zeros((20, 64, 27), dtype=np.int64),
+        "random": rng.integers(0, 65536, size=(30, 16, 8)),
+        "ramp": np.arange(10 * 5 * 5).reshape(10, 5, 5),
+        "wrapping_deltas": np.array([[[0, 65535]], [[65535, 0]], [[1, 65534]]]),
+        "lying_patient": lying_patient(count=50),
+    }
+
+
+class TestFrameCodec(TestCase):
+
+    def test_round_trip_corpus(self):
+        for name, frames in corpus().items():
+            for compression in (COMPRESSION_NONE, COMPRESSION_ZLIB):
+                for delta in (True, False):
+                    decoded = decode_frames(encode_frames(frames, compression=compression, delta=delta))
+                    self.assertEqual(decoded.tolist(), frames.tolist(), f"{name} {compression} {delta}")
+
+    @skipIf(lz4_frame is None, "lz4 is not installed")
+    def test_round_trip_lz4(self):
+        for name, frames in corpus().items():
+            decoded = decode_frames(encode_frames(frames, compression=COMPRESSION_LZ4))
+            self.assertEqual(decoded.tolist(), frames.tolist(), name)
+
+    def test_cell_widths(self):
+        frames = np.array([[[0, 200], [255, 7]], [[3, 3], [3, 3]]])
+        for cell_width in (1, 2, 4):
+            decoded = decode_frames(encode_frames(frames, cell_width=cell_width))
+            self.assertEqual(decoded.tolist(), frames.tolist())
+
+    def test_values_are_clipped(self):
+        decoded = decode_frames(encode_frames([[[-5, 70000]]], cell_width=2))
+        self.assertEqual(decoded.tolist(), [[[0, 65535]]])
+
+    def test_rejects_bad_input(self):
+        with self.assertRaises(ValueError):
+            decode_frames(b"XXX" + bytes(20))
+        with self.assertRaises(ValueError):
+            encode_frames(np.zeros((2, 2)))
+
+    def test_smaller_than_json(self):
+        frames = lying_patient()
+        header = {"id": "upload", "time": "t", "patient_present": True, "frames_per_hour": 3600}
+        json_records = aggregate_frames(dict(header, encoding="json"), [encode_frame(m) for m in frames])
+        binary_records = aggregate_encoded_frames(header, frames)
+
+        json_bytes = sum(len(record) for record in json_records)
+        binary_bytes = sum(len(record) for record in binary_records)
+        self.assertGreater(json_bytes / binary_bytes, 5)
+
+    def test_aggregated_round_trip(self):
+        frames = lying_patient(count=120, rows=32, cols=16)
+        header = {"id": "upload", "time": "t", "patient_present": True, "frames_per_hour": 3600}
+        records = aggregate_encoded_frames(header, frames, max_record_bytes=40000, compression=COMPRESSION_NONE)
+        self.assertGreater(len(records), 1)
+
+        decoded = []
+        for record in records:
+            self.assertLessEqual(len(record), 40000)
+            decoded.extend(deaggregate_frames(record))
+        self.assertEqual([frame["frame"] for frame in decoded], list(range(120)))
+        self.assertEqual([frame["readings"] for frame in decoded], frames.tolist())
+        self.assertEqual(json.dumps(decoded[0]["readings"]), json.dumps(frames[0].tolist()))
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+os.environ.setdefault("STREAM_NAME", "test-stream")
+os.environ.setdefault("AWS_REGION", "us-east-1")
+
+from kinesis import KinesisClient
+from metrics.tracing import Tracer
+from replay.fakes import CallLog, FakeApi, FakeCloudWatchLogs, FakeKinesis, FakeResponse
+from spool import Spool
+
+
+class BlockingApi(FakeApi):
+    # Holds calls to `slow_endpoint` until released, like a backend that takes its time
+    def __init__(self, call_log, slow_endpoint):
+        super().__init__(call_log)
+        self.slow_endpoint = slow_endpoint
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.status_code = 200
+
+    def request(self, method, endpoint, data_obj=None, timeout=None, idempotency_key=None):
+        if endpoint == self.slow_endpoint:
+            self.started.set()
+            self.release.wait(5)
+        self.call_log.record("api", method=method, endpoint=endpoint, data=data_obj)
+        return FakeResponse(self.status_code, "{}")
+
+
+class TestSignedRequests(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.call_log = CallLog()
+        self.api = BlockingApi(self.call_log, "/bed/1")
+        self.client = KinesisClient(kinesis_client=FakeKinesis(self.call_log),
+                                    cloudwatchlogs_client=FakeCloudWatchLogs(self.call_log), signed_api=self.api,
+                                    spool=Spool(os.path.join(self.tmp_dir.name, "outbound.db")))
+
+    def tearDown(self):
+        self.api.release.set()
+        self.client.close()
+        self.tmp_dir.cleanup()
+
+    def endpoints(self):
+        return [details["endpoint"] for _, _, details in self.call_log.calls("api")]
+
+    def test_overlapping_calls_do_not_wait_for_each_other(self):
+        slow = threading.Thread(target=self.client.signed_request_v2, args=("/bed/1", {"sensorId": "s"}, "PATCH"))
+        slow.start()
+        self.assertTrue(self.api.started.wait(5))
+
+        # The exit alert goes out while the slow call is still in flight
+        start = time.monotonic()
+        self.client.signed_request_v2("/event", {"eventType": "bedExit"})
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.endpoints(), ["/event"])
+
+        self.api.release.set()
+        slow.join(5)
+        self.assertEqual(self.endpoints(), ["/event", "/bed/1"])
+        self.assertEqual(self.client.spool.pending_count(), 0)
+
+    def test_calls_wait_behind_failed_ones(self):
+        self.client.spool_replayer.stop()
+        self.api.status_code = 503
+        self.client.signed_request_v2("/event", {"eventType": "bedEntry"})
+        self.api.status_code = 200
+        self.client.signed_request_v2("/event", {"eventType": "bedExit"})
+        # The second call is left to the replayer so it cannot overtake the first
+        self.assertEqual(self.endpoints(), ["/event"])
+        self.assertEqual(self.client.spool.pending_count(), 2)
+
+    def test_trace_only_acknowledges_delivered_calls(self):
+        self.client.spool_replayer.stop()
+        tracer = Tracer()
+        trace = tracer.start_trace("bed_exit")
+        self.assertTrue(self.client.signed_request_v2("/event", {"eventType": "bedExit"}, trace=trace))
+        self.assertEqual([stage for stage, _ in trace.stages], ["spooled", "request", "acknowledged"])
+
+        self.api.status_code = 503
+        trace = tracer.start_trace("bed_exit")
+        self.assertFalse(self.client.signed_request_v2("/event", {"eventType": "bedExit"}, trace=trace))
+        self.assertEqual([stage for stage, _ in trace.stages], ["spooled", "request"])
+
+        # Deferred behind the failed call
+        self.api.status_code = 200
+        self.assertFalse(self.client.signed_request_v2("/event", {"eventType": "bedExit"}))
+
+    def test_throttled_and_rejected_calls_are_not_acknowledged(self):
+        self.client.spool_replayer.stop()
+        tracer = Tracer()
+        for status_code in (429, 400):
+            self.api.status_code = status_code
+            trace = tracer.start_trace("bed_exit")
+            self.assertFalse(self.client.signed_request_v2("/event", {"eventType": "bedExit"}, trace=trace))
+            # send_exit_event fails the trace instead of finishing it
+            self.assertNotIn("acknowledged", [stage for stage, _ in trace.stages])
+            # Let the 400 go out instead of queueing behind the throttled call
+            for entry_id, _, _, _ in self.client.spool.pending():
+                self.client.spool.mark_delivered(entry_id)
+
+    def test_only_2xx_counts_as_delivered(self):
+        self.client.spool_replayer.stop()
+        for status_code in (429, 401, 403, 408, 503):
+            self.api.status_code = status_code
+            self.assertFalse(self.client.signed_request_v2("/event", {"eventType": "bedExit"}))
+        # Every one of them stays spooled for the replayer
+        self.assertEqual(self.client.spool.pending_count(), 5)
+
+    def test_permanent_rejection_is_logged_with_the_payload(self):
+        self.client.spool_replayer.stop()
+        self.api.status_code = 400
+        with self.assertLogs("kinesis.kinesis", level="ERROR") as logs:
+            self.assertFalse(self.client.signed_request_v2("/event", {"eventType": "bedExit", "sensorId": "s"}))
+        self.assertIn('"eventType": "bedExit"', logs.output[0])
+        self.assertIn("400", logs.output[0])
+        # A retry would be rejected again, and would hold up every later call
+        self.assertEqual(self.client.spool.pending_count(), 0)
+
+    def test_replayer_keeps_throttled_calls(self):
+        self.client.spool_replayer.stop()
+        self.api.status_code = 429
+        self.client.signed_request_v2("/event", {"eventType": "bedExit"})
+        (entry_id, _, payload, _), = self.client.spool.pending()
+        self.assertFalse(self.client.deliver_spooled_request(payload))
+
+        self.api.status_code = 404
+        with self.assertLogs("kinesis.kinesis", level="ERROR"):
+            self.assertTrue(self.client.deliver_spooled_request(payload))
@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+import kinesis
+from kinesis.lazy import LazyProxy
+
+SRC_DIR = os.path.dirname(os.path.dirname(kinesis.__file__))
+
+
+class TestLazyProxy(TestCase):
+
+    def test_factory_runs_once_on_first_use(self):
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return {"region": "us-west-2"}
+
+        proxy = LazyProxy(factory)
+        self.assertFalse(proxy.loaded)
+        self.assertEqual(calls, [])
+
+        self.assertEqual(proxy.get("region"), "us-west-2")
+        self.assertEqual(proxy.get("region"), "us-west-2")
+        self.assertTrue(proxy.loaded)
+        self.assertEqual(calls, [1])
+
+    def test_importing_kinesis_does_not_load_boto3(self):
+        code = "import sys, kinesis; print('boto3' in sys.modules or 'botocore' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=SRC_DIR)
+        self.assertEqual(output.stdout.strip(), "False")
+
@@ -0,0 +1,176 @@
+import time
+from unittest import TestCase
+
+from kinesis.log_shipper import CloudWatchLogShipper, EVENT_OVERHEAD_BYTES, MAX_BATCH_SPAN_MS, \
+    MAX_BYTES_PER_BATCH, event_size, pack_log_events
+from kinesis.throttle import AdaptiveRateLimiter
+
+
+class ThrottlingError(Exception):
+    response = {"Error": {"Code": "ThrottlingException"}}
+
+
+class FakeLogs:
+
+    def __init__(self, failures=0):
+        self.failures = failures  # number of calls that are throttled before calls succeed
+        self.batches = []
+
+    def put_log_events(self, logGroupName, logStreamName, logEvents):
+        if self.failures:
+            self.failures -= 1
+            raise ThrottlingError()
+        self.batches.append([event["message"] for event in logEvents])
+        return {}
+
+
+class RecordingLimiter(AdaptiveRateLimiter):
+
+    def __init__(self):
+        super().__init__("logs:test", bytes_per_second=1024 * 1024, calls_per_second=5)
+        self.acquired = []
+
+    def acquire(self, records=0, size=0, calls=1):
+        self.acquired.append((records, size))
+        return super().acquire(records, size, calls)
+
+
+def event(i, timestamp=0, size=10):
+    return {"timestamp": timestamp, "message": str(i).ljust(size - EVENT_OVERHEAD_BYTES, "x")}
+
+
+class TestPackLogEvents(TestCase):
+
+    def test_count_limit(self):
+        batches = list(pack_log_events([event(i, size=30) for i in range(10001)]))
+        self.assertEqual([len(batch) for batch in batches], [10000, 1])
+
+    def test_size_limit(self):
+        events = [event(i, size=100000) for i in range(25)]
+        self.assertEqual(event_size(events[0]), 100000)
+        batches = list(pack_log_events(events))
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        for batch in batches:
+            self.assertLessEqual(sum(event_size(e) for e in batch), MAX_BYTES_PER_BATCH)
+
+    def test_span_limit(self):
+        hour = 60 * 60 * 1000
+        events = [event(0, 0), event(1, hour), event(2, MAX_BATCH_SPAN_MS - 1), event(3, MAX_BATCH_SPAN_MS)]
+        batches = list(pack_log_events(events))
+        self.assertEqual([len(batch) for batch in batches], [3, 1])
+
+    def test_empty(self):
+        self.assertEqual(list(pack_log_events([])), [])
+
+
+class TestCloudWatchLogShipper(TestCase):
+
+    def setUp(self):
+        self.client = FakeLogs()
+        self.shipper = None
+
+    def tearDown(self):
+        if self.shipper is not None:
+            self.shipper.close()
+
+    def start_shipper(self, **kwargs):
+        self.shipper = CloudWatchLogShipper(self.client, "group", "stream", **kwargs)
+        self.shipper.start()
+        return self.shipper
+
+    def wait_for_shipped(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.shipper.stats["shipped"] < count:
+            if time.monotonic() > deadline:
+                self.fail(f"Only {self.shipper.stats['shipped']} of {count} events were shipped")
+            time.sleep(0.01)
+
+    def test_flushes_on_event_count(self):
+        shipper = self.start_shipper(max_batch_events=5, max_age=60)
+        for i in range(4):
+            shipper.log(f"message {i}")
+        time.sleep(0.1)
+        self.assertEqual(self.client.batches, [])
+
+        shipper.log("message 4")
+        self.wait_for_shipped(5)
+        self.assertEqual(self.client.batches, [[f"message {i}" for i in range(5)]])
+
+    def test_flushes_on_bytes(self):
+        shipper = self.start_shipper(max_batch_bytes=100, max_age=60)
+        shipper.log("x" * 50)
+        time.sleep(0.1)
+        self.assertEqual(self.client.batches, [])
+
+        shipper.log("y" * 50)
+        self.wait_for_shipped(2)
+
+    def test_flushes_on_age(self):
+        shipper = self.start_shipper(max_age=0.1)
+        start = time.monotonic()
+        shipper.log("message")
+        self.wait_for_shipped(1)
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_close_flushes_the_rest(self):
+        shipper = self.start_shipper(max_age=60)
+        shipper.log("message")
+        shipper.close()
+        self.assertEqual(self.client.batches, [["message"]])
+
+    def test_full_buffer_is_sampled(self):
+        shipper = CloudWatchLogShipper(self.client, "group", "stream", max_buffer_events=3, sample_every=2)
+        for i in range(10):
+            shipper.log(f"message {i}", timestamp=i)
+
+        # Every other event past the limit is kept, in place of the oldest
+        self.assertEqual(shipper.queue_depth(), 3)
+        self.assertEqual((shipper.stats["logged"], shipper.stats["dropped"]), (10, 7))
+        shipper.flush()
+        self.assertEqual(self.client.batches, [["message 4", "message 6", "message 8"]])
+        self.assertEqual(shipper.metrics()["shipped"], 3)
+
+    def test_events_are_shipped_in_timestamp_order(self):
+        shipper = CloudWatchLogShipper(self.client, "group", "stream")
+        shipper.log("second", timestamp=2)
+        shipper.log("first", timestamp=1)
+        shipper.flush()
+        self.assertEqual(self.client.batches, [["first", "second"]])
+
+    def test_throttled_batch_is_retried_and_slows_the_limiter(self):
+        self.client.failures = 1
+        limiter = RecordingLimiter()
+        shipper = CloudWatchLogShipper(self.client, "group", "stream", limiter=limiter)
+        shipper.log("message")
+        shipper.flush()
+
+        self.assertEqual(self.client.batches, [["message"]])
+        self.assertEqual(limiter.acquired, [(0, event_size({"message": "message"}))] * 2)
+        self.assertEqual((limiter.stats["throttled"], limiter.stats["successes"]), (1, 1))
+        self.assertLess(limiter.fraction, 1.0)
+
+    def test_failed_batch_goes_to_on_failed(self):
+        failed = []
+        self.client.failures = 3
+        shipper = CloudWatchLogShipper(self.client, "group", "stream", on_failed=failed.append)
+        shipper._ship([{"timestamp": 1, "message": "message"}], retries=0)
+
+        self.assertEqual(failed, [[{"timestamp": 1, "message": "message"}]])
+        self.assertEqual(shipper.stats["failed"], 1)
+        self.assertEqual(self.client.batches, [])
+
+    def test_batches_wait_behind_a_backlog(self):
+        failed = []
+        backlogged = [True]
+        shipper = CloudWatchLogShipper(self.client, "group", "stream", on_failed=failed.append,
+                                       is_backlogged=lambda: backlogged[0])
+        shipper.log("queued", timestamp=1)
+        shipper.flush()
+        self.assertEqual(failed, [[{"timestamp": 1, "message": "queued"}]])
+        self.assertEqual(shipper.stats["deferred"], 1)
+        self.assertEqual(self.client.batches, [])
+
+        backlogged[0] = False
+        shipper.log("sent", timestamp=2)
+        shipper.flush()
+        self.assertEqual(self.client.batches, [["sent"]])
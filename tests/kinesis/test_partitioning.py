@@ -0,0 +1,69 @@
+import os
+from unittest import TestCase
+
+from kinesis.partitioning import BedPartitioner, ExplicitHashPartitioner, HASH_KEY_SPACE, Partitioner, \
+    PARTITIONERS, SensorPartitioner, SessionPartitioner, StaticPartitioner, get_partitioner, shard_for, \
+    simulate_shard_distribution
+
+
+class TestPartitioners(TestCase):
+
+    def test_partitioner_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Partitioner()
+
+    def test_keys_are_stable_per_upload(self):
+        partitioners = [StaticPartitioner("fleet"), SensorPartitioner(), BedPartitioner(), SessionPartitioner(),
+                        ExplicitHashPartitioner(index=3, fleet_size=10)]
+        for partitioner in partitioners:
+            first = partitioner.partition(upload_id="upload-1", sensor_ssid="JXN-1", bed_id="12")
+            again = partitioner.partition(upload_id="upload-1", sensor_ssid="JXN-1", bed_id="12")
+            self.assertEqual(first, again, partitioner.name)
+
+    def test_keys(self):
+        self.assertEqual(StaticPartitioner("fleet").partition("u"), {"PartitionKey": "fleet"})
+        self.assertEqual(SensorPartitioner().partition("u", sensor_ssid="JXN-1"), {"PartitionKey": "sensor-JXN-1"})
+        self.assertEqual(BedPartitioner().partition("u", sensor_ssid="JXN-1"), {"PartitionKey": "sensor-JXN-1"})
+        self.assertEqual(BedPartitioner().partition("u", sensor_ssid="JXN-1", bed_id="12"), {"PartitionKey": "bed-12"})
+        self.assertNotEqual(SessionPartitioner().partition("u1"), SessionPartitioner().partition("u2"))
+
+        keys = ExplicitHashPartitioner(index=0, fleet_size=4).partition("u", sensor_ssid="JXN-1")
+        self.assertEqual(int(keys["ExplicitHashKey"]), HASH_KEY_SPACE // 8)
+        self.assertEqual(shard_for(keys, 4), 0)
+
+    def test_get_partitioner(self):
+        self.assertIsInstance(get_partitioner("bed"), BedPartitioner)
+        os.environ["PARTITION_STRATEGY"] = "sensor"
+        try:
+            self.assertIsInstance(get_partitioner(), SensorPartitioner)
+        finally:
+            del os.environ["PARTITION_STRATEGY"]
+        self.assertIsInstance(get_partitioner(), StaticPartitioner)
+        with self.assertRaises(ValueError):
+            get_partitioner("unknown")
+
+
+class TestShardDistribution(TestCase):
+
+    def test_static_key_uses_one_shard(self):
+        result = simulate_shard_distribution("static", fleet_size=20, shard_count=4, uploads_per_sensor=5)
+        self.assertEqual(result["uploads"], 100)
+        self.assertEqual(result["idle_shards"], 3)
+        self.assertEqual(result["max_over_mean"], 4.0)
+
+    def test_explicit_hash_keys_spread_exactly(self):
+        result = simulate_shard_distribution("explicit", fleet_size=20, shard_count=4, uploads_per_sensor=5)
+        self.assertEqual(result["counts"], [25, 25, 25, 25])
+        self.assertEqual(result["max_over_mean"], 1.0)
+
+    def test_hashed_keys_spread(self):
+        for strategy in ("sensor", "bed", "session"):
+            result = simulate_shard_distribution(strategy, fleet_size=400, shard_count=4, uploads_per_sensor=5)
+            self.assertEqual(result["uploads"], 2000, strategy)
+            self.assertEqual(result["idle_shards"], 0, strategy)
+            self.assertLess(result["max_over_mean"], 1.3, strategy)
+
+    def test_every_strategy_can_be_simulated(self):
+        for strategy in PARTITIONERS:
+            result = simulate_shard_distribution(strategy, fleet_size=8, shard_count=2, uploads_per_sensor=1)
+            self.assertEqual(sum(result["counts"]), 8)
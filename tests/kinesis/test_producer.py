@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+from kinesis.producer import KinesisProducer, pack_records, MAX_BYTES_PER_REQUEST
+
+
+class FakeKinesis:
+    def __init__(self, failures):
+        self.failures = failures  # number of calls in which the first record fails
+        self.calls = []
+
+    def put_records(self, Records, StreamName):
+        self.calls.append([record["Data"] for record in Records])
+        entries = [{"SequenceNumber": "1"} for _ in Records]
+        if self.failures:
+            self.failures -= 1
+            entries[0] = {"ErrorCode": "ProvisionedThroughputExceededException"}
+        return {"FailedRecordCount": int(self.failures > 0), "Records": entries}
+
+
+def record(i, size=10):
+    return {"Data": str(i).ljust(size, "x"), "PartitionKey": "pk"}
+
+
+class TestKinesisProducer(TestCase):
+
+    def test_pack_records_count_limit(self):
+        batches = list(pack_records([record(i) for i in range(1201)]))
+        self.assertEqual([len(batch) for batch in batches], [500, 500, 201])
+
+    def test_pack_records_size_limit(self):
+        records = [record(i, size=1024 * 1000) for i in range(12)]
+        batches = list(pack_records(records))
+        self.assertEqual([len(batch) for batch in batches], [5, 5, 2])
+        for batch in batches:
+            self.assertLessEqual(sum(len(r["Data"]) + 2 for r in batch), MAX_BYTES_PER_REQUEST)
+
+    def test_failed_records_are_retried(self):
+        client = FakeKinesis(failures=2)
+        producer = KinesisProducer(client, "stream", linger=0.05, backoff=0.001)
+        producer.start()
+        producer.put_records([record(i) for i in range(3)])
+        producer.flush()
+        producer.close()
+
+        self.assertEqual(len(client.calls), 3)
+        self.assertEqual(len(client.calls[1]), 1)
+        self.assertEqual(producer.stats["sent"], 3)
+        self.assertEqual(producer.stats["retried"], 2)
+        self.assertEqual(producer.stats["failed"], 0)
+
+    def test_full_queue_drops_without_blocking(self):
+        producer = KinesisProducer(FakeKinesis(failures=0), "stream", max_queue_records=2)
+        self.assertEqual(producer.put_records([record(i) for i in range(5)]), 2)
+        self.assertEqual(producer.stats["dropped"], 3)
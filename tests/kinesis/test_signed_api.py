@@ -0,0 +1,122 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+import requests
+from botocore.credentials import Credentials
+
+from kinesis.signed_api import SignedApiClient, request_not_sent
+
+
+class FakeSession:
+
+    def __init__(self):
+        self.credential_lookups = 0
+
+    def get_credentials(self):
+        self.credential_lookups += 1
+        return Credentials("AKIDEXAMPLE", "secret")
+
+
+class Backend(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), BackendHandler)
+        self.responses = []  # status codes (or "hang") for the next requests, 200 once used up
+        self.requests = []
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class BackendHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def handle_any(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests.append((self.command, self.path, dict(self.headers), body))
+        status = self.server.responses.pop(0) if self.server.responses else 200
+        if status == "hang":
+            time.sleep(0.5)
+            status = 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    do_GET = do_POST = do_PATCH = do_PUT = handle_any
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestSignedApiClient(TestCase):
+
+    def setUp(self):
+        self.backend = Backend()
+        threading.Thread(target=self.backend.serve_forever, daemon=True).start()
+        self.session = FakeSession()
+        self.client = SignedApiClient(self.session, "api-key", retries=2, backoff=0.01)
+
+    def tearDown(self):
+        self.client.close()
+        self.backend.shutdown()
+        self.backend.server_close()
+
+    def test_requests_are_signed(self):
+        response = self.client.post(self.backend.url + "/event", {"eventType": "bedExit"},
+                                    idempotency_key="entry-1")
+        self.assertEqual(response.status_code, 200)
+        self.client.get(self.backend.url + "/bed/1")
+
+        method, path, headers, body = self.backend.requests[0]
+        self.assertEqual((method, path, json.loads(body)), ("POST", "/event", {"eventType": "bedExit"}))
+        self.assertTrue(headers["Authorization"].startswith("AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/"))
+        self.assertIn("idempotency-key", headers["Authorization"])
+        self.assertEqual(headers["Idempotency-Key"], "entry-1")
+        self.assertEqual(headers["x-api-key"], "api-key")
+        self.assertNotIn("Idempotency-Key", self.backend.requests[1][2])
+        # The credentials and the signer are reused between calls
+        self.assertEqual(self.session.credential_lookups, 1)
+
+    def test_idempotent_methods_retry_server_errors(self):
+        self.backend.responses = [503, 502]
+        response = self.client.get(self.backend.url + "/bed/1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.backend.requests), 3)
+        stats = self.client.latency.snapshot()["GET /bed/1"]
+        self.assertEqual((stats["count"], stats["errors"]), (3, 2))
+
+    def test_retries_give_up_after_the_limit(self):
+        self.backend.responses = [503, 503, 503, 503]
+        self.assertEqual(self.client.put(self.backend.url + "/bed/1", {}).status_code, 503)
+        self.assertEqual(len(self.backend.requests), 3)
+
+    def test_post_and_patch_are_not_resent_after_the_backend_saw_them(self):
+        self.backend.responses = [503, 500]
+        self.assertEqual(self.client.post(self.backend.url + "/event", {}).status_code, 503)
+        self.assertEqual(self.client.patch(self.backend.url + "/bed/1", {}).status_code, 500)
+        self.assertEqual(len(self.backend.requests), 2)
+
+        self.backend.responses = ["hang"]
+        with self.assertRaises(requests.Timeout):
+            self.client.post(self.backend.url + "/event", {}, timeout=0.1)
+        time.sleep(0.5)
+        self.assertEqual(len(self.backend.requests), 3)
+
+    def test_post_retries_when_the_connection_failed(self):
+        url = f"http://127.0.0.1:{closed_port()}/event"
+        start = time.monotonic()
+        with self.assertRaises(requests.ConnectionError) as context:
+            self.client.post(url, {})
+        self.assertTrue(request_not_sent(context.exception))
+        self.assertEqual(self.client.latency.snapshot()["POST /event"]["count"], 3)
+        # Jittered backoff of about 0.01 s and 0.02 s between the attempts
+        self.assertLess(time.monotonic() - start, 1)
@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+from kinesis.producer import KinesisProducer
+from kinesis.throttle import AdaptiveRateLimiter, TokenBucket, is_throttling_error
+
+
+class ThrottlingError(Exception):
+    response = {"Error": {"Code": "ProvisionedThroughputExceededException"}}
+
+
+class FlakyClient:
+
+    def __init__(self, throttled_calls):
+        self.throttled_calls = throttled_calls
+        self.calls = 0
+
+    def put_records(self, Records, StreamName):
+        self.calls += 1
+        if self.calls <= self.throttled_calls:
+            raise ThrottlingError()
+        return {"FailedRecordCount": 0, "Records": [{"SequenceNumber": "1"} for _ in Records]}
+
+
+class TestThrottle(TestCase):
+
+    def test_is_throttling_error(self):
+        self.assertTrue(is_throttling_error(ThrottlingError()))
+        self.assertTrue(is_throttling_error("ProvisionedThroughputExceededException"))
+        self.assertFalse(is_throttling_error("InternalFailure"))
+        self.assertFalse(is_throttling_error(ValueError()))
+
+    def test_bucket_reserves_ahead(self):
+        bucket = TokenBucket(rate=10, burst=10)
+        self.assertEqual(bucket.reserve(10), 0.0)
+        self.assertAlmostEqual(bucket.reserve(5), 0.5, places=2)
+
+    def test_aimd(self):
+        limiter = AdaptiveRateLimiter("test", records_per_second=1000, bytes_per_second=None,
+                                      decrease=0.5, increase=0.1, min_fraction=0.2)
+        limiter.on_throttle()
+        self.assertEqual(limiter.current_rates(), {"records": 500})
+        limiter.on_throttle()
+        limiter.on_throttle()
+        self.assertEqual(limiter.current_rates(), {"records": 200})
+        for _ in range(20):
+            limiter.on_success()
+        self.assertEqual(limiter.current_rates(), {"records": 1000})
+        self.assertEqual(limiter.metrics()["throttled"], 3)
+
+    def test_producer_backs_off_on_throttling(self):
+        client = FlakyClient(throttled_calls=2)
+        limiter = AdaptiveRateLimiter("stream", records_per_second=1000)
+        producer = KinesisProducer(client, "stream", backoff=0.001, limiter=limiter)
+        producer._send([{"Data": b"x", "PartitionKey": "k"}])
+
+        self.assertEqual(client.calls, 3)
+        self.assertEqual(limiter.stats["throttled"], 2)
+        self.assertEqual(limiter.stats["successes"], 1)
+        self.assertLess(limiter.fraction, 1.0)
@@ -0,0 +1,62 @@
+import random
+from unittest import TestCase
+
+from metrics.histogram import Histogram
+from metrics.tracing import Tracer
+
+
+class TestHistogram(TestCase):
+
+    def test_percentiles_within_precision(self):
+        rng = random.Random(3)
+        values = [rng.lognormvariate(-3, 1) for _ in range(20000)]
+        histogram = Histogram()
+        for value in values:
+            histogram.record(value)
+
+        values.sort()
+        for percentile in (50, 90, 99, 99.9):
+            exact = values[int(percentile / 100 * len(values)) - 1]
+            self.assertAlmostEqual(histogram.percentile(percentile) / exact, 1.0, delta=0.02)
+        self.assertEqual(histogram.percentile(100), values[-1])
+        self.assertEqual(histogram.snapshot()["count"], 20000)
+
+    def test_small_and_empty(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(50), 0.0)
+        histogram.record(0.0)
+        histogram.record(0.000003)
+        self.assertEqual(histogram.snapshot()["max"], 0.000003)
+        self.assertEqual(histogram.percentile(50), 0.0)
+
+    def test_merge(self):
+        first, second = Histogram(), Histogram()
+        for i in range(1, 101):
+            (first if i % 2 else second).record(i / 1000.0)
+        first.merge(second)
+        self.assertEqual(first.count, 100)
+        self.assertEqual((first.min, first.max), (0.001, 0.1))
+        self.assertAlmostEqual(first.percentile(50), 0.05, delta=0.001)
+
+
+class TestTracer(TestCase):
+
+    def test_trace_stages(self):
+        tracer = Tracer()
+        trace = tracer.start_trace("bed_exit", started_at=0.0)
+        trace.mark("decision")
+        with trace.span("request"):
+            pass
+        trace.finish()
+
+        snapshot = tracer.snapshot()
+        self.assertEqual(sorted(snapshot), ["bed_exit.decision", "bed_exit.request", "bed_exit.total"])
+        self.assertEqual([stage for stage, _ in trace.stages], ["decision", "request", "total"])
+        self.assertIn("bed_exit.total", tracer.format_report())
+
+    def test_failed_pass_is_kept_out_of_total(self):
+        tracer = Tracer()
+        trace = tracer.start_trace("bed_exit", started_at=0.0)
+        trace.mark("spooled")
+        trace.fail()
+        self.assertEqual(sorted(tracer.snapshot()), ["bed_exit.failed", "bed_exit.spooled"])
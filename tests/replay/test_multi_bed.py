@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from unittest import TestCase
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+
+from replay.fakes import CallLog, FakeApi, FakeCloudWatchLogs, FakeKinesis, FakeSensor, NullDisplay
+from replay.replayer import REPLAY_ENVIRONMENT  # noqa: F401 (sets the environment the monitor reads)
+
+from dispatch import TELEMETRY
+from kinesis import KinesisClient
+from sensor.sse import SSEEvent
+from spool import Spool
+
+
+class TestMultiBedMonitor(TestCase):
+
+    def setUp(self):
+        from main import MultiBedMonitor
+
+        self.workdir = tempfile.mkdtemp()
+        self.call_log = CallLog()
+        self.kinesis_client = KinesisClient(kinesis_client=FakeKinesis(self.call_log),
+                                            cloudwatchlogs_client=FakeCloudWatchLogs(self.call_log),
+                                            signed_api=FakeApi(self.call_log),
+                                            spool=Spool(os.path.join(self.workdir, "outbound.db")))
+        sensors = [{"ssid": ssid, "url": f"http://{ssid}.invalid", "bed_id": bed_id,
+                    "archive_path": os.path.join(self.workdir, f"{ssid}.ring")}
+                   for ssid, bed_id in (("sensor-a", "1"), ("sensor-b", "2"))]
+        self.gateway = MultiBedMonitor(sensors, kinesis_client=self.kinesis_client, lcd_manager=NullDisplay())
+
+        # Every bed reads its frames from a fake sensor of its own
+        frames = {frame_id: [[frame_id % 7] * 4] * 4 for frame_id in range(1, 41)}
+        self.sensor_logs = {}
+        self.sensors = {}
+        for ssid, monitor in self.gateway.monitors.items():
+            self.sensor_logs[ssid] = CallLog()
+            self.sensors[ssid] = FakeSensor(frames, self.sensor_logs[ssid])
+            monitor.sensor_client = self.sensors[ssid]
+            monitor.frame_prefetcher.fetch_frames = self.sensors[ssid].iter_frames
+            monitor.presence_debounce = 0.05
+
+        self.gateway.dispatcher.start()
+        self.gateway.event_queue.start()
+        for monitor in self.gateway.monitors.values():
+            monitor.start_frame_pipeline()
+
+    def tearDown(self):
+        self.gateway.event_queue.stop()
+        self.gateway.dispatcher.stop()
+        self.gateway.scheduler.stop()
+        self.kinesis_client.close()
+        self.gateway.http_session.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def feed(self, ssid, events):
+        monitor = self.gateway.monitors[ssid]
+
+        async def feed():
+            for event, data in events:
+                if event == "newframe":
+                    self.sensors[ssid].announce(data["id"])
+                await monitor.on_sse_event(SSEEvent(event, json.dumps(data), None))
+
+        asyncio.run(feed())
+
+    def wait_until_idle(self):
+        deadline = time.monotonic() + 5
+        while True:
+            self.gateway.event_queue.join()
+            self.gateway.dispatcher.join()
+            if self.gateway.scheduler.pending() == 0 and self.gateway.event_queue.depth() == 0:
+                break
+            if time.monotonic() > deadline:
+                self.fail("The monitors did not go idle")
+            time.sleep(0.01)
+        self.kinesis_client.producer.flush()
+
+    def wait_for(self, condition, timeout=5):
+        # The scheduler takes a job off its queue before running it, so idle can come a moment early
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("Timed out waiting for the monitors")
+            time.sleep(0.01)
+
+    def api_calls(self):
+        return [(details["endpoint"].rsplit("/api", 1)[-1], details["data"])
+                for _, _, details in self.call_log.calls("api")]
+
+    def test_events_reach_only_their_bed(self):
+        bed_a, bed_b = self.gateway.monitors["sensor-a"], self.gateway.monitors["sensor-b"]
+        self.feed("sensor-a", [("body", {"present": True})] + [("newframe", {"id": i}) for i in range(1, 41)])
+        self.feed("sensor-b", [("newframe", {"id": i}) for i in range(1, 11)])
+        self.wait_until_idle()
+        self.wait_for(lambda: bed_a.is_present)
+        self.assertFalse(bed_b.is_present)
+        self.assertEqual((bed_a.frame_id, bed_b.frame_id), (40, 10))
+
+        self.feed("sensor-a", [("body", {"present": False})])
+        self.wait_until_idle()
+        calls = self.api_calls()
+        # Every event carries the time it was detected
+        occurred = [datetime.fromisoformat(data.pop("occurredAt")) for _, data in calls]
+        self.assertLess(occurred[0], occurred[1])
+        self.assertEqual(calls, [("/event", {"eventType": "bedEntry", "sensorId": "sensor-a"}),
+                                 ("/event", {"eventType": "bedExit", "sensorId": "sensor-a"})])
+        # The exit window comes out of bed A's own archive
+        self.assertGreater(self.call_log.counts().get("kinesis.put_records", 0), 0)
+        self.assertEqual(bed_a.frame_prefetcher.archive.newest_id, 40)
+        self.assertEqual(bed_b.frame_prefetcher.archive.newest_id, 10)
+        for _, _, details in self.sensor_logs["sensor-b"].calls("sensor.frames"):
+            self.assertLessEqual(details["before"], 10)
+
+    def test_prefetching_runs_on_the_shared_telemetry_lane(self):
+        for monitor in self.gateway.monitors.values():
+            self.assertEqual(monitor.frame_prefetcher.executor, self.gateway.run_telemetry)
+            self.assertIsNone(monitor.frame_prefetcher._thread)
+            self.assertIs(monitor.dispatcher, self.gateway.dispatcher)
+
+        self.feed("sensor-a", [("newframe", {"id": i}) for i in range(1, 21)])
+        self.feed("sensor-b", [("newframe", {"id": i}) for i in range(1, 21)])
+        self.wait_until_idle()
+
+        self.assertEqual(self.gateway.monitors["sensor-a"].frame_prefetcher.archive.newest_id, 20)
+        self.assertEqual(self.gateway.monitors["sensor-b"].frame_prefetcher.archive.newest_id, 20)
+        # Nothing but the prefetch jobs used the telemetry lane
+        fetches = sum(len(log.calls("sensor.frames")) for log in self.sensor_logs.values())
+        self.assertEqual(self.gateway.dispatcher.queue_wait.snapshot()[TELEMETRY]["count"], fetches)
+
+    def test_monitor_for(self):
+        bed_a, bed_b = self.gateway.monitors["sensor-a"], self.gateway.monitors["sensor-b"]
+        self.assertIs(self.gateway.monitor_for("sensor-b"), bed_b)
+        self.assertIs(self.gateway.monitor_for(None), bed_a)
+        self.assertIs(self.gateway.monitor_for(""), bed_a)
+        self.assertIsNone(self.gateway.monitor_for("sensor-c"))
+
+    def test_ble_bed_id_goes_to_the_named_sensor(self):
+        bed_a, bed_b = self.gateway.monitors["sensor-a"], self.gateway.monitors["sensor-b"]
+        self.gateway.ble_controller("bed_id,42,sensor-b")
+        self.gateway.ble_controller("bed_id,7")
+        self.gateway.ble_controller("bed_id,9,sensor-c")
+        self.wait_until_idle()
+
+        self.assertEqual((bed_a.bed_id, bed_b.bed_id), ("7", "42"))
+        self.assertEqual(sorted(self.api_calls()), [("/bed/42", {"sensorId": "sensor-b"}),
+                                                    ("/bed/7", {"sensorId": "sensor-a"})])
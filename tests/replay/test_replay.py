@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+
+from replay import RecordingWriter, read_recording
+from replay.replayer import Replayer
+
+
+def write_recording(path):
+    writer = RecordingWriter(path, sensor_url="http://sensor")
+    writer.event("body", json.dumps({"present": True}), "1", t=0.0)
+    for frame_id in range(1, 41):
+        t = frame_id * 0.5
+        writer.frame(frame_id, [[frame_id % 7] * 4] * 4, t=t)
+        writer.event("newframe", json.dumps({"id": frame_id}), str(frame_id + 1), t=t)
+    writer.event("body", json.dumps({"present": False}), "50", t=21.0)
+    writer.close()
+
+
+class TestRecording(TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "recording.jsonl.gz")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_round_trip(self):
+        write_recording(self.path)
+        header, events, frames = read_recording(self.path)
+        self.assertEqual(header["sensor_url"], "http://sensor")
+        self.assertEqual(len(events), 42)
+        self.assertEqual(events[0], (0.0, "body", '{"present": true}', "1"))
+        self.assertEqual(events[-1][1], "body")
+        self.assertEqual(sorted(frames), list(range(1, 41)))
+        self.assertEqual(frames[3], [[3] * 4] * 4)
+
+    def test_rejects_other_files(self):
+        import gzip
+
+        with gzip.open(self.path, "wt") as f:
+            f.write(json.dumps({"format": "something-else"}) + "\n")
+        with self.assertRaises(ValueError):
+            read_recording(self.path)
+
+
+class TestReplayer(TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "recording.jsonl.gz")
+        write_recording(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_replay_drives_the_monitor(self):
+        report = Replayer(self.path, speed=100).run()
+
+        self.assertEqual(report["events"], 42)
+        self.assertEqual(report["event_queue"]["handled"], report["event_queue"]["queued"])
+        api_calls = [details["data"]["eventType"] for _, target, details in report["calls"] if target == "api"]
+        self.assertEqual(api_calls, ["bedEntry", "bedExit"])
+        # The window around the exit goes out through the producer
+        self.assertGreater(report["outbound"].get("kinesis.put_records", 0), 0)
+        self.assertEqual(report["producer"]["failed"], 0)
+        self.assertIn("bed_exit.acknowledged", report["latency"])
+        self.assertIn("bed_exit.total", report["latency"])
+        self.assertNotIn("bed_exit.failed", report["latency"])
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import time
+from unittest import TestCase
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+
+from replay.sensor_server import FakeSensorServer
+from sensor.sensor_client import SensorClient
+from sensor.sse import AsyncSSEClient
+
+
+class TestFakeSensorServer(TestCase):
+
+    def setUp(self):
+        self.server = FakeSensorServer(frame_rate=100, rows=4, cols=3, storage_frames=50, seed=1)
+        self.server.start()
+        self.client = SensorClient(self.server.url, retries=0)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def wait_for_frames(self, count):
+        deadline = time.monotonic() + 5
+        while self.server.frame_id < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_frames_endpoint(self):
+        self.wait_for_frames(20)
+        frames = list(self.client.iter_frames(5, 15))
+        self.assertEqual([frame_id for frame_id, _ in frames], list(range(6, 16)))
+        self.assertEqual(len(frames[0][1]), 4)
+        self.assertEqual(len(frames[0][1][0]), 3)
+        self.assertEqual(list(self.client.iter_frames(10**6, 10**6 + 5)), [])
+
+    def test_storage_is_bounded_and_can_be_deleted(self):
+        self.wait_for_frames(60)
+        self.assertEqual(self.server.storage_used(), 100.0)
+        self.assertEqual(list(self.client.iter_frames(0, 5)), [])
+        self.assertTrue(self.client.delete_all_frames())
+        self.assertLess(self.server.storage_used(), 100.0)
+
+    def test_settings(self):
+        self.assertTrue(self.client.set_frequency(20))
+        self.assertEqual(self.server.frame_rate, 20)
+        self.assertTrue(self.client.set_rotation_interval(30))
+        self.assertEqual(self.server.rotation_interval, 30)
+        self.assertTrue(self.client.reset_rotation_interval())
+
+    def test_sse_stream(self):
+        received = []
+
+        async def consume():
+            entered = asyncio.Event()
+
+            async def on_event(event):
+                received.append(event)
+                if event.event == "body" and event.data == '{"present": true}':
+                    entered.set()
+
+            client = AsyncSSEClient(f"{self.server.url}/api/monitor/sse", on_event, idle_timeout=2)
+            task = asyncio.create_task(client.consume())
+            asyncio.get_running_loop().call_later(0.2, self.server.set_present, True)
+            await asyncio.wait_for(entered.wait(), 5)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(consume())
+        names = [event.event for event in received]
+        self.assertEqual(names[0], "body")
+        self.assertIn("newframe", names)
+        ids = [int(event.data.split(":")[1].strip(" }")) for event in received if event.event == "newframe"]
+        self.assertEqual(ids, sorted(ids))
+
+    def test_fault_injection(self):
+        self.server.error_rate = 1
+        response = self.client.get("/api/monitor/frames?after=0&before=1")
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.server.stats["errors"], 1)
@@ -0,0 +1,128 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+
+from sensor.frame_archive import FrameArchive
+from sensor.frame_prefetcher import FramePrefetcher
+
+
+class TestFrameArchive(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "frames.ring")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def frame(self, frame_id):
+        return np.full((4, 3), frame_id % 1000)
+
+    def test_get_window(self):
+        archive = FrameArchive(self.path, capacity=10)
+        for frame_id in range(1, 8):
+            archive.append(frame_id, self.frame(frame_id))
+
+        ids, frames = archive.get_window(2, 5)
+        self.assertEqual(list(ids), [3, 4, 5])
+        self.assertEqual(frames.shape, (3, 4, 3))
+        self.assertEqual(frames.dtype, np.uint16)
+        self.assertEqual(frames[0, 0, 0], 3)
+
+    def test_ring_wraps_and_keeps_newest(self):
+        archive = FrameArchive(self.path, capacity=5)
+        for frame_id in range(1, 13):
+            archive.append(frame_id, self.frame(frame_id))
+
+        self.assertEqual(len(archive), 5)
+        ids, frames = archive.get_window(0, 100)
+        self.assertEqual(list(ids), [8, 9, 10, 11, 12])
+        self.assertEqual(list(frames[:, 0, 0]), [8, 9, 10, 11, 12])
+
+    def test_duplicate_and_stale_ids_are_ignored(self):
+        archive = FrameArchive(self.path, capacity=5)
+        archive.append(5, self.frame(5))
+        archive.append(5, self.frame(6))
+        archive.append(3, self.frame(3))
+
+        ids, frames = archive.get_window(0, 10)
+        self.assertEqual(list(ids), [5])
+        self.assertEqual(frames[0, 0, 0], 5)
+
+    def test_reopen_keeps_frames(self):
+        archive = FrameArchive(self.path, capacity=5)
+        for frame_id in range(1, 4):
+            archive.append(frame_id, self.frame(frame_id))
+        archive.flush()
+        del archive
+
+        archive = FrameArchive(self.path, capacity=5)
+        self.assertEqual(archive.newest_id, 3)
+        self.assertEqual(archive.shape, (4, 3))
+        self.assertEqual(list(archive.get_window(0, 10)[0]), [1, 2, 3])
+
+    def test_values_are_clipped_to_dtype(self):
+        archive = FrameArchive(self.path, capacity=5)
+        archive.append(1, np.array([[-4.0, 70000.0], [1.6, 2.0]]))
+
+        _, frames = archive.get_window(0, 1)
+        self.assertEqual(frames[0].tolist(), [[0, 65535], [2, 2]])
+
+    def test_get_frames_within_window(self):
+        archive = FrameArchive(self.path, capacity=1000)
+        for frame_id in range(1, 501):
+            archive.append(frame_id, self.frame(frame_id))
+
+        frames = archive.get_frames_within_window(500, window_size=300)
+        self.assertEqual(len(frames), 300)
+        self.assertIsNone(archive.get_frames_within_window(None))
+
+    def test_other_session_is_dropped(self):
+        archive = FrameArchive(self.path, capacity=5)
+        archive.append(1, self.frame(1))
+        archive.flush()
+        del archive
+
+        # Filled without a session marker
+        archive = FrameArchive(self.path, capacity=5)
+        archive.start_session("http://sensor-a")
+        self.assertIsNone(archive.newest_id)
+        archive.append(2, self.frame(2))
+        archive.flush()
+        del archive
+
+        archive = FrameArchive(self.path, capacity=5)
+        archive.start_session("http://sensor-a")
+        self.assertEqual(archive.newest_id, 2)
+        archive.start_session("http://sensor-b")
+        self.assertIsNone(archive.newest_id)
+
+    def test_sensor_restart_between_sessions(self):
+        def fetch_frames(after_frame, before_frame):
+            for frame_id in range(after_frame + 1, before_frame + 1):
+                yield frame_id, self.frame(frame_id)
+
+        archive = FrameArchive(self.path, capacity=1000)
+        prefetcher = FramePrefetcher(archive=archive, fetch_frames=fetch_frames, session="http://sensor")
+        prefetcher.sync(600)
+        self.assertEqual(archive.newest_id, 600)
+        archive.flush()
+        del prefetcher, archive
+
+        # The process restarts and the sensor counts from 1 again
+        archive = FrameArchive(self.path, capacity=1000)
+        prefetcher = FramePrefetcher(archive=archive, fetch_frames=fetch_frames, session="http://sensor")
+        self.assertEqual(archive.newest_id, 600)
+        prefetcher.notify(1)
+        self.assertIsNone(archive.newest_id)
+        prefetcher.notify(400)
+
+        frames = prefetcher.get_frames_within_window(400)
+        self.assertEqual(len(frames), 300)
+        self.assertEqual(archive.newest_id, 400)
+        ids, _ = archive.get_window(0, 1000)
+        self.assertEqual((ids[0], ids[-1]), (101, 400))
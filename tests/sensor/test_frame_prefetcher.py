@@ -0,0 +1,180 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+import numpy as np
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+
+from sensor.frame_archive import FrameArchive
+from sensor.frame_prefetcher import FramePrefetcher
+
+
+class FakeFrames:
+    # Stands in for the sensor's frame endpoint and records every range that was requested
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+        self.reverse = False
+
+    def __call__(self, after_frame, before_frame):
+        self.calls.append((after_frame, before_frame))
+        if self.fail:
+            raise ConnectionError("sensor unreachable")
+        frame_ids = range(after_frame + 1, before_frame + 1)
+        for frame_id in reversed(frame_ids) if self.reverse else frame_ids:
+            yield frame_id, np.full((4, 3), frame_id)
+
+
+class TestFramePrefetcher(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.archive = FrameArchive(os.path.join(self.tmp_dir.name, "frames.ring"), capacity=1000)
+        self.fetch_frames = FakeFrames()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def prefetcher(self, **kwargs):
+        kwargs.setdefault("batch_size", 30)
+        return FramePrefetcher(archive=self.archive, fetch_frames=self.fetch_frames, session="http://sensor",
+                               **kwargs)
+
+    def archived_ids(self):
+        return list(self.archive.get_window(0, 10000)[0])
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("Timed out waiting for the prefetcher")
+            time.sleep(0.01)
+
+    def test_fetches_in_batches(self):
+        prefetcher = self.prefetcher()
+        prefetcher.sync(95)
+        self.assertEqual(self.fetch_frames.calls, [(0, 30), (30, 60), (60, 90), (90, 95)])
+        self.assertEqual(self.archived_ids(), list(range(1, 96)))
+
+        # Only what is new is requested next time
+        prefetcher.sync(100)
+        self.assertEqual(self.fetch_frames.calls[-1], (95, 100))
+
+    def test_unordered_batches_are_archived_in_order(self):
+        self.fetch_frames.reverse = True
+        prefetcher = self.prefetcher()
+        frames = prefetcher.get_frames_within_window(95)
+        self.assertEqual(self.archived_ids(), list(range(1, 96)))
+        self.assertEqual(list(frames[:, 0, 0]), list(range(1, 96)))
+
+    def test_first_fetch_starts_one_window_back(self):
+        prefetcher = self.prefetcher(window_size=50)
+        prefetcher.sync(200)
+        self.assertEqual(self.fetch_frames.calls[0], (150, 180))
+        self.assertEqual(self.archived_ids(), list(range(151, 201)))
+
+    def test_background_thread_follows_notify(self):
+        prefetcher = self.prefetcher()
+        prefetcher.start()
+        try:
+            prefetcher.notify(45)
+            self.wait_for(lambda: self.archive.newest_id == 45)
+            prefetcher.notify(70)
+            self.wait_for(lambda: self.archive.newest_id == 70)
+        finally:
+            prefetcher.stop()
+        self.assertEqual(self.archived_ids(), list(range(1, 71)))
+
+    def test_exit_path_catches_up(self):
+        prefetcher = self.prefetcher()
+        prefetcher.sync(60)
+        # Announced but not prefetched yet, as when the exit arrives before the next batch
+        prefetcher.notify(75)
+
+        frames = prefetcher.get_frames_within_window(75)
+        self.assertEqual(self.fetch_frames.calls[-1], (60, 75))
+        self.assertEqual(len(frames), 75)
+        self.assertEqual(frames[-1, 0, 0], 75)
+        self.assertIsNone(prefetcher.get_frames_within_window(None))
+
+    def test_exit_path_uses_archive_when_the_sensor_fails(self):
+        prefetcher = self.prefetcher()
+        prefetcher.sync(60)
+        self.fetch_frames.fail = True
+
+        frames = prefetcher.get_frames_within_window(90)
+        self.assertEqual(len(frames), 60)
+
+        # The failed range is requested again
+        self.fetch_frames.fail = False
+        prefetcher.sync(90)
+        self.assertEqual(self.fetch_frames.calls[-1], (60, 90))
+        self.assertEqual(self.archive.newest_id, 90)
+
+    def test_resets_when_frame_ids_go_backwards(self):
+        prefetcher = self.prefetcher()
+        prefetcher.notify(500)
+        prefetcher.sync(500)
+        self.assertEqual(self.archive.newest_id, 500)
+
+        # The sensor restarted and counts from 1 again
+        prefetcher.notify(20)
+        self.assertIsNone(self.archive.newest_id)
+        frames = prefetcher.get_frames_within_window(20)
+        self.assertEqual(self.fetch_frames.calls[-1], (0, 20))
+        self.assertEqual(len(frames), 20)
+        self.assertEqual(self.archived_ids(), list(range(1, 21)))
+
+    def test_long_gap_skips_to_archive_capacity(self):
+        self.archive = FrameArchive(os.path.join(self.tmp_dir.name, "small.ring"), capacity=100)
+        prefetcher = self.prefetcher()
+        prefetcher.sync(50)
+        prefetcher.sync(1000)
+        self.assertEqual(self.fetch_frames.calls[2], (900, 930))
+        self.assertEqual(self.archived_ids(), list(range(901, 1001)))
+
+    def test_executor_mode(self):
+        jobs = []
+
+        def executor(fn):
+            jobs.append(fn)
+
+        prefetcher = self.prefetcher(executor=executor)
+        prefetcher.start()
+        prefetcher.notify(40)
+        prefetcher.notify(50)
+        # At most one fetch is queued per prefetcher, and it fetches up to the latest id
+        self.assertEqual(len(jobs), 1)
+        jobs.pop()()
+        self.assertEqual(self.archive.newest_id, 50)
+
+        prefetcher.notify(60)
+        self.assertEqual(len(jobs), 1)
+        jobs.pop()()
+        self.assertEqual(self.archive.newest_id, 60)
+        self.assertIsNone(prefetcher._thread)
+
+        prefetcher.stop()
+        prefetcher.notify(70)
+        self.assertEqual(jobs, [])
+
+    def test_rejected_executor_job_is_queued_again(self):
+        accept = [False]
+        jobs = []
+
+        def executor(fn):
+            if not accept[0]:
+                return False
+            jobs.append(fn)
+
+        prefetcher = self.prefetcher(executor=executor)
+        prefetcher.notify(40)
+        self.assertEqual(jobs, [])
+
+        accept[0] = True
+        prefetcher.notify(50)
+        self.assertEqual(len(jobs), 1)
+        jobs.pop()()
+        self.assertEqual(self.archive.newest_id, 50)
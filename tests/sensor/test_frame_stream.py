@@ -0,0 +1,46 @@
+import json
+import os
+from unittest import TestCase
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+
+from sensor.frame_stream import iter_json_array, iter_frames, read_frames_into
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestFrameStream(TestCase):
+
+    def setUp(self):
+        self.frames = [{"id": i, "readings": [[[i, 2], [3, 4]], [[9, 9], [9, 9]]], "time": "é"}
+                       for i in range(1, 6)]
+        self.body = json.dumps(self.frames, ensure_ascii=False).encode("utf-8")
+
+    def test_iter_json_array_any_chunk_size(self):
+        for size in (1, 2, 7, 64, len(self.body)):
+            self.assertEqual(list(iter_json_array(chunked(self.body, size))), self.frames)
+
+    def test_iter_json_array_numbers_split_across_chunks(self):
+        self.assertEqual(list(iter_json_array(["[12", "34, 5", "6 ]"])), [1234, 56])
+
+    def test_iter_json_array_empty(self):
+        self.assertEqual(list(iter_json_array([b" [ ", b"]"])), [])
+
+    def test_iter_json_array_truncated(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array(chunked(self.body[:-10], 16)))
+
+    def test_iter_frames_keeps_first_readings(self):
+        frames = list(iter_frames(chunked(self.body, 16)))
+        self.assertEqual(frames[0], (1, [[1, 2], [3, 4]]))
+        self.assertEqual([frame_id for frame_id, _ in frames], [1, 2, 3, 4, 5])
+
+    def test_read_frames_into(self):
+        ids, matrices = read_frames_into(iter_frames(chunked(self.body, 16)), 300)
+        self.assertEqual(ids.tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(matrices.shape, (5, 2, 2))
+        self.assertEqual(matrices[4].tolist(), [[5, 2], [3, 4]])
+
+        self.assertEqual(read_frames_into(iter([]), 300), (None, None))
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+os.environ.setdefault("SENSOR_FREQUENCY", "3600")
+
+from kinesis.aggregation import FrameAggregator, deaggregate_frames, is_aggregated
+from kinesis.partitioning import StaticPartitioner
+from sensor.frame_archive import FrameArchive
+from sensor.frame_streamer import FrameStreamer
+
+
+class FakePrefetcher:
+    def __init__(self, archive):
+        self.archive = archive
+        self.synced = []
+
+    def sync(self, frame_id):
+        self.synced.append(frame_id)
+
+
+class TestFrameStreamer(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.archive = FrameArchive(os.path.join(self.tmp_dir.name, "frames.ring"), capacity=100)
+        self.prefetcher = FakePrefetcher(self.archive)
+        self.records = []
+        self.streamer = FrameStreamer(self.prefetcher, self.records.extend, partitioner=StaticPartitioner("pk"),
+                                      max_frames=10, max_age=60, aggregator=FrameAggregator())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def append(self, first, last):
+        for frame_id in range(first, last + 1):
+            self.archive.append(frame_id, np.full((4, 3), frame_id))
+
+    def decoded(self):
+        out = []
+        for record in self.records:
+            self.assertEqual(record["PartitionKey"], "pk")
+            if is_aggregated(record["Data"]):
+                out.extend(frame["readings"][0][0] for frame in deaggregate_frames(record["Data"]))
+            else:
+                out.append(json.loads(record["Data"])["event"])
+        return out
+
+    def test_batches_wait_for_size_or_age(self):
+        self.append(1, 10)
+        self.streamer._pump()  # first look only picks up the last batch worth of frames
+        self.append(11, 25)
+        self.streamer._pump()
+        self.assertEqual(self.decoded(), list(range(1, 21)))
+
+        self.streamer.max_age = 0
+        self.streamer._pump()
+        self.assertEqual(self.decoded(), list(range(1, 26)))
+        self.assertEqual(self.streamer.stats["batches"], 3)
+
+    def test_markers_follow_their_frames(self):
+        self.append(1, 10)
+        self.streamer._pump()
+        self.append(11, 14)
+        self.streamer.mark("bedExit", 13)
+        self.streamer._pump()
+
+        self.assertEqual(self.decoded(), list(range(1, 14)) + ["bedExit"])
+        self.assertEqual(self.prefetcher.synced, [13])
+        marker = json.loads(self.records[-1]["Data"])
+        self.assertEqual((marker["type"], marker["frame_id"], marker["sequence"]), ("marker", 13, 2))
+
+    def test_restarts_after_frame_ids_go_backwards(self):
+        self.append(50, 59)
+        self.streamer._pump()
+        self.archive.clear()
+        self.append(1, 3)
+        self.streamer._pump(force=True)
+        self.assertEqual(self.decoded(), list(range(50, 60)) + [1, 2, 3])
@@ -0,0 +1,116 @@
+import random
+import time
+from unittest import TestCase
+
+import requests
+
+from sensor.sensor_client import SensorClient
+
+
+class StubResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class StubSession:
+    # Plays back the given outcomes (status codes or exceptions), then answers 204
+    def __init__(self, outcomes=()):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.responses = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls.append((time.monotonic(), method, url, timeout, kwargs))
+        outcome = self.outcomes.pop(0) if self.outcomes else 204
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.responses.append(StubResponse(outcome))
+        return self.responses[-1]
+
+    def close(self):
+        pass
+
+
+class TestSensorClient(TestCase):
+
+    def client(self, outcomes=(), **kwargs):
+        self.session = StubSession(outcomes)
+        kwargs.setdefault("backoff", 0.01)
+        return SensorClient("http://sensor/", session=self.session, **kwargs)
+
+    def test_request_goes_to_the_sensor(self):
+        client = self.client(timeout=3)
+        client.put("/api/frequency", 10)
+        _, method, url, timeout, kwargs = self.session.calls[0]
+        self.assertEqual((method, url, timeout), ("PUT", "http://sensor/api/frequency", 3))
+        self.assertEqual(kwargs["json"], 10)
+
+        client.get("/api/monitor/frames?after=1&before=2", timeout=10)
+        self.assertEqual(self.session.calls[1][3], 10)
+        self.assertIn("GET /api/monitor/frames", client.latency.snapshot())
+
+    def test_connection_errors_and_server_errors_are_retried(self):
+        client = self.client([requests.ConnectionError(), requests.Timeout(), 503, 204], retries=3)
+        self.assertTrue(client.delete_all_frames())
+        self.assertEqual(len(self.session.calls), 4)
+
+        stats = client.latency.snapshot()["DELETE /api/monitor/frames"]
+        self.assertEqual((stats["count"], stats["errors"]), (4, 3))
+
+    def test_retried_responses_are_closed(self):
+        client = self.client([503, 502, 200], retries=2)
+        response = client.get("/api/monitor/frames?after=0&before=30", stream=True)
+        self.assertEqual(response.status_code, 200)
+        # The connections of the discarded responses go back to the pool; the last one is the caller's
+        self.assertEqual([r.closed for r in self.session.responses], [True, True, False])
+
+    def test_gives_up_after_the_retries(self):
+        client = self.client([503, 503, 503, 503], retries=2)
+        self.assertEqual(client.get("/api/status").status_code, 503)
+        self.assertEqual(len(self.session.calls), 3)
+
+        client = self.client([requests.ConnectionError()] * 3, retries=2)
+        with self.assertRaises(requests.ConnectionError):
+            client.get("/api/status")
+        self.assertEqual(len(self.session.calls), 3)
+        self.assertEqual(client.latency.snapshot()["GET /api/status"]["errors"], 3)
+
+    def test_client_errors_are_not_retried(self):
+        client = self.client([404])
+        self.assertEqual(client.get("/api/status").status_code, 404)
+        self.assertEqual(len(self.session.calls), 1)
+        self.assertEqual(client.latency.snapshot()["GET /api/status"]["errors"], 0)
+
+    def test_check_connection_does_not_retry(self):
+        client = self.client([503])
+        self.assertFalse(client.check_connection())
+        self.assertEqual(len(self.session.calls), 1)
+
+    def test_backoff_doubles_with_jitter(self):
+        client = self.client([503, 503, 503], retries=3, backoff=0.05)
+        random.seed(7)
+        jitter = [random.uniform(0.5, 1.5) for _ in range(3)]
+        random.seed(7)
+        client.get("/api/status")
+
+        times = [call[0] for call in self.session.calls]
+        for attempt, expected in enumerate(0.05 * (2 ** i) * jitter[i] for i in range(3)):
+            gap = times[attempt + 1] - times[attempt]
+            self.assertGreaterEqual(gap, expected)
+            self.assertLess(gap, expected + 0.2)
+
+    def test_shared_session_is_left_open(self):
+        session = StubSession()
+        closed = []
+        session.close = lambda: closed.append(True)
+        SensorClient("http://sensor", session=session).close()
+        self.assertEqual(closed, [])
+
+        client = SensorClient("http://sensor")
+        self.assertTrue(client.owns_session)
+        client.close()
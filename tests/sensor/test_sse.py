@@ -0,0 +1,169 @@
+import asyncio
+import os
+import threading
+import time
+from unittest import TestCase
+
+os.environ.setdefault("SENSOR_URL", "http://localhost")
+
+from sensor.sse import AsyncSSEClient, SSEHub, SSEIngest, SSEParser
+
+
+def parse(text):
+    parser = SSEParser()
+    return [event for event in map(parser.feed, text.splitlines(keepends=True)) if event is not None], parser
+
+
+class FakeSensor:
+    """
+    Serves one chunked SSE response per connection and remembers the Last-Event-ID headers.
+    """
+
+    def __init__(self, bodies):
+        self.bodies = list(bodies)
+        self.last_event_ids = []
+        self.open_connections = 0
+
+    async def handle(self, reader, writer):
+        self.open_connections += 1
+        try:
+            headers = {}
+            await reader.readline()
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.lower()] = value.strip()
+            self.last_event_ids.append(headers.get("last-event-id"))
+
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+            body = self.bodies.pop(0) if self.bodies else None
+            if body is None:
+                await reader.read()  # keep the stream open until the client goes away
+                return
+            for chunk in (body[:7], body[7:]):  # split events across chunks
+                data = chunk.encode()
+                writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+
+class TestSSEParser(TestCase):
+
+    def test_events(self):
+        events, parser = parse("event: body\ndata: {\"present\": true}\nid: 7\n\n: keep-alive\n\n"
+                               "data: a\ndata: b\n\nretry: 3000\n\n")
+        self.assertEqual([(e.event, e.data, e.id) for e in events],
+                         [("body", '{"present": true}', "7"), ("message", "a\nb", "7")])
+        self.assertEqual(parser.last_event_id, "7")
+        self.assertEqual(parser.retry, 3.0)
+
+    def test_crlf_lines(self):
+        events, _ = parse("event: newframe\r\ndata: {\"id\": 1}\r\n\r\n")
+        self.assertEqual(events[0].data, '{"id": 1}')
+
+
+class TestAsyncSSEClient(TestCase):
+
+    def test_reconnects_with_last_event_id(self):
+        sensor = FakeSensor(["event: newframe\ndata: 1\nid: 1\n\n", "event: newframe\ndata: 2\nid: 2\n\n"])
+        events = []
+
+        async def scenario():
+            server = await asyncio.start_server(sensor.handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+
+            async def on_event(event):
+                events.append(event.data)
+
+            client = AsyncSSEClient(f"http://127.0.0.1:{port}/api/monitor/sse", on_event, reconnect_delay=0.01)
+            task = asyncio.create_task(client.run())
+            while len(events) < 2:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            server.close()
+            await server.wait_closed()
+
+        asyncio.run(asyncio.wait_for(scenario(), 5))
+        self.assertEqual(events, ["1", "2"])
+        self.assertEqual(sensor.last_event_ids[:2], [None, "1"])
+
+    def test_stop_closes_the_connection(self):
+        sensor = FakeSensor([None])
+        port, stop_server = self.serve(sensor)
+
+        async def on_event(event):
+            pass
+
+        ingest = SSEIngest(f"http://127.0.0.1:{port}/api/monitor/sse", on_event)
+        for _ in range(3):
+            ingest.start()
+            self.wait_for(lambda: sensor.open_connections == 1)
+            ingest.stop()
+            self.assertFalse(ingest.is_running())
+            self.wait_for(lambda: sensor.open_connections == 0)
+
+        stop_server()
+
+    def test_hub_runs_clients_on_one_loop(self):
+        sensor = FakeSensor([None, None, None])
+        port, stop_server = self.serve(sensor)
+
+        async def on_event(event):
+            pass
+
+        hub = SSEHub()
+        clients = [hub.client(f"http://127.0.0.1:{port}/api/monitor/sse", on_event) for _ in range(2)]
+        threads = threading.active_count()
+        for client in clients:
+            client.start()
+        self.wait_for(lambda: sensor.open_connections == 2)
+        self.assertEqual(threading.active_count(), threads + 1)
+
+        clients[0].stop()
+        self.assertFalse(clients[0].is_running())
+        self.assertTrue(clients[1].is_running())
+        self.wait_for(lambda: sensor.open_connections == 1)
+
+        clients[0].start()
+        self.wait_for(lambda: sensor.open_connections == 2)
+        hub.stop()
+        self.wait_for(lambda: sensor.open_connections == 0)
+        self.assertEqual(threading.active_count(), threads)
+
+        stop_server()
+
+    def serve(self, sensor):
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        address = {}
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            server = loop.run_until_complete(asyncio.start_server(sensor.handle, "127.0.0.1", 0))
+            address["port"] = server.sockets[0].getsockname()[1]
+            ready.set()
+            loop.run_forever()
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        ready.wait()
+
+        def stop():
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+
+        return address["port"], stop
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("Condition not reached")
+            time.sleep(0.01)
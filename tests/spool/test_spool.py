@@ -0,0 +1,114 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from spool import Spool, SpoolReplayer
+
+
+class TestSpool(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "outbound.db")
+        self.spool = Spool(self.path)
+
+    def tearDown(self):
+        self.spool.close()
+        self.tmp_dir.cleanup()
+
+    def test_entries_survive_reopen(self):
+        self.spool.append("api", "first")
+        self.spool.append("logs", "second")
+        self.spool.close()
+
+        self.spool = Spool(self.path)
+        self.assertEqual([entry[2] for entry in self.spool.pending()], ["first", "second"])
+
+    def test_appends_do_not_wait_for_fsync(self):
+        self.assertEqual(self.spool._conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        # 1 is NORMAL
+        self.assertEqual(self.spool._conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+
+    def test_in_flight_entries_are_hidden_until_released(self):
+        entry_id = self.spool.append("api", "event", in_flight=True)
+        self.assertEqual(self.spool.pending(), [])
+        self.assertFalse(self.spool.has_pending("api"))
+
+        self.spool.release(entry_id)
+        self.assertEqual(len(self.spool.pending()), 1)
+
+    def test_has_pending_only_counts_entries_left_to_the_replayer(self):
+        failed = self.spool.append("api", "failed")
+        sending = self.spool.append("api", "sending", in_flight=True)
+        entry_id = self.spool.append("api", "new", in_flight=True)
+        self.assertTrue(self.spool.has_pending("api", before_id=entry_id))
+
+        self.spool.mark_delivered(failed)
+        self.assertFalse(self.spool.has_pending("api", before_id=entry_id))
+        self.spool.release(sending)
+        self.assertTrue(self.spool.has_pending("api", before_id=entry_id))
+        self.assertFalse(self.spool.has_pending("logs"))
+
+    def test_compact_removes_delivered(self):
+        first = self.spool.append("api", "first")
+        self.spool.append("api", "second")
+        self.spool.mark_delivered(first)
+
+        self.assertEqual(self.spool.compact(), 1)
+        self.assertEqual(self.spool.pending_count(), 1)
+        self.assertFalse(self.spool.has_pending("api", before_id=first + 1))
+
+    def test_replay_in_order_and_failures_block_their_kind(self):
+        delivered = []
+        api_up = [False]
+
+        def deliver_api(payload):
+            if api_up[0]:
+                delivered.append(payload)
+            return api_up[0]
+
+        def deliver_logs(payload):
+            delivered.append(payload)
+            return True
+
+        for payload in ("exit", "entry"):
+            self.spool.append("api", payload)
+        self.spool.append("logs", "log")
+
+        replayer = SpoolReplayer(self.spool, {"api": deliver_api, "logs": deliver_logs}, max_per_second=0)
+        self.assertTrue(replayer._replay())
+        self.assertEqual(delivered, ["log"])
+        self.assertEqual(self.spool.pending()[0][3], 1)
+
+        api_up[0] = True
+        self.assertFalse(replayer._replay())
+        self.assertEqual(delivered, ["log", "exit", "entry"])
+        self.assertEqual(self.spool.pending_count(), 0)
+
+    def test_replayer_thread_delivers_on_wake(self):
+        delivered = []
+        replayer = SpoolReplayer(self.spool, {"api": lambda payload: delivered.append(payload) or True},
+                                 max_per_second=0)
+        replayer.start()
+        self.spool.append("api", "exit")
+        replayer.wake()
+
+        deadline = time.monotonic() + 5
+        while not delivered and time.monotonic() < deadline:
+            time.sleep(0.01)
+        replayer.stop()
+        self.assertEqual(delivered, ["exit"])
+
+    def test_only_droppable_kinds_are_given_up(self):
+        self.spool.append("api", "exit")
+        self.spool.append("logs", "log")
+        replayer = SpoolReplayer(self.spool, {"api": lambda payload: False, "logs": lambda payload: False},
+                                 max_per_second=0, max_attempts=3, droppable_kinds=("logs",))
+        for _ in range(10):
+            replayer._replay()
+
+        # The log entry is dropped at the cap, the alert is still waiting after every attempt
+        pending = self.spool.pending()
+        self.assertEqual([(kind, payload) for _, kind, payload, _ in pending], [("api", "exit")])
+        self.assertEqual(pending[0][3], 10)
@@ -0,0 +1,67 @@
+import socket
+import time
+from unittest import TestCase
+
+from wifi.connectivity import ReachabilityProbe
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestReachabilityProbe(TestCase):
+
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(16)
+        self.url = f"http://127.0.0.1:{self.server.getsockname()[1]}"
+        self.dead_url = f"http://127.0.0.1:{closed_port()}"
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_probe_round(self):
+        probe = ReachabilityProbe({"api": self.url, "kinesis": self.dead_url, "sensor": self.dead_url}, timeout=1)
+        self.assertFalse(probe.probe())
+        self.assertTrue(probe.is_reachable("api"))
+        self.assertFalse(probe.is_reachable("kinesis"))
+        self.assertIsNone(probe.is_reachable("unknown"))
+        # Any reachable upstream target means the network is up; the sensor does not count
+        self.assertTrue(probe.is_online())
+        self.assertEqual(probe.upstream, ("api", "kinesis"))
+        self.assertIsNotNone(probe.snapshot()["kinesis"]["error"])
+
+    def test_offline_and_stale_results(self):
+        probe = ReachabilityProbe({"api": self.dead_url}, timeout=1, ttl=0.2)
+        probe.probe()
+        self.assertFalse(probe.is_online())
+
+        probe = ReachabilityProbe({"api": self.url}, timeout=1, ttl=0.2)
+        probe.probe()
+        self.assertTrue(probe.is_online())
+        time.sleep(0.3)
+        self.assertIsNone(probe.is_reachable("api"))
+        self.assertFalse(probe.is_online())
+
+    def test_backs_off_while_healthy_and_tightens_when_degraded(self):
+        probe = ReachabilityProbe({"api": self.url}, timeout=1, min_interval=0.05, max_interval=0.2,
+                                  degraded_interval=0.01)
+        self.assertTrue(probe.is_online(wait=2))
+        deadline = time.monotonic() + 5
+        while probe.interval < 0.2:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        probe.targets["api"] = self.dead_url
+        self.assertFalse(probe.refresh(timeout=2))
+        deadline = time.monotonic() + 5
+        while probe.interval != 0.01:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        probe.targets["api"] = self.url
+        self.assertTrue(probe.refresh(timeout=2))
+        probe.stop()
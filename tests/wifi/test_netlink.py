@@ -0,0 +1,247 @@
+import errno
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import threading
+import time
+from unittest import TestCase, skipUnless
+
+from wifi import netlink
+from wifi.netlink import (AddressEvent, LinkEvent, NetworkMonitor, RouteEvent, parse_messages, IFF_LOWER_UP, IFF_UP,
+                          RTM_DELADDR, RTM_NEWADDR, RTM_NEWLINK, RTM_NEWROUTE, NLMSG_DONE)
+
+
+def attribute(attr_type, value):
+    data = struct.pack("=HH", 4 + len(value), attr_type) + value
+    return data + b"\0" * (-len(data) % 4)
+
+
+def message(msg_type, body):
+    data = struct.pack("=IHHII", 16 + len(body), msg_type, 0, 0, 0) + body
+    return data + b"\0" * (-len(data) % 4)
+
+
+def link(index, name, flags, msg_type=RTM_NEWLINK):
+    body = struct.pack("=BxHiII", socket.AF_UNSPEC, 1, index, flags, 0)
+    body += attribute(3, name.encode() + b"\0") + attribute(16, bytes([6]))
+    return message(msg_type, body)
+
+
+def address(index, ip, prefix_len=24, scope=0, msg_type=RTM_NEWADDR):
+    body = struct.pack("=BBBBI", socket.AF_INET, prefix_len, 0, scope, index)
+    body += attribute(2, socket.inet_aton(ip)) + attribute(1, socket.inet_aton(ip))
+    return message(msg_type, body)
+
+
+def default_route(index, gateway):
+    body = struct.pack("=BBBBBBBBI", socket.AF_INET, 0, 0, 0, 254, 3, 0, 1, 0)
+    body += attribute(5, socket.inet_aton(gateway)) + attribute(4, struct.pack("=i", index))
+    return message(RTM_NEWROUTE, body)
+
+
+def dump(*messages):
+    # The replies to the link, address and route dumps of a resync
+    done = message(NLMSG_DONE, b"\0" * 4)
+    return [b"".join(messages) + done, done, done]
+
+
+class ScriptedSocket:
+    # Stands in for the netlink socket: recv returns, or raises, the queued replies in order
+    def __init__(self, replies=()):
+        self._r, self._w = socket.socketpair()
+        self.replies = []
+        self.closed = False
+        self._lock = threading.Lock()
+        for reply in replies:
+            self.push(reply)
+
+    def push(self, reply):
+        with self._lock:
+            self.replies.append(reply)
+        self._w.send(b"x")
+
+    def fileno(self):
+        return self._r.fileno()
+
+    def send(self, data):
+        return len(data)
+
+    def recv(self, size):
+        self._r.recv(1)
+        with self._lock:
+            reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def close(self):
+        self.closed = True
+        self._r.close()
+        self._w.close()
+
+
+class ScriptedMonitor(NetworkMonitor):
+
+    def __init__(self, scripts, **kwargs):
+        super().__init__(**kwargs)
+        self.scripts = list(scripts)  # replies of each socket opened, or an OSError to fail the open
+        self.sockets = []
+        self.retry_delay = 0.01
+        self.max_retry_delay = 0.05
+
+    def _open(self):
+        script = self.scripts.pop(0) if self.scripts else OSError(errno.EACCES, "no netlink")
+        if isinstance(script, Exception):
+            raise script
+        self._sock = ScriptedSocket(script)
+        self.sockets.append(self._sock)
+
+
+class TestParseMessages(TestCase):
+
+    def test_link_address_and_route(self):
+        data = (link(3, "wlan0", IFF_UP | IFF_LOWER_UP) + address(3, "192.168.1.5")
+                + default_route(3, "192.168.1.1") + message(NLMSG_DONE, b"\0" * 4))
+        events = parse_messages(data)
+        self.assertEqual(events[0], LinkEvent("new", 3, "wlan0", True, True, "up"))
+        self.assertEqual(events[1], AddressEvent("new", 3, socket.AF_INET, "192.168.1.5", 24, 0))
+        self.assertEqual(events[2], RouteEvent("new", socket.AF_INET, None, 0, "192.168.1.1", 3, 254))
+        self.assertEqual(events[3], "done")
+
+    def test_error_message(self):
+        with self.assertRaises(OSError):
+            parse_messages(message(2, struct.pack("=i", -1) + b"\0" * 16))
+
+
+class TestNetworkMonitor(TestCase):
+
+    def test_state_changes_are_published(self):
+        monitor = NetworkMonitor(interfaces=("wlan0",))
+        states = []
+        monitor.subscribe(states.append)
+
+        monitor.apply(parse_messages(link(3, "wlan0", IFF_UP) + link(4, "eth0", IFF_UP | IFF_LOWER_UP)))
+        self.assertFalse(monitor.state("wlan0").connected)
+        monitor.apply(parse_messages(link(3, "wlan0", IFF_UP | IFF_LOWER_UP) + address(3, "10.0.0.7")
+                                     + address(3, "169.254.1.1", scope=253) + default_route(3, "10.0.0.1")))
+        self.assertTrue(monitor.state("wlan0").connected)
+        self.assertEqual(monitor.state("wlan0").addresses, frozenset({"10.0.0.7"}))
+        self.assertTrue(monitor.state("wlan0").default_route)
+
+        # Changes on other interfaces, or no change at all, publish nothing
+        monitor.apply(parse_messages(address(4, "10.0.1.2") + address(3, "10.0.0.7")))
+        monitor.apply(parse_messages(address(3, "10.0.0.7", msg_type=RTM_DELADDR)))
+        self.assertEqual([state.connected for state in states], [False, True, False])
+
+    def test_lost_notifications_during_a_resync_reopen_the_socket(self):
+        connected = (link(3, "wlan0", IFF_UP | IFF_LOWER_UP), address(3, "10.0.0.7"))
+        monitor = ScriptedMonitor([dump(*connected), dump(link(3, "wlan0", IFF_UP))], interfaces=("wlan0",))
+        states = []
+        monitor.subscribe(states.append)
+        monitor.start()
+        try:
+            self.assertTrue(monitor.state("wlan0").connected)
+            # Notifications are lost, and the dump that follows overflows too
+            monitor.sockets[0].push(OSError(errno.ENOBUFS, "No buffer space available"))
+            monitor.sockets[0].push(OSError(errno.ENOBUFS, "No buffer space available"))
+
+            state = monitor.wait_for("wlan0", lambda state: not state.connected, 5)
+            self.assertFalse(state.connected)
+            self.assertEqual(len(monitor.sockets), 2)
+            self.assertTrue(monitor.sockets[0].closed)
+
+            # The new socket is followed as before
+            monitor.sockets[1].push(b"".join(connected))
+            self.assertTrue(monitor.wait_for("wlan0", lambda state: state.connected, 5).connected)
+        finally:
+            monitor.stop()
+        # Subscribers heard about the change that was only seen through the resync
+        self.assertEqual([state.connected for state in states], [True, False, True])
+
+    def test_resync_publishes_one_change(self):
+        connected = (link(3, "wlan0", IFF_UP | IFF_LOWER_UP), address(3, "10.0.0.7"))
+        # Each dump comes back on its own, so the link alone would look disconnected
+        monitor = ScriptedMonitor([dump(*connected), [dump(connected[0])[0], dump(connected[1])[0],
+                                                      dump(default_route(3, "10.0.0.1"))[0]]],
+                                  interfaces=("wlan0",))
+        states = []
+        monitor.subscribe(states.append)
+        monitor.start()
+        try:
+            monitor.sockets[0].push(OSError(errno.EIO, "Input/output error"))
+            state = monitor.wait_for("wlan0", lambda state: state.default_route, 5)
+            self.assertTrue(state.connected)
+        finally:
+            monitor.stop()
+        self.assertEqual([(state.connected, state.default_route) for state in states], [(True, False), (True, True)])
+
+    def test_state_is_unavailable_until_netlink_recovers(self):
+        connected = (link(3, "wlan0", IFF_UP | IFF_LOWER_UP), address(3, "10.0.0.7"))
+        failure = OSError(errno.EACCES, "no netlink")
+        monitor = ScriptedMonitor([dump(*connected), failure, failure], interfaces=("wlan0",))
+        monitor.start()
+        try:
+            monitor.sockets[0].push(OSError(errno.EIO, "Input/output error"))
+            # Callers waiting on the state are released, and see None so they fall back to polling
+            self.assertIsNone(monitor.wait_for("wlan0", lambda state: not state.connected, 5))
+            self.assertIsNone(monitor.state("wlan0"))
+
+            monitor.scripts.append(dump(*connected))
+            state = monitor.wait_for_change("wlan0", 5)
+            self.assertTrue(state.connected)
+            self.assertEqual(len(monitor.sockets), 2)
+        finally:
+            monitor.stop()
+
+    def test_failed_start_closes_the_sockets(self):
+        monitor = ScriptedMonitor([[OSError(errno.EIO, "Input/output error")]], interfaces=("wlan0",))
+        with self.assertRaises(OSError):
+            monitor.start()
+        self.assertTrue(monitor.sockets[0].closed)
+        self.assertIsNone(monitor._wake_r)
+        monitor.stop()
+
+    def test_failed_monitor_is_not_started_again(self):
+        started = []
+
+        def start(monitor):
+            started.append(monitor)
+            raise OSError(errno.EACCES, "no netlink")
+
+        original_start, original_monitor = netlink.NetworkMonitor.start, netlink._monitor
+        netlink.NetworkMonitor.start = start
+        netlink._monitor = None
+        try:
+            self.assertIsNone(netlink.get_network_monitor())
+            self.assertIsNone(netlink.get_network_monitor())
+        finally:
+            netlink.NetworkMonitor.start = original_start
+            netlink._monitor, netlink._monitor_failed = original_monitor, False
+        self.assertEqual(len(started), 1 if NetworkMonitor.available() else 0)
+
+    @skipUnless(NetworkMonitor.available() and hasattr(os, "geteuid") and os.geteuid() == 0
+                and shutil.which("ip"), "needs root and iproute2")
+    def test_follows_a_veth_pair(self):
+        if subprocess.run(["ip", "link", "add", "bedtest0", "type", "veth", "peer", "name", "bedtest1"],
+                          capture_output=True).returncode != 0:
+            self.skipTest("cannot create veth interfaces")
+        monitor = NetworkMonitor(interfaces=("bedtest0",))
+        try:
+            monitor.start()
+            self.assertFalse(monitor.state("bedtest0").up)
+            start = time.monotonic()
+            subprocess.run(["ip", "addr", "add", "10.99.0.1/24", "dev", "bedtest0"], check=True)
+            subprocess.run(["ip", "link", "set", "bedtest1", "up"], check=True)
+            subprocess.run(["ip", "link", "set", "bedtest0", "up"], check=True)
+            state = monitor.wait_for("bedtest0", lambda state: state.connected, 5)
+            self.assertTrue(state.connected)
+            self.assertLess(time.monotonic() - start, 5)
+
+            subprocess.run(["ip", "link", "set", "bedtest1", "down"], check=True)
+            state = monitor.wait_for("bedtest0", lambda state: not state.carrier, 5)
+            self.assertFalse(state.connected)
+        finally:
+            monitor.stop()
+            subprocess.run(["ip", "link", "del", "bedtest0"], capture_output=True)
@@ -0,0 +1,196 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from wifi import wpa_ctrl
+from wifi.wifi import connect_to_wifi_network, disconnect_from_wifi_network
+from wifi.wpa_ctrl import WpaControl, WpaCtrlError
+
+
+class FakeWpaSupplicant:
+    """
+    Answers on a control socket the way wpa_supplicant does. Selecting a network with the right
+    passphrase connects after `connect_delay` seconds; any other passphrase disables it.
+    """
+
+    def __init__(self, ctrl_dir, interface="wlan0", passphrases=None, connect_delay=0.05):
+        self.path = os.path.join(ctrl_dir, interface)
+        self.passphrases = passphrases or {}
+        self.connect_delay = connect_delay
+        self.networks = {}
+        self.next_id = 0
+        self.current = None
+        self.commands = []
+        self.attached = set()
+        self.mute = False
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._sock.close()
+
+    def send_event(self, event):
+        for client in list(self.attached):
+            try:
+                self._sock.sendto(f"<3>{event}".encode(), client)
+            except OSError:
+                self.attached.discard(client)
+
+    def _run(self):
+        while True:
+            try:
+                data, client = self._sock.recvfrom(4096)
+            except OSError:
+                return
+            command = data.decode()
+            self.commands.append(command)
+            if self.mute:
+                continue
+            self._sock.sendto(self._handle(command, client).encode(), client)
+
+    def _handle(self, command, client):
+        name, _, args = command.partition(" ")
+        if name == "PING":
+            return "PONG\n"
+        if name == "ATTACH":
+            self.attached.add(client)
+            return "OK\n"
+        if name == "DETACH":
+            self.attached.discard(client)
+            return "OK\n"
+        if name == "STATUS":
+            if self.current is None:
+                return "wpa_state=SCANNING\n"
+            return f"bssid=aa:bb:cc:dd:ee:ff\nssid={self.networks[self.current]['ssid']}\nwpa_state=COMPLETED\n"
+        if name == "LIST_NETWORKS":
+            lines = ["network id / ssid / bssid / flags"]
+            for network_id, network in self.networks.items():
+                flags = "[CURRENT]" if network_id == self.current else ""
+                lines.append(f"{network_id}\t{network['ssid']}\tany\t{flags}")
+            return "\n".join(lines) + "\n"
+        if name == "ADD_NETWORK":
+            network_id = str(self.next_id)
+            self.next_id += 1
+            self.networks[network_id] = {}
+            return network_id + "\n"
+        if name == "SET_NETWORK":
+            network_id, field, value = args.split(" ", 2)
+            if field == "ssid":
+                value = bytes.fromhex(value).decode()
+            else:
+                value = value.strip('"')
+            self.networks[network_id][field] = value
+            return "OK\n"
+        if name == "SELECT_NETWORK":
+            threading.Timer(self.connect_delay, self._associate, (args,)).start()
+            return "OK\n"
+        if name in ("REMOVE_NETWORK", "DISABLE_NETWORK"):
+            if args == self.current:
+                self.current = None
+                self.send_event("CTRL-EVENT-DISCONNECTED bssid=aa:bb:cc:dd:ee:ff reason=3")
+            if name == "REMOVE_NETWORK":
+                self.networks.pop(args, None)
+            return "OK\n"
+        if name in ("SAVE_CONFIG", "RECONFIGURE", "RECONNECT"):
+            return "OK\n"
+        return "UNKNOWN COMMAND\n"
+
+    def _associate(self, network_id):
+        network = self.networks.get(network_id)
+        if network is None:
+            return
+        if self.passphrases.get(network["ssid"]) != network.get("psk"):
+            self.send_event(f"CTRL-EVENT-SSID-TEMP-DISABLED id={network_id} ssid=\"{network['ssid']}\" "
+                            "auth_failures=1 duration=10 reason=WRONG_KEY")
+            return
+        self.send_event("CTRL-EVENT-SSID-REENABLED id=0 ssid=\"other\"")
+        self.current = network_id
+        self.send_event(f"CTRL-EVENT-CONNECTED - Connection to aa:bb:cc:dd:ee:ff completed [id={network_id} id_str=]")
+
+
+class TestWpaControl(TestCase):
+
+    def setUp(self):
+        self.ctrl_dir = tempfile.mkdtemp()
+        self.supplicant = FakeWpaSupplicant(self.ctrl_dir,
+                                            passphrases={"Home \"5G\"": "secret pass", "old": "old pass"})
+
+    def tearDown(self):
+        self.supplicant.close()
+        os.unlink(self.supplicant.path)
+        os.rmdir(self.ctrl_dir)
+
+    def test_requests(self):
+        with WpaControl("wlan0", ctrl_dir=self.ctrl_dir) as wpa:
+            self.assertTrue(wpa.wait_ready(1))
+            self.assertEqual(wpa.status(), {"wpa_state": "SCANNING"})
+            self.assertEqual(wpa.request("PING"), "PONG")
+            with self.assertRaises(WpaCtrlError):
+                wpa.command("BOGUS")
+            local_path = wpa._local_path
+            self.assertTrue(os.path.exists(local_path))
+        # The client's socket file goes away with it
+        self.assertFalse(os.path.exists(local_path))
+
+    def test_connects_and_waits_on_events(self):
+        with WpaControl("wlan0", ctrl_dir=self.ctrl_dir) as wpa:
+            wpa.attach()
+            network_id = wpa.add_network("Home \"5G\"", "secret pass")
+            start = time.monotonic()
+            self.assertTrue(wpa.wait_connected("Home \"5G\"", timeout=5))
+            # Done on the event, not on a polling interval
+            self.assertLess(time.monotonic() - start, 1)
+            self.assertEqual(wpa.list_networks()[0]["flags"], "[CURRENT]")
+
+            wpa.remove_network(network_id)
+            self.assertTrue(wpa.wait_event(wpa_ctrl.DISCONNECTED, 1).startswith("CTRL-EVENT-DISCONNECTED"))
+        self.assertEqual(self.supplicant.attached, set())
+
+    def test_wrong_passphrase_fails_fast(self):
+        with WpaControl("wlan0", ctrl_dir=self.ctrl_dir) as wpa:
+            wpa.attach()
+            wpa.add_network("Home \"5G\"", "wrong")
+            start = time.monotonic()
+            self.assertFalse(wpa.wait_connected("Home \"5G\"", timeout=5))
+            self.assertLess(time.monotonic() - start, 1)
+
+    def test_deadlines(self):
+        with WpaControl("wlan0", ctrl_dir=self.ctrl_dir) as wpa:
+            wpa.attach()
+            self.assertIsNone(wpa.wait_event(wpa_ctrl.CONNECTED, 0.1))
+            self.assertFalse(wpa.wait_connected(timeout=0.1))
+            self.supplicant.mute = True
+            start = time.monotonic()
+            with self.assertRaises(WpaCtrlError):
+                wpa.request("STATUS", timeout=0.2)
+            self.assertLess(time.monotonic() - start, 1)
+        # No wpa_supplicant at all
+        with WpaControl("wlan9", ctrl_dir=self.ctrl_dir) as wpa:
+            self.assertFalse(wpa.wait_ready(0.2))
+
+    def test_events_during_a_request_are_kept(self):
+        with WpaControl("wlan0", ctrl_dir=self.ctrl_dir) as wpa:
+            wpa.attach()
+            self.supplicant.send_event("CTRL-EVENT-CONNECTED - Connection to aa:bb:cc:dd:ee:ff completed")
+            time.sleep(0.05)
+            self.assertEqual(wpa.request("PING"), "PONG")
+            self.assertIsNotNone(wpa.wait_event(wpa_ctrl.CONNECTED, 0))
+
+    def test_connect_to_wifi_network(self):
+        wpa_ctrl.WPA_CTRL_DIR, ctrl_dir = self.ctrl_dir, wpa_ctrl.WPA_CTRL_DIR
+        try:
+            with WpaControl("wlan0", ctrl_dir=self.ctrl_dir) as wpa:
+                wpa.add_network("old", "old pass")
+            self.assertTrue(connect_to_wifi_network("Home \"5G\"", "secret pass", "wlan0", timeout=5))
+            self.assertEqual([network["ssid"] for network in self.supplicant.networks.values()], ["Home \"5G\""])
+            self.assertIn("SAVE_CONFIG", self.supplicant.commands)
+
+            disconnect_from_wifi_network("wlan0")
+            self.assertEqual(self.supplicant.networks, {})
+        finally:
+            wpa_ctrl.WPA_CTRL_DIR = ctrl_dir